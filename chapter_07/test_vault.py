@@ -6,10 +6,14 @@ from sismic.clock import SimulatedClock
 
 class TestSmartVault(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        """Runs once. Interpreters never modify their statechart, so all tests can share it."""
+        filepath = os.path.join(os.path.dirname(__file__), 'vault_complicated.yaml')
+        cls.statechart = import_from_yaml(filepath=filepath)
+
     def setUp(self):
         """Runs before every test. Sets up a fresh machine."""
-        filepath = os.path.join(os.path.dirname(__file__), 'vault_complicated.yaml')
-        self.statechart = import_from_yaml(filepath=filepath)
         self.clock = SimulatedClock()
         self.interpreter = Interpreter(self.statechart, clock=self.clock)
         self.interpreter.execute() # Boot the machine
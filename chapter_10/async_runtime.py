@@ -0,0 +1,179 @@
+import asyncio
+
+from sismic.clock import SimulatedClock
+from sismic.interpreter.listener import InternalEventListener
+from sismic.model import Event
+
+from engine import polled_deadline
+
+# ---------------------------------------------------------
+# An asyncio runtime for communicating statecharts.
+#
+# Chapter 8 wired the vault and the charger with bind(), then called
+# execute() on each of them "enough times" for the messages to settle.
+# Here every interpreter is a task with its own mailbox. bind() routes sent
+# events to mailboxes, and the system counts the messages in flight: when
+# the count drops to zero, nothing can happen anymore until an external
+# event arrives or a timer is due.
+# ---------------------------------------------------------
+
+_WAKE_UP = object()  # Mailbox item: execute, even without new events
+
+
+class AsyncSystem:
+    """
+    Run communicating CompiledInterpreters as asyncio tasks.
+
+    :param clock: clock shared by every interpreter (default to a
+        SimulatedClock). A SimulatedClock that is not started only moves
+        through advance(); any other clock wakes interpreters up at the
+        deadline of their after()/idle() guards.
+    :param poll_interval: how often interpreters whose time-based guards
+        cannot be predicted are executed
+    """
+
+    def __init__(self, clock=None, *, poll_interval=0.1):
+        self.clock = SimulatedClock() if clock is None else clock
+        self.poll_interval = poll_interval
+        self._mailboxes = {}  # interpreter -> asyncio.Queue
+        self._tasks = []
+        self._in_flight = 0  # Mailbox items not processed yet
+        self._quiescent = None  # asyncio.Event, created in the running loop
+        self._error = None
+
+    def add(self, interpreter):
+        """Add given interpreter to the system, and return it."""
+        if self._tasks:
+            raise RuntimeError('Interpreters must be added before the system is started')
+        self._mailboxes[interpreter] = None
+        return interpreter
+
+    def bind(self, source, target):
+        """
+        Send the events sent by *source* to *target*: an interpreter of this
+        system (through its mailbox), or any callable accepting an event.
+        """
+        if target in self._mailboxes:
+            listener = InternalEventListener(lambda event: self._post(target, event))
+        else:
+            listener = InternalEventListener(target)
+        source.attach(listener)
+        return listener
+
+    def queue(self, interpreter, event_or_name, *event_or_names, **parameters):
+        """Put events in the mailbox of given interpreter. Must be called from the event loop."""
+        self._check_started()
+        for event in (event_or_name,) + event_or_names:
+            self._post(interpreter, Event(event, **parameters) if isinstance(event, str) else event)
+
+    async def start(self):
+        """Start a task per interpreter. Every interpreter is executed once, to boot it."""
+        self._in_flight = 0
+        self._error = None
+        self._quiescent = asyncio.Event()
+        self._quiescent.set()
+        for interpreter in self._mailboxes:
+            self._mailboxes[interpreter] = asyncio.Queue()
+        for interpreter in self._mailboxes:
+            self._tasks.append(asyncio.create_task(self._serve(interpreter)))
+            self._post(interpreter, _WAKE_UP)
+
+    async def stop(self):
+        """Cancel the tasks of the interpreters. Events not processed yet are dropped."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._quiescent = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def run_until_quiescent(self):
+        """
+        Wait until every message has been processed, including the ones sent
+        while processing other messages. Raise the first exception raised
+        by an interpreter, if any.
+        """
+        self._check_started()
+        await self._quiescent.wait()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    async def advance(self, seconds):
+        """
+        Move a SimulatedClock forward, stopping at every after()/idle()
+        deadline on the way so that timers fire in order, and wait until the
+        system is quiescent at each of them.
+        """
+        until = self.clock.time + seconds
+        await self.run_until_quiescent()
+        while True:
+            deadlines = [(self._deadline(interpreter), interpreter) for interpreter in self._mailboxes]
+            upcoming = [deadline for deadline, _ in deadlines if deadline is not None and deadline <= until]
+            if not upcoming:
+                break
+            self.clock.time = max(self.clock.time, min(upcoming))
+            for deadline, interpreter in deadlines:
+                if deadline is not None and deadline <= self.clock.time:
+                    self._post(interpreter, _WAKE_UP)
+            await self.run_until_quiescent()
+        self.clock.time = max(self.clock.time, until)
+
+    # ---------------------------------------------------------
+    # Mailboxes
+    # ---------------------------------------------------------
+
+    def _check_started(self):
+        if self._quiescent is None:
+            raise RuntimeError('The system is not started: call start(), or use it with async with')
+
+    def _post(self, interpreter, item):
+        self._in_flight += 1
+        self._quiescent.clear()
+        self._mailboxes[interpreter].put_nowait(item)
+
+    def _done(self, count):
+        self._in_flight -= count
+        if self._in_flight == 0:
+            self._quiescent.set()
+
+    async def _serve(self, interpreter):
+        mailbox = self._mailboxes[interpreter]
+        while True:
+            try:
+                items = [await asyncio.wait_for(mailbox.get(), self._timeout(interpreter))]
+            except asyncio.TimeoutError:
+                items = []  # A timer is due
+            while not mailbox.empty():
+                items.append(mailbox.get_nowait())
+
+            try:
+                for item in items:
+                    if item is not _WAKE_UP:
+                        interpreter.queue(item)
+                # Events sent during this step are posted (and counted) before
+                # the items that caused them are marked as done
+                interpreter.execute()
+            except Exception as e:
+                if self._error is None:
+                    self._error = e
+            finally:
+                self._done(len(items))
+
+    def _deadline(self, interpreter):
+        return polled_deadline(interpreter, self.poll_interval, interpreter.compiled)
+
+    def _timeout(self, interpreter):
+        """Seconds until the next deadline of given interpreter, None to wait for its mailbox only."""
+        if isinstance(self.clock, SimulatedClock) and not self.clock._play:
+            return None
+        deadline = self._deadline(interpreter)
+        if deadline is None:
+            return None
+        return max(0, deadline - self.clock.time) / getattr(self.clock, 'speed', 1)
@@ -0,0 +1,223 @@
+import contextlib
+import datetime
+import gc
+import glob
+import io
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+
+from sismic.clock import SimulatedClock
+from sismic.exceptions import ContractError
+from sismic.interpreter import Interpreter
+from sismic.io import import_from_yaml
+
+import snapshot
+from chart_cache import library_version
+from engine import CompiledInterpreter
+from table import TableInterpreter
+
+# ---------------------------------------------------------
+# Benchmarks of every statechart of the tutorial.
+#
+# For each chart and each engine (Sismic's Interpreter, our
+# CompiledInterpreter and TableInterpreter), we measure:
+#   load_ms             parsing and validating the YAML
+#   events_per_s        queue(...).execute() calls per second
+#   p50_us, p99_us      latency of one queue(...).execute() call
+#   bytes_per_instance  memory of a booted interpreter
+#   snapshot_bytes      size of snapshot.encode() after the workload
+#   save_us, restore_us snapshot.encode() and snapshot.resume()
+#
+# The workload is a reproducible random sequence of the events the chart
+# listens to (and some it does not), with clock jumps for after(). The
+# results are written as JSON, and compare() flags the metrics that got
+# worse than in a previous run.
+# ---------------------------------------------------------
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+CHARTS = sorted(glob.glob(os.path.join(ROOT, 'chapter_*', '*.yaml')))
+ENGINES = {
+    'Interpreter': Interpreter,
+    'CompiledInterpreter': CompiledInterpreter,
+    'TableInterpreter': TableInterpreter,
+}
+
+# Metric -> True if higher is better
+METRICS = {
+    'load_ms': False,
+    'events_per_s': True,
+    'p50_us': False,
+    'p99_us': False,
+    'bytes_per_instance': False,
+    'snapshot_bytes': False,
+    'save_us': False,
+    'restore_us': False,
+}
+
+
+class NullHardware:
+    """Stands in for chapter 3's VaultHardware: accepts any call."""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def workload(statechart, length, *, seed=0):
+    """A reproducible list of (seconds to wait, event name, parameters)."""
+    rng = random.Random(seed)
+    names = statechart.events_for() + ['UNKNOWN_EVENT']
+    return [
+        (
+            rng.choice([0, 0, 0, 0.5, 2.0]),
+            rng.choice(names),
+            {'code': rng.choice([0, 1234]), 'entered_states': [], 'configuration': []},
+        )
+        for _ in range(length)
+    ]
+
+
+def benchmark_chart(path, *, events=2000, instances=200, repeat=3):
+    """
+    Benchmark one statechart with every engine.
+
+    :return: a dict mapping engine names to dicts of metrics
+    """
+    with open(path) as f:
+        text = f.read()
+    loads = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        statechart = import_from_yaml(text)
+        loads.append(time.perf_counter() - start)
+    load_ms = min(loads) * 1e3
+
+    trace = workload(statechart, events)
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):  # The charts print on every transition
+        for name, klass in ENGINES.items():
+            metrics = {'load_ms': load_ms}
+            # The best of several runs: a busy machine only makes things slower
+            interpreter, latencies = min(
+                (_run(klass, statechart, trace) for _ in range(repeat)), key=lambda run: sum(run[1]),
+            )
+            latencies.sort()
+            metrics['events_per_s'] = len(latencies) / sum(latencies)
+            metrics['p50_us'] = _percentile(latencies, 0.50) * 1e6
+            metrics['p99_us'] = _percentile(latencies, 0.99) * 1e6
+            metrics['bytes_per_instance'] = _memory(klass, statechart, instances)
+
+            context = {'hw': NullHardware()}
+            data = snapshot.encode(interpreter, exclude=context)
+            metrics['snapshot_bytes'] = len(data)
+            metrics['save_us'] = _best(lambda: snapshot.encode(interpreter, exclude=context), repeat) * 1e6
+            metrics['restore_us'] = _best(
+                lambda: snapshot.resume(data, statechart, interpreter_klass=klass, initial_context=context), repeat,
+            ) * 1e6
+            results[name] = metrics
+    return results
+
+
+def run(paths=CHARTS, **kwargs):
+    """Benchmark given statecharts, return a JSON-serializable report."""
+    return {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sismic': library_version(),
+            'machine': platform.machine(),
+            'parameters': kwargs,
+        },
+        'charts': {
+            os.path.relpath(path, ROOT).replace(os.sep, '/'): benchmark_chart(path, **kwargs) for path in paths
+        },
+    }
+
+
+def save(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, report, *, tolerance=0.25):
+    """
+    Compare a report with a previous one.
+
+    :param tolerance: relative change that is not considered a regression
+        (benchmarks are noisy)
+    :return: a list of (chart, engine, metric, before, after) for every
+        metric that got worse by more than the tolerance
+    """
+    regressions = []
+    for chart, engines in report['charts'].items():
+        for engine, metrics in engines.items():
+            before_metrics = baseline['charts'].get(chart, {}).get(engine, {})
+            for metric, higher_is_better in METRICS.items():
+                before, after = before_metrics.get(metric), metrics.get(metric)
+                if not before or after is None:
+                    continue
+                change = (after - before) / before
+                if (-change if higher_is_better else change) > tolerance:
+                    regressions.append((chart, engine, metric, before, after))
+    return regressions
+
+
+def _run(klass, statechart, trace):
+    """Run the workload, return the interpreter and the latency of every call."""
+    clock = SimulatedClock()
+    context = {'hw': NullHardware()}
+    interpreter = klass(statechart, clock=clock, initial_context=context)
+    interpreter.execute()
+    latencies = []
+    perf_counter = time.perf_counter
+    for seconds, name, parameters in trace:
+        clock.time += seconds
+        start = perf_counter()
+        try:
+            interpreter.queue(name, **parameters).execute()
+        except ContractError:
+            # vault_contract.yaml has a bug on purpose: start over
+            interpreter = klass(statechart, clock=clock, initial_context=context)
+            interpreter.execute()
+            continue
+        latencies.append(perf_counter() - start)
+    return interpreter, latencies
+
+
+def _memory(klass, statechart, instances):
+    """Average memory allocated by a booted interpreter."""
+    context = {'hw': NullHardware()}
+    klass(statechart, initial_context=context).execute()  # Compile, cache...
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        interpreters = [klass(statechart, initial_context=context) for _ in range(instances)]
+        for interpreter in interpreters:
+            interpreter.execute()
+        return (tracemalloc.get_traced_memory()[0] - before) / instances
+    finally:
+        tracemalloc.stop()
+
+
+def _best(function, repeat, number=100):
+    """Best time of one call, over *repeat* runs of *number* calls."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+    return min(timings)
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
@@ -0,0 +1,173 @@
+import hashlib
+import os
+import pickle
+import sys
+from collections import OrderedDict
+from importlib import metadata
+
+import sismic
+from sismic.io import import_from_yaml
+
+# ---------------------------------------------------------
+# A content-hashed cache in front of import_from_yaml.
+#
+# Parsing YAML and validating it against Sismic's schema is by far the most
+# expensive part of loading a chart (milliseconds), while unpickling the
+# resulting Statechart takes microseconds. We therefore keep:
+#   1. An in-process memo, so loading the same file twice is a dict lookup
+#      (the MEMO_ENTRIES most recently loaded charts).
+#   2. An on-disk cache of pickled Statecharts, keyed by a hash of the YAML
+#      content and of the library version, with LRU eviction.
+# ---------------------------------------------------------
+
+CACHE_DIR = os.environ.get(
+    'SISMIC_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'sismic-statecharts'),
+)
+MAX_ENTRIES = 256
+MEMO_ENTRIES = 256
+SUFFIX = '.statechart'
+
+# path -> (mtime, size, key) of its latest version, and key -> Statechart (least recently used first)
+_path_keys = {}
+_memo = OrderedDict()
+
+
+def library_version():
+    """Version of the installed Sismic distribution."""
+    try:
+        return metadata.version('sismic')
+    except metadata.PackageNotFoundError:
+        return sismic.__version__
+
+
+def cache_key(data):
+    """
+    Hash of the raw YAML bytes, the Sismic version and the pickle protocol.
+
+    A new library version (or a different Python) could build a different
+    Statechart from the same YAML, so both are part of the key.
+    """
+    digest = hashlib.sha256()
+    digest.update(data)
+    digest.update(f'\0sismic={library_version()}'.encode())
+    digest.update(f'\0python={sys.version_info[:2]}/{pickle.HIGHEST_PROTOCOL}'.encode())
+    return digest.hexdigest()
+
+
+def load_statechart(text=None, filepath=None, *, cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES):
+    """
+    Drop-in replacement for import_from_yaml(text=..., filepath=...).
+
+    The returned Statechart is shared with every other caller that loads the
+    same content: interpreters only read their statechart, so this is safe as
+    long as nobody edits it in place. Set cache_dir to None to only use the
+    in-process memo.
+    """
+    if not text and not filepath:
+        raise TypeError('A YAML must be provided, either using first argument or filepath argument.')
+    elif text and filepath:
+        raise TypeError('Either provide first argument or filepath argument, not both.')
+
+    if filepath:
+        # Fast path: the same file, unchanged since we last hashed it
+        stat = os.stat(filepath)
+        path = os.path.abspath(filepath)
+        version = (stat.st_mtime_ns, stat.st_size)
+        known = _path_keys.get(path)
+        if known is not None and known[:2] == version and known[2] in _memo:
+            _memo.move_to_end(known[2])
+            return _memo[known[2]]
+
+        with open(filepath, 'rb') as f:
+            data = f.read()
+        key = cache_key(data)
+        _path_keys[path] = version + (key,)  # Replaces the key of the previous version
+    else:
+        data = text.encode('utf-8')
+        key = cache_key(data)
+
+    statechart = _memo.get(key)
+    if statechart is not None:
+        _memo.move_to_end(key)
+        return statechart
+
+    if cache_dir:
+        statechart = _read_entry(cache_dir, key)
+    if statechart is None:
+        statechart = import_from_yaml(data.decode('utf-8'))
+        if cache_dir:
+            _write_entry(cache_dir, key, statechart, max_entries)
+
+    _memo[key] = statechart
+    while len(_memo) > MEMO_ENTRIES:
+        _memo.popitem(last=False)
+    if len(_path_keys) > MEMO_ENTRIES:
+        # Forget the paths whose chart left the memo
+        for path in [path for path, known in _path_keys.items() if known[2] not in _memo]:
+            del _path_keys[path]
+    return statechart
+
+
+def clear_memo():
+    """Forget every statechart loaded by this process (the disk cache is kept)."""
+    _path_keys.clear()
+    _memo.clear()
+
+
+def _read_entry(cache_dir, key):
+    path = os.path.join(cache_dir, key + SUFFIX)
+    try:
+        with open(path, 'rb') as f:
+            statechart = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Truncated or stale entry: drop it and parse the YAML again
+        _remove(path)
+        return None
+
+    # Bump the access time used by the LRU eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return statechart
+
+
+def _write_entry(cache_dir, key, statechart, max_entries):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, key + SUFFIX)
+        # Write to a temporary name first so concurrent workers never see half a file
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(statechart, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        _evict(cache_dir, max_entries)
+    except OSError:
+        # A read-only or full disk must never prevent loading a chart
+        pass
+
+
+def _evict(cache_dir, max_entries):
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(SUFFIX):
+            path = os.path.join(cache_dir, name)
+            try:
+                entries.append((os.stat(path).st_mtime_ns, path))
+            except OSError:
+                pass
+
+    # Least recently used entries have the oldest modification time
+    entries.sort()
+    for _, path in entries[:max(0, len(entries) - max_entries)]:
+        _remove(path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
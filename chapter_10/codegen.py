@@ -0,0 +1,596 @@
+import ast
+import builtins
+import linecache
+import re
+import types
+import weakref
+from itertools import combinations
+
+from sismic.model import (
+    CompoundState,
+    ContractMixin,
+    DeepHistoryState,
+    FinalState,
+    OrthogonalState,
+    ShallowHistoryState,
+)
+
+from compiler import compile_statechart
+from guards import GuardAnalysis
+
+# ---------------------------------------------------------
+# Code generation.
+#
+# Even with compiled lookup tables, every step still walks generic data
+# structures and evaluates guards and actions through exec()/eval(). For
+# a chart that does not change, we can instead write the Python a person
+# would write by hand: one method per event, testing the guards of the
+# active states as plain `if` statements, and one method per transition,
+# exiting and entering states by flipping slot attributes.
+#
+# The generated class has the interface of Interpreter that the tutorial
+# uses (queue, execute, execute_once, configuration, context, clock,
+# final) and the same step semantics. In the generated code:
+#   - context variables are items of self.context: attempts += 1 becomes
+#     _ctx['attempts'] += 1
+#   - constants of the preamble (see guards.py) are inlined as literals
+#   - after(N), idle(N), active(name) and send(name) become slot lookups
+#     and method calls
+#
+# Charts with history states, contracts or code we cannot translate
+# (import, def, global, notify...) raise CodegenError: use an
+# interpreter for those.
+# ---------------------------------------------------------
+
+# Names the evaluator exposes to the code of a statechart
+_HELPERS = frozenset(['event', 'time', 'after', 'idle', 'active', 'send', 'setdefault', 'notify'])
+_BUILTINS = frozenset(dir(builtins))
+_UNSUPPORTED = (
+    ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Import, ast.ImportFrom, ast.Global,
+    ast.Nonlocal, ast.Return, ast.Yield, ast.YieldFrom, ast.Await, ast.NamedExpr,
+)
+
+# One generated class per Statechart, dropped when the statechart is collected
+_classes = weakref.WeakKeyDictionary()
+
+
+def machine_class(statechart):
+    """Return the (shared) generated class of given statechart. Raise CodegenError if there is none."""
+    klass = _classes.get(statechart)
+    if klass is None:
+        source = generate_module(statechart)
+        filename = f'<codegen {statechart.name}>'
+        linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)  # For tracebacks
+        module = types.ModuleType('codegen_' + _identifier(statechart.name))
+        exec(compile(source, filename, 'exec'), module.__dict__)
+        klass = _classes[statechart] = module.Machine
+    return klass
+
+
+def write_module(statechart, path, *, class_name='Machine'):
+    """Write the module generated for given statechart to given path."""
+    with open(path, 'w') as f:
+        f.write(generate_module(statechart, class_name=class_name))
+
+
+def generate_module(statechart, *, class_name='Machine'):
+    """Return the source code of a module defining a class that executes given statechart."""
+    return _Generator(statechart, class_name).source()
+
+
+class CodegenError(Exception):
+    """The statechart cannot be turned into Python code."""
+
+
+class _Generator:
+    def __init__(self, statechart, class_name):
+        self.statechart = statechart
+        self.class_name = class_name
+        self.compiled = compiled = compile_statechart(statechart)
+
+        for state in compiled.states.values():
+            if isinstance(state, (ShallowHistoryState, DeepHistoryState)):
+                raise CodegenError(f'History state {state.name} is not supported')
+        for obj in [*compiled.states.values(), *statechart.transitions]:
+            if isinstance(obj, ContractMixin) and (obj.preconditions or obj.postconditions or obj.invariants):
+                raise CodegenError(f'Contracts are not supported ({obj})')
+
+        # State k is stored in slot _s<k> (active or not), _e<k> (entry time) and _i<k> (idle time)
+        self.index = {name: i for i, name in enumerate(sorted(compiled.states, key=compiled.outer_first.__getitem__))}
+        self.transitions = list(statechart.transitions)
+        self.number = {id(t): k for k, t in enumerate(self.transitions)}
+
+        self.constants = {
+            name: value for name, value in GuardAnalysis(statechart).constants.items() if _immutable(value)
+        }
+        self.assigned = set()
+        for code in self._codes():
+            self.assigned.update(_assigned(code))
+        if self.assigned & _HELPERS:
+            raise CodegenError(f'Assigning {", ".join(sorted(self.assigned & _HELPERS))} is not supported')
+
+        # Translate every piece of code first, to know which times to keep
+        self.entry_times, self.idle_times = set(), set()
+        self.guards, self.actions = {}, {}
+        for transition in self.transitions:
+            if transition.guard:
+                self.guards[id(transition)] = self._translate(transition.guard.strip(), 'eval', transition.source)
+            if transition.action:
+                self.actions[id(transition)] = self._translate(transition.action, 'exec')
+        self.on_entry, self.on_exit = {}, {}
+        for name, state in compiled.states.items():
+            if getattr(state, 'on_entry', None):
+                self.on_entry[name] = self._translate(state.on_entry, 'exec')
+            if getattr(state, 'on_exit', None):
+                self.on_exit[name] = self._translate(state.on_exit, 'exec')
+
+    def _codes(self):
+        yield self.statechart.preamble, 'exec'
+        for state in self.compiled.states.values():
+            yield getattr(state, 'on_entry', None), 'exec'
+            yield getattr(state, 'on_exit', None), 'exec'
+        for transition in self.transitions:
+            yield transition.guard, 'eval'
+            yield transition.action, 'exec'
+
+    def _translate(self, code, mode, source=None):
+        try:
+            tree = ast.parse(code, mode=mode)
+        except SyntaxError as e:
+            raise CodegenError(f'{e} in {code!r}') from e
+        tree = ast.fix_missing_locations(_Rewriter(self, source).visit(tree))
+        return ast.unparse(tree)
+
+    # ----- Source -----
+
+    def source(self):
+        compiled, index = self.compiled, self.index
+        states = sorted(index, key=index.__getitem__)
+        slots = ['clock', 'context', '_time', '_initialized', '_internal', '_external']
+        slots += [f'_s{index[name]}' for name in states]
+        slots += [f'_e{index[name]}' for name in states if name in self.entry_times]
+        slots += [f'_i{index[name]}' for name in states if name in self.idle_times]
+
+        lines = [
+            f'# Generated by codegen.py from statechart {self.statechart.name!r}. Do not edit.',
+            'from collections import namedtuple',
+            'from itertools import combinations',
+            '',
+            'try:',
+            '    from sismic.clock import SimulatedClock',
+            '    from sismic.exceptions import ConflictingTransitionsError, NonDeterminismError',
+            '    from sismic.model import Event, InternalEvent',
+            'except ImportError:  # Runs without Sismic',
+            *_FALLBACKS,
+            '',
+            '# What execute_once() returns: transitions are described as in str(Transition)',
+            "Step = namedtuple('Step', 'time event transitions')",
+            '',
+            f'PREAMBLE = compile({self.statechart.preamble or ""!r}, "<preamble>", "exec")',
+            f'SLOTS = {dict((name, f"_s{index[name]}") for name in states)!r}',
+            '',
+            '',
+            f'class {self.class_name}:',
+            f'    """Statechart {self.statechart.name!r}, with the interface of sismic.interpreter.Interpreter."""',
+            '',
+            f'    __slots__ = {tuple(slots)!r}',
+            '',
+            '    def __init__(self, clock=None, initial_context=None):',
+            '        self.clock = SimulatedClock() if clock is None else clock',
+            '        self.context = dict(initial_context or {})',
+            '        self._time = self.clock.time',
+            '        self._initialized = False',
+            '        self._internal = []',
+            '        self._external = []',
+            *[f'        self._s{index[name]} = False' for name in states],
+            '        exec(PREAMBLE, {"time": self._time, "setdefault": self.context.setdefault}, self.context)',
+            *_METHODS,
+            '',
+            '    @property',
+            '    def configuration(self):',
+            '        """Active states, shallowest first."""',
+            '        configuration = []',
+        ]
+        for name in states:
+            lines += [f'        if self._s{index[name]}:', f'            configuration.append({name!r})']
+        lines += [
+            '        return configuration',
+            '',
+            '    @property',
+            '    def final(self):',
+            f'        return self._initialized and not self._s{index[self.statechart.root]}',
+            '',
+            '    def _initialize(self):',
+        ]
+        lines += self._method(self._enter([self.statechart.root], ''))
+
+        lines += ['', '    def _eventless(self, event=None):']
+        lines += self._selection(compiled.eventless, 'None')
+
+        handlers = {}
+        for event in sorted(compiled.by_event):
+            method = handlers[event] = _unique(f'_on_{_identifier(event)}', handlers.values())
+            lines += ['', f'    def {method}(self, event):']
+            lines += self._selection(compiled.by_event[event], 'event')
+
+        for k, transition in enumerate(self.transitions):
+            lines += ['', f'    def _t{k}(self, event):', f'        # {transition}']
+            lines += self._transition(transition)
+
+        # Module-level tables, used by the methods of the class
+        name = self.class_name
+        lines += [
+            '',
+            '',
+            f'HANDLERS = {{{", ".join(f"{event!r}: {name}.{method}" for event, method in handlers.items())}}}',
+            f'TRANSITIONS = ({"".join(f"{name}._t{k}, " for k in range(len(self.transitions)))})',
+            f'LABELS = {tuple(str(t) for t in self.transitions)!r}',
+            f'ORDER = {tuple((-compiled.depth[t.source], t.source) for t in self.transitions)!r}',
+            'CHECKS = {',
+        ]
+        for (i, j), (error, message) in sorted(self._checks().items()):
+            lines.append(f'    ({i}, {j}): ({error}, {message!r}),')
+        lines += ['}', '']
+        return '\n'.join(lines)
+
+    def _selection(self, candidates, event):
+        """Body of a method that selects and fires the transitions of given candidates, see CompiledInterpreter."""
+        compiled, index = self.compiled, self.index
+        body = ['found = []']
+        # Inner-first/source state semantics: a source is ignored when one of its descendants fired
+        flagged = {
+            source for i, (source, _) in enumerate(candidates)
+            for later, _ in candidates[i + 1:] if later in compiled.ancestors[source]
+        }
+        for source in flagged:
+            body.append(f'f{index[source]} = False')
+
+        for i, (source, priority_groups) in enumerate(candidates):
+            condition = f'self._s{index[source]}'
+            ignored_by = [f'f{index[s]}' for s, _ in candidates[:i] if s in flagged and source in compiled.ancestors[s]]
+            if ignored_by:
+                condition += f' and not ({" or ".join(ignored_by)})'
+            body.append(f'if {condition}:')
+            if source in flagged or len(priority_groups) > 1:
+                body.append('    n = len(found)')
+            indent = '    '
+            for p, group in enumerate(priority_groups):
+                if p > 0:
+                    body.append(f'{indent}if len(found) == n:')
+                    indent += '    '
+                exclusive = id(group) in compiled.exclusive
+                for t, transition in enumerate(group):
+                    k = self.number[id(transition)]
+                    guard = self.guards.get(id(transition))
+                    if guard is None:
+                        body.append(f'{indent}found.append({k})')
+                    else:
+                        keyword = 'elif' if exclusive and t > 0 else 'if'
+                        body += [f'{indent}{keyword} {guard}:', f'{indent}    found.append({k})']
+            if source in flagged:
+                body.append(f'    f{index[source]} = len(found) > n')
+
+        body += ['if found:', f'    return self._fire(found, {event})', 'return ()']
+        return self._method(body)
+
+    def _transition(self, transition):
+        """Body of the method that processes given transition: exit, action, enter."""
+        compiled, index = self.compiled, self.index
+        body = []
+        if transition.target is not None:
+            exit_candidates, entered = compiled.scope[id(transition)]
+            known = {transition.source, *compiled.ancestors[transition.source]}  # Active for sure
+            for name in exit_candidates:
+                if name in known:
+                    body += self._exit(name, '')
+                else:
+                    body.append(f'if self._s{index[name]}:')
+                    body += self._exit(name, '    ')
+
+        action = self.actions.get(id(transition))
+        if action:
+            body += action.splitlines()
+        if transition.source in self.idle_times:
+            body.append(f'self._i{index[transition.source]} = _time')
+        if transition.target is not None:
+            body += self._enter(compiled.scope[id(transition)][1], '')
+        return self._method(body or ['pass'])
+
+    def _exit(self, name, indent):
+        lines = self.on_exit[name].splitlines() if name in self.on_exit else []
+        lines.append(f'self._s{self.index[name]} = False')
+        return [indent + line for line in lines]
+
+    def _enter(self, entered, indent):
+        """Lines entering given states, then stabilizing the configuration, as in Interpreter._stabilize."""
+        compiled, index = self.compiled, self.index
+        lines = []
+        new = []
+        while entered:
+            for name in entered:
+                code = self.on_entry[name].splitlines() if name in self.on_entry else []
+                code.append(f'self._s{index[name]} = True')
+                if name in self.entry_times:
+                    code.append(f'self._e{index[name]} = _time')
+                if name in self.idle_times:
+                    code.append(f'self._i{index[name]} = _time')
+                lines += [indent + line for line in code]
+                new.append(name)
+
+            # Only the newly entered states can be unstable leaves
+            entered = ()
+            for name in sorted(new, key=compiled.inner_first.__getitem__):
+                if any(descendant in new for descendant in compiled.descendants[name]):
+                    continue
+                leaf = compiled.states[name]
+                if isinstance(leaf, FinalState) and compiled.parent[name] == self.statechart.root:
+                    for exited in (name, self.statechart.root):
+                        lines += self._exit(exited, indent)
+                    return lines
+                elif isinstance(leaf, OrthogonalState) and compiled.children[name]:
+                    entered = sorted(compiled.children[name])
+                    break
+                elif isinstance(leaf, CompoundState) and leaf.initial:
+                    entered = [leaf.initial]
+                    break
+        return lines
+
+    def _method(self, body):
+        """Indent given method body, with the locals it uses."""
+        code = '\n'.join(body)
+        prelude = []
+        if re.search(r'(?<![\w.])_ctx\b', code):
+            prelude.append('_ctx = self.context')
+        if re.search(r'(?<![\w.])_time\b', code):
+            prelude.append('_time = self._time')
+        return ['        ' + line for line in prelude + body]
+
+    def _checks(self):
+        """(i, j) -> (error, message) for the transitions that cannot fire together, as in Interpreter._sort_transitions."""
+        statechart, compiled = self.statechart, self.compiled
+        checks = {}
+        for candidates in (compiled.eventless, *compiled.by_event.values()):
+            transitions = [t for _, groups in candidates for group in groups for t in group]
+            for t1, t2 in combinations(transitions, 2):
+                lca = statechart.least_common_ancestor(t1.source, t2.source)
+                if not isinstance(compiled.states[lca], OrthogonalState):
+                    check = ('NonDeterminismError', f'Non-determinist choice between transitions {t1} and {t2}')
+                else:
+                    check = None
+                    for transition in (t1, t2):
+                        last_before_lca = transition.source
+                        for state in compiled.ancestors[transition.source]:
+                            if state == lca:
+                                break
+                            last_before_lca = state
+                        if transition.target and (
+                            transition.target != last_before_lca
+                            and transition.target not in compiled.descendants[last_before_lca]
+                        ):
+                            check = ('ConflictingTransitionsError', f'Conflicting transitions: {t1} and {t2}')
+                            break
+                if check is not None:
+                    i, j = self.number[id(t1)], self.number[id(t2)]
+                    checks[i, j] = checks[j, i] = check
+        return checks
+
+
+class _Rewriter(ast.NodeTransformer):
+    """Turn the code of a statechart into code for a method of the generated class."""
+
+    def __init__(self, generator, source):
+        self.generator = generator
+        self.source = source  # For after() and idle(), in guards
+        self.local = []  # Names bound by the lambdas and comprehensions we are in
+
+    def generic_visit(self, node):
+        if isinstance(node, _UNSUPPORTED):
+            raise CodegenError(f'{type(node).__name__} is not supported: {ast.unparse(node)!r}')
+        return super().generic_visit(node)
+
+    def _is_local(self, name):
+        return any(name in names for names in self.local)
+
+    def visit_Name(self, node):
+        name = node.id
+        if self._is_local(name) or name == 'event':
+            return node
+        if name == 'time':
+            return ast.Name('_time', ast.Load())
+        if name in _HELPERS:
+            raise CodegenError(f'{name} can only be called')
+        if isinstance(node.ctx, ast.Load):
+            if name in self.generator.constants:
+                return ast.Constant(self.generator.constants[name])
+            if name in _BUILTINS and name not in self.generator.assigned:
+                return node
+        return ast.Subscript(ast.Name('_ctx', ast.Load()), ast.Constant(name), node.ctx)
+
+    def visit_Call(self, node):
+        name = node.func.id if isinstance(node.func, ast.Name) else None
+        if name not in _HELPERS or self._is_local(name) or name == 'event':
+            return self.generic_visit(node)
+
+        node = self.generic_visit(ast.Call(ast.Name('_', ast.Load()), node.args, node.keywords))
+        if name in ('after', 'idle'):
+            if self.source is None or len(node.args) != 1 or node.keywords:
+                raise CodegenError(f'{name}(seconds) can only be used in guards')
+            times = self.generator.entry_times if name == 'after' else self.generator.idle_times
+            times.add(self.source)
+            since = f'_{name[0] if name == "idle" else "e"}{self.generator.index[self.source]}'
+            return ast.Compare(
+                ast.BinOp(ast.Name('_time', ast.Load()), ast.Sub(), node.args[0]),
+                [ast.GtE()],
+                [ast.Attribute(ast.Name('self', ast.Load()), since, ast.Load())],
+            )
+        if name == 'active':
+            argument = node.args[0] if len(node.args) == 1 and not node.keywords else None
+            if isinstance(argument, ast.Constant) and isinstance(argument.value, str):
+                if argument.value not in self.generator.index:
+                    return ast.Constant(False)
+                return ast.Attribute(ast.Name('self', ast.Load()), f'_s{self.generator.index[argument.value]}', ast.Load())
+            node.func = ast.Attribute(ast.Name('self', ast.Load()), '_active', ast.Load())
+        elif name == 'send':
+            node.func = ast.Attribute(ast.Name('self', ast.Load()), '_send', ast.Load())
+        elif name == 'setdefault':
+            node.func = ast.Attribute(ast.Name('_ctx', ast.Load()), 'setdefault', ast.Load())
+        else:
+            raise CodegenError(f'{name}() is not supported')
+        return node
+
+    def visit_Lambda(self, node):
+        node.args = self.visit(node.args)
+        arguments = node.args
+        self.local.append({a.arg for a in arguments.posonlyargs + arguments.args + arguments.kwonlyargs}
+                          | {a.arg for a in (arguments.vararg, arguments.kwarg) if a is not None})
+        node.body = self.visit(node.body)
+        self.local.pop()
+        return node
+
+    def _comprehension(self, node):
+        self.local.append({
+            name.id for generator in node.generators for name in ast.walk(generator.target)
+            if isinstance(name, ast.Name)
+        })
+        node = self.generic_visit(node)
+        self.local.pop()
+        return node
+
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = _comprehension
+
+
+def _assigned(code):
+    """Names assigned by given (code, mode), see guards._preamble_definitions."""
+    code, mode = code
+    if not code:
+        return set()
+    try:
+        tree = ast.parse(code.strip() if mode == 'eval' else code, mode=mode)
+    except SyntaxError:
+        return set()
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load)}
+
+
+def _immutable(value):
+    if isinstance(value, tuple):
+        return all(_immutable(item) for item in value)
+    return value is None or isinstance(value, (bool, int, float, complex, str, bytes))
+
+
+def _identifier(name):
+    identifier = re.sub(r'\W', '_', name)
+    return identifier if identifier.isidentifier() else '_' + identifier
+
+
+def _unique(name, taken):
+    unique, i = name, 1
+    while unique in taken:
+        i += 1
+        unique = f'{name}_{i}'
+    return unique
+
+
+# Used by the generated module when Sismic is not installed
+_FALLBACKS = '''\
+    class SimulatedClock:
+        def __init__(self):
+            self.time = 0
+
+    class NonDeterminismError(Exception):
+        pass
+
+    class ConflictingTransitionsError(Exception):
+        pass
+
+    class Event:
+        __slots__ = ['name', 'data']
+
+        def __init__(self, name, **data):
+            self.name = name
+            self.data = data
+
+        def __getattr__(self, attr):
+            try:
+                return self.data[attr]
+            except KeyError:
+                raise AttributeError(f'{self} has no attribute {attr}') from None
+
+        def __eq__(self, other):
+            return isinstance(other, Event) and (self.name, self.data) == (other.name, other.data)
+
+        def __hash__(self):
+            return hash(self.name)
+
+        def __repr__(self):
+            return f'{type(self).__name__}({self.name!r}, **{self.data!r})'
+
+    class InternalEvent(Event):
+        pass'''.splitlines()
+
+# The methods that do not depend on the statechart
+_METHODS = '''
+    @property
+    def time(self):
+        """Time of the latest execution."""
+        return self._time
+
+    def queue(self, event_or_name, *event_or_names, **parameters):
+        for event in (event_or_name, *event_or_names):
+            self._queue(Event(event, **parameters) if isinstance(event, str) else event)
+        return self
+
+    def execute(self, max_steps=-1):
+        steps = []
+        step = self.execute_once()
+        while step:
+            steps.append(step)
+            if 0 < max_steps == len(steps):
+                break
+            step = self.execute_once()
+        return steps
+
+    def execute_once(self):
+        self._time = time = self.clock.time
+        if not self._initialized:
+            self._initialized = True
+            self._initialize()
+            return Step(time, None, ())
+
+        fired = self._eventless()
+        if fired:
+            return Step(time, None, fired)
+
+        # Internal events first, once their delay has elapsed
+        for queue in (self._internal, self._external):
+            if queue and queue[0][0] <= time:
+                event = queue.pop(0)[1]
+                break
+        else:
+            return None
+        handler = HANDLERS.get(event.name)
+        return Step(time, event, () if handler is None else handler(self, event))
+
+    def _queue(self, event):
+        queue = self._internal if isinstance(event, InternalEvent) else self._external
+        time = self._time + getattr(event, 'delay', 0)
+        position = len(queue)
+        while position and queue[position - 1][0] > time:
+            position -= 1
+        queue.insert(position, (time, event))
+
+    def _send(self, name, **parameters):
+        self._queue(InternalEvent(name, **parameters))
+
+    def _active(self, name):
+        return name in SLOTS and getattr(self, SLOTS[name])
+
+    def _fire(self, found, event):
+        if len(found) > 1:
+            for pair in combinations(found, 2):
+                if pair in CHECKS:
+                    error, message = CHECKS[pair]
+                    raise error(message)
+            found = sorted(found, key=ORDER.__getitem__)
+        for k in found:
+            TRANSITIONS[k](self, event)
+        return tuple(LABELS[k] for k in found)'''.splitlines()
@@ -0,0 +1,236 @@
+import ast
+import math
+import weakref
+from types import CodeType
+
+from sismic.model import ContractMixin
+
+from guards import GuardAnalysis
+
+# ---------------------------------------------------------
+# The compile step.
+#
+# Sismic's Interpreter answers structural questions ("what is the depth of
+# this state?", "which transitions are triggered by this event?") by walking
+# the statechart on every step. None of the answers ever change for a given
+# statechart, so we compute them once and share them between every
+# interpreter of that statechart.
+# ---------------------------------------------------------
+
+# One CompiledStatechart per Statechart, dropped when the statechart is collected
+_compiled = weakref.WeakKeyDictionary()
+
+
+def compile_statechart(statechart):
+    """Return the (shared) CompiledStatechart of given statechart."""
+    compiled = _compiled.get(statechart)
+    if compiled is None:
+        compiled = _compiled[statechart] = CompiledStatechart(statechart)
+    return compiled
+
+
+class CompiledStatechart:
+    """
+    Lookup tables derived from a Statechart.
+
+    The statechart must not be modified once it has been compiled.
+    """
+
+    def __init__(self, statechart):
+        self.statechart = statechart
+        self.states = {name: statechart.state_for(name) for name in statechart.states}
+
+        # Structure
+        self.parent = {name: statechart.parent_for(name) for name in self.states}
+        self.children = {name: tuple(statechart.children_for(name)) for name in self.states}
+        self.ancestors = {name: tuple(statechart.ancestors_for(name)) for name in self.states}
+        self.descendants = {name: tuple(statechart.descendants_for(name)) for name in self.states}
+        self.depth = {name: len(self.ancestors[name]) + 1 for name in self.states}
+
+        # Inner-first order (deepest states first, ties broken by name), as used
+        # to select transitions and stabilize the configuration, and the order of
+        # Interpreter.configuration (shallowest states first)
+        self.inner_first = {
+            name: i for i, name in enumerate(sorted(self.states, key=lambda s: (-self.depth[s], s)))
+        }
+        self.outer_first = {
+            name: i for i, name in enumerate(sorted(self.states, key=lambda s: (self.depth[s], s)))
+        }
+
+        # Transition index: event name -> candidate transitions, see _candidates
+        transitions = statechart.transitions
+        self.eventless = self._candidates([t for t in transitions if t.event is None])
+        self.by_event = {
+            event: self._candidates([t for t in transitions if t.event == event])
+            for event in statechart.events_for()
+        }
+
+        # Priority groups whose guards are proven mutually exclusive (by their
+        # id): the first transition whose guard holds is the only one
+        analysis = GuardAnalysis(statechart)
+        self.exclusive = set()
+        for candidates in (self.eventless, *self.by_event.values()):
+            for _, priority_groups in candidates:
+                for group in priority_groups:
+                    if len(group) > 1 and analysis.exclusive([t.guard for t in group]):
+                        self.exclusive.add(id(group))
+
+        # Exit and entry sets of every external transition, see _scope
+        self.scope = {id(t): self._scope(t) for t in transitions if t.target is not None}
+
+        # Time: states whose eventless transitions wait for after(N) or idle(N),
+        # and states that depend on time in a way we cannot predict
+        self.timers = {}
+        self.clocked = set()
+        for transition in self.eventless_transitions():
+            self._analyse_time(transition.source, transition.guard)
+        for state in self.states.values():
+            for condition in getattr(state, 'invariants', []):
+                self._analyse_time(state.name, condition)
+
+        # Code objects, shared by the evaluators of every interpreter
+        self.evaluable_code = {}
+        self.executable_code = {}
+        self.names = {}
+        self._compile(statechart.preamble, 'exec')
+        for state in self.states.values():
+            self._compile(getattr(state, 'on_entry', None), 'exec')
+            self._compile(getattr(state, 'on_exit', None), 'exec')
+            self._compile_contract(state)
+        for transition in transitions:
+            self._compile(transition.guard, 'eval')
+            self._compile(transition.action, 'exec')
+            self._compile_contract(transition)
+
+    def eventless_transitions(self):
+        for _, priority_groups in self.eventless:
+            for transitions in priority_groups:
+                yield from transitions
+
+    def next_timeout(self, configuration, entry_time, idle_time, time):
+        """
+        Earliest time after given time at which an after(N)/idle(N) of an
+        active state becomes true, or None. States in self.clocked are
+        not taken into account.
+        """
+        earliest = None
+        for state in configuration:
+            for kind, seconds in self.timers.get(state, ()):
+                since = entry_time[state] if kind == 'after' else idle_time[state]
+                deadline = since + seconds
+                # after(N) checks "time - N >= entry time": make sure it holds at the deadline
+                while deadline - seconds < since:
+                    deadline = math.nextafter(deadline, math.inf)
+                if deadline > time and (earliest is None or deadline < earliest):
+                    earliest = deadline
+        return earliest
+
+    def _analyse_time(self, state, code):
+        """
+        Record the after(N)/idle(N) calls with a constant N found in given
+        guard or invariant, as (kind, N) pairs in self.timers[state]. If the
+        code uses time in any other way, add the state to self.clocked.
+        """
+        if not code:
+            return
+        try:
+            tree = ast.parse(code, mode='eval')
+        except SyntaxError:
+            self.clocked.add(state)
+            return
+
+        found = set()
+        calls = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ('after', 'idle'):
+                calls.add(id(node.func))
+                try:
+                    seconds = ast.literal_eval(node.args[0]) if len(node.args) == 1 and not node.keywords else None
+                except ValueError:
+                    seconds = None
+                if isinstance(seconds, (int, float)) and not isinstance(seconds, bool):
+                    found.add((node.func.id, float(seconds)))
+                else:
+                    self.clocked.add(state)
+            elif isinstance(node, ast.Name) and node.id in ('after', 'idle', 'time') and id(node) not in calls:
+                # after/idle passed around, or time compared directly
+                self.clocked.add(state)
+        if found:
+            self.timers[state] = tuple(sorted(set(self.timers.get(state, ())) | found))
+
+    def _candidates(self, transitions):
+        """
+        Group transitions the way Interpreter._select_transitions considers them:
+        a tuple of (source, priority groups) pairs, in inner-first order, where
+        priority groups are tuples of transitions by decreasing priority, each
+        group keeping the declaration order.
+        """
+        per_source = {}
+        for transition in transitions:
+            per_source.setdefault(transition.source, []).append(transition)
+
+        candidates = []
+        for source in sorted(per_source, key=self.inner_first.__getitem__):
+            groups = {}
+            for transition in per_source[source]:
+                groups.setdefault(transition.priority, []).append(transition)
+            candidates.append(
+                (source, tuple(tuple(groups[p]) for p in sorted(groups, reverse=True)))
+            )
+        return tuple(candidates)
+
+    def _scope(self, transition):
+        """
+        Return (exit candidates, entered states) for an external transition.
+        Exit candidates are in exit order, and must be filtered by the active
+        configuration.
+        """
+        source, target = transition.source, transition.target
+        lca = None
+        for state in self.ancestors[source]:
+            if state in self.ancestors[target]:
+                lca = state
+                break
+
+        # Highest ancestor of the source that is a child of the LCA
+        last_before_lca = source
+        for state in self.ancestors[source]:
+            if state == lca:
+                break
+            last_before_lca = state
+        exited = self.descendants[last_before_lca][::-1] + (last_before_lca,)
+
+        entered = [target]
+        for state in self.ancestors[target]:
+            if state == lca:
+                break
+            entered.insert(0, state)
+        return exited, tuple(entered)
+
+    def _compile_contract(self, obj):
+        if isinstance(obj, ContractMixin):
+            for condition in obj.preconditions + obj.postconditions + obj.invariants:
+                self._compile(condition, 'eval')
+
+    def _compile(self, code, mode):
+        if not code:
+            return
+        table = self.evaluable_code if mode == 'eval' else self.executable_code
+        if code in table:
+            return
+        try:
+            compiled_code = compile(code, '<string>', mode)
+        except SyntaxError:
+            # Let the evaluator report it, if and when this code is reached
+            return
+        table[code] = compiled_code
+        self.names[code] = _referenced_names(compiled_code)
+
+
+def _referenced_names(code):
+    """Every global/local name used by a code object, including nested lambdas and comprehensions."""
+    names = set(code.co_names) | set(code.co_varnames) | set(code.co_freevars)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            names |= _referenced_names(const)
+    return frozenset(names)
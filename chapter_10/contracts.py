@@ -0,0 +1,172 @@
+import weakref
+
+from sismic.model import StateMixin
+
+from engine import CompiledInterpreter
+
+# ---------------------------------------------------------
+# Incremental contract checking.
+#
+# After every macro step, Interpreter checks the invariants of every active
+# state: `always: attempts < MAX_ATTEMPTS` on Locked is evaluated again
+# after a step that did not touch `attempts`, and after a step that did
+# nothing at all.
+#
+# An invariant that only reads context variables gives the same answer as
+# long as none of these variables is assigned, and none of their values is
+# changed in place. IncrementalContractInterpreter records which variables
+# the invariants of each state read, and the assignments made to the
+# context (by actions, by setdefault, or from the outside). The invariants
+# of an active state are evaluated again only if:
+#   - the state was entered since they were checked (__old__ changed)
+#   - one of the variables they read was assigned since then
+#   - one of the values they read is mutable (a list, an object...)
+#   - they use time, event, after(), idle(), sent(), received() or active()
+#
+# Preconditions, postconditions and the invariants of transitions are
+# checked whenever Interpreter checks them: they are tied to a particular
+# entry, exit or transition.
+# ---------------------------------------------------------
+
+# Names exposed by the evaluator that change without any assignment
+_VOLATILE = frozenset(['time', 'event', 'after', 'idle', 'sent', 'received', 'active', 'send', 'notify', 'setdefault'])
+_IMMUTABLE = frozenset([type(None), bool, int, float, complex, str, bytes])
+
+# Per statechart: state name -> names read by its invariants, or None if they must always be evaluated
+_dependencies = weakref.WeakKeyDictionary()
+
+
+class IncrementalContractInterpreter(CompiledInterpreter):
+    """
+    A CompiledInterpreter that skips the invariants of a state when nothing
+    they read changed since they held. Same parameters, same semantics,
+    same ContractError.
+
+    invariants_checked and invariants_skipped count the states whose
+    invariants were (not) evaluated at the end of a macro step.
+    """
+
+    def __init__(self, statechart, **kwargs):
+        super().__init__(statechart, **kwargs)
+        self._evaluator._context = TrackedContext(self._evaluator._context)
+        self._holding = {}  # State name -> (names, write count) when its invariants held
+        self.invariants_checked = 0
+        self.invariants_skipped = 0
+
+    def _evaluate_contract_conditions(self, obj, cond_type, step=None):
+        if self._ignore_contract or not isinstance(obj, StateMixin):
+            return super()._evaluate_contract_conditions(obj, cond_type, step)
+
+        if cond_type == 'preconditions':
+            self._holding.pop(obj.name, None)  # Entered: __old__ changes
+        elif cond_type == 'invariants' and getattr(obj, 'invariants', None):
+            return self._check_invariants(obj, step)
+        return super()._evaluate_contract_conditions(obj, cond_type, step)
+
+    def _check_invariants(self, state, step):
+        context = self._evaluator._context
+        if not isinstance(context, TrackedContext):
+            # Replaced from the outside: whatever happened to it was not tracked
+            context = self._evaluator._context = TrackedContext(context)
+            self._holding.clear()
+
+        holding = self._holding.get(state.name)
+        if holding is not None:
+            names, writes = holding
+            if all(context.written.get(name, -1) < writes for name in names):
+                self.invariants_skipped += 1
+                return
+
+        self.invariants_checked += 1
+        self._holding.pop(state.name, None)
+        writes = context.writes
+        super()._evaluate_contract_conditions(state, 'invariants', step)  # Raises InvariantError
+
+        names = _invariant_dependencies(self._compiled).get(state.name)
+        if names is not None and all(_immutable(context[name]) for name in names if name in context):
+            self._holding[state.name] = (names, writes)
+
+    def __getstate__(self):
+        attributes = super().__getstate__()
+        attributes['_holding'] = {}  # Write numbers start over in the copy of the context
+        return attributes
+
+
+class TrackedContext(dict):
+    """
+    A dict that numbers its writes: written[name] is the number of the
+    latest write of name, writes the number of the next one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.written = {}
+        self.writes = 0
+
+    def _write(self, name):
+        self.written[name] = self.writes
+        self.writes += 1
+
+    def __setitem__(self, name, value):
+        self._write(name)
+        super().__setitem__(name, value)
+
+    def __delitem__(self, name):
+        self._write(name)
+        super().__delitem__(name)
+
+    def setdefault(self, name, default=None):
+        if name not in self:
+            self._write(name)
+        return super().setdefault(name, default)
+
+    def pop(self, name, *default):
+        self._write(name)
+        return super().pop(name, *default)
+
+    def popitem(self):
+        name, value = super().popitem()
+        self._write(name)
+        return name, value
+
+    def update(self, *args, **kwargs):
+        for name, value in dict(*args, **kwargs).items():
+            self[name] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        for name in list(self):
+            self._write(name)
+        super().clear()
+
+    def __reduce__(self):
+        return TrackedContext, (dict(self),)  # A copy starts with no history: nothing holds yet
+
+
+def _invariant_dependencies(compiled):
+    """State name -> the names read by its invariants, or None if they must always be evaluated."""
+    statechart = compiled.statechart
+    dependencies = _dependencies.get(statechart)
+    if dependencies is None:
+        dependencies = _dependencies[statechart] = {}
+        for name, state in compiled.states.items():
+            names = set()
+            for condition in getattr(state, 'invariants', None) or ():
+                referenced = compiled.names.get(condition)
+                if referenced is None or not referenced.isdisjoint(_VOLATILE):
+                    names = None  # Syntax error, or time/event/... dependent
+                    break
+                names |= referenced
+            if names is not None:
+                names.discard('__old__')  # Only changes when the state is entered
+                dependencies[name] = frozenset(names)
+    return dependencies
+
+
+def _immutable(value):
+    if type(value) in (tuple, frozenset):
+        return all(_immutable(item) for item in value)
+    return type(value) in _IMMUTABLE
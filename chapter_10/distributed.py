@@ -0,0 +1,453 @@
+import hmac
+import multiprocessing
+import os
+import pickle
+import socket
+import struct
+import types
+
+from sismic.clock import SimulatedClock
+from sismic.interpreter.listener import InternalEventListener
+from sismic.model import Event
+
+from engine import CompiledInterpreter, next_deadline, polled_deadline
+
+# ---------------------------------------------------------
+# A distributed runtime for bound statecharts.
+#
+# chapter_08/run_sync.py runs the vault, the charger and the monitor in one
+# process: every chart competes for the same core. A Cluster places
+# interpreters on nodes (worker processes, on this machine or elsewhere),
+# and carries the events they send to each other.
+#
+# Time moves in rounds, driven by the cluster. In a round, each node sets
+# its clock to the time of the cluster, queues the events delivered to its
+# interpreters, executes the ones that have something to do, and answers
+# with the events they sent and its next after()/idle() deadline. The
+# events are delivered in the next round. Rounds are repeated until no
+# event is in flight, and the cluster then moves time to the next deadline
+# (see AsyncSystem.advance, which does the same with tasks).
+#
+# An event sent in a round is always delivered in the next one, even to an
+# interpreter of the same node: the result does not depend on where the
+# interpreters are placed.
+#
+# Nodes and the cluster exchange one frame per round in each direction: a
+# 4-byte length, then the pickled list of every command (or the reply).
+# Unpickling runs code: before any frame, a node that joins through
+# accept() and the cluster prove to each other that they know a shared
+# key (an HMAC challenge in each direction). Frames are not encrypted:
+# use a trusted network, or a tunnel.
+# ---------------------------------------------------------
+
+_HEADER = struct.Struct('!I')
+_NONCE = 32  # Bytes of a challenge
+_DIGEST = 32  # Bytes of an answer (HMAC-SHA256)
+_HANDSHAKE_TIMEOUT = 10  # Seconds a joining peer has to answer
+
+
+class RemoteError(Exception):
+    """An exception raised on a node."""
+
+
+class Cluster:
+    """
+    Run bound interpreters on several nodes, under a shared simulated time.
+
+    :param processes: number of worker processes to start on this machine
+        (default to the number of CPUs). 0 runs a single node in the current
+        process. Nodes on other machines join with accept() and run_node().
+    :param poll_interval: how often interpreters whose time-based guards
+        cannot be predicted are executed
+    """
+
+    def __init__(self, processes=None, *, poll_interval=0.1):
+        self.time = 0
+        self.poll_interval = poll_interval
+        self._links = []
+        self._pending = []  # Per node: commands to send with the next frame
+        self._deadlines = []  # Per node: when it has something to do next, None for nothing
+        self._charts = []  # Per node: ids of the statecharts it knows
+        self._statecharts = {}  # Id -> statechart, so that ids stay valid
+        self._placement = {}  # Interpreter name -> node index
+        self._order = {}  # Interpreter name -> rank, to deliver events in a placement-independent order
+        self._processes = []
+
+        if processes == 0:
+            self._join(_LocalLink(_Node()))
+        for _ in range((os.cpu_count() or 1) if processes is None else processes):
+            parent, child = socket.socketpair()
+            process = multiprocessing.Process(target=_serve, args=(child,), daemon=True)
+            process.start()
+            child.close()
+            self._processes.append(process)
+            self._join(_SocketLink(parent))
+
+    def accept(self, address, count, *, authkey):
+        """
+        Wait for count nodes to connect to given address (a path for a
+        Unix-domain socket, or a (host, port) pair), see run_node.
+        Connections that do not prove they know authkey (bytes) are closed,
+        and not counted.
+        """
+        listener = socket.socket(socket.AF_UNIX if isinstance(address, str) else socket.AF_INET)
+        try:
+            listener.bind(address)
+            listener.listen(count)
+            joined = 0
+            while joined < count:
+                connection, _ = listener.accept()
+                if connection.family != socket.AF_UNIX:
+                    connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                try:
+                    _authenticate(connection, authkey, b'cluster', b'node')
+                except (multiprocessing.AuthenticationError, OSError):
+                    connection.close()
+                    continue
+                self._join(_SocketLink(connection))
+                joined += 1
+        finally:
+            listener.close()
+            if isinstance(address, str):
+                os.unlink(address)
+
+    @property
+    def nodes(self):
+        return len(self._links)
+
+    def add(self, name, statechart, *, node=None, **kwargs):
+        """
+        Create an interpreter of given statechart on a node.
+
+        :param node: the index of the node (default: the nodes take turns)
+        :param kwargs: passed to CompiledInterpreter (they must be picklable,
+            and the clock is the node's)
+        """
+        if name in self._placement:
+            raise ValueError(f'Interpreter {name!r} already exists')
+        node = len(self._placement) % len(self._links) if node is None else node
+        if id(statechart) not in self._charts[node]:
+            self._statecharts[id(statechart)] = statechart
+            self._charts[node].add(id(statechart))
+            self._pending[node].append(('chart', id(statechart), statechart))
+        self._pending[node].append(('add', name, id(statechart), kwargs))
+        self._placement[name] = node
+        self._order[name] = len(self._order)
+        self._deadlines[node] = self.time  # Boot it in the next round
+
+    def bind(self, source, target):
+        """Deliver the events sent by the source interpreter to the target interpreter, like Interpreter.bind."""
+        self._check(target)
+        self._pending[self._placement[source]].append(('bind', source, target))
+
+    def bridge(self, source, target, translate):
+        """
+        Deliver events made from the meta-events of the source interpreter to
+        the target interpreter.
+
+        :param translate: a picklable function (meta_event, interpreter) that
+            returns the event to deliver, or None
+        """
+        self._check(target)
+        self._pending[self._placement[source]].append(('bridge', source, target, translate))
+
+    def queue(self, name, event_or_name, *event_or_names, **parameters):
+        """Queue events on given interpreter, like Interpreter.queue. They are processed by the next round."""
+        node = self._placement[name]
+        for event in (event_or_name,) + event_or_names:
+            event = Event(event, **parameters) if isinstance(event, str) else event
+            self._pending[node].append(('queue', name, event))
+        self._deadlines[node] = self.time
+
+    def run_until_quiescent(self):
+        """Run rounds at the current time until no event is in flight."""
+        while self._round():
+            pass
+
+    def advance(self, seconds):
+        """
+        Move time forward, stopping at every after()/idle() deadline on the
+        way so that timers fire in order, and run until quiescent at each of
+        them.
+        """
+        until = self.time + seconds
+        self.run_until_quiescent()
+        while True:
+            upcoming = [deadline for deadline in self._deadlines if deadline is not None and deadline <= until]
+            if not upcoming:
+                break
+            self.time = max(self.time, min(upcoming))
+            self.run_until_quiescent()
+        self.time = max(self.time, until)
+
+    def configuration(self, name):
+        """The configuration of given interpreter."""
+        return self._ask(name, ('configuration', name))
+
+    def context(self, name):
+        """The context of given interpreter, without its functions and modules."""
+        return self._ask(name, ('context', name))
+
+    def close(self):
+        """Disconnect the nodes, and wait for the worker processes to end."""
+        for link in self._links:
+            link.close()
+        for process in self._processes:
+            process.join()
+        self._links, self._processes = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # ---------------------------------------------------------
+    # Rounds
+    # ---------------------------------------------------------
+
+    def _join(self, link):
+        self._links.append(link)
+        self._pending.append([('configure', self.poll_interval)])
+        self._deadlines.append(self.time)
+        self._charts.append(set())
+
+    def _check(self, name):
+        if name not in self._placement:
+            raise KeyError(name)
+
+    def _round(self):
+        """Run a round on the nodes that have something to do. Return False if none had."""
+        due = [
+            node for node, deadline in enumerate(self._deadlines)
+            if self._pending[node] or (deadline is not None and deadline <= self.time)
+        ]
+        if not due:
+            return False
+
+        # Every node works on its frame at the same time
+        for node in due:
+            commands, self._pending[node] = self._pending[node], []
+            commands.append(('round', self.time))
+            self._links[node].send(commands)
+
+        # Read every reply, even after an error: the next frames would be answered by this round's
+        sent = []
+        error = None
+        for node in due:
+            try:
+                outbox, self._deadlines[node] = self._receive(node)
+            except RemoteError as e:
+                error = error or e
+                self._deadlines[node] = self.time  # Look at it again in the next round
+                continue
+            sent.extend(outbox)
+
+        sent.sort(key=lambda message: self._order[message[0]])  # Stable: keeps each sender's order
+        for _, target, event in sent:
+            node = self._placement[target]
+            self._pending[node].append(('queue', target, event))
+        if error is not None:
+            raise error
+        return True
+
+    def _ask(self, name, command):
+        node = self._placement[name]
+        commands, self._pending[node] = self._pending[node], []
+        self._links[node].send(commands + [command])
+        return self._receive(node)
+
+    def _receive(self, node):
+        ok, value = self._links[node].receive()
+        if not ok:
+            raise RemoteError(f'Node {node}: {value}')
+        return value
+
+
+def run_node(address, *, authkey):
+    """
+    Connect to a Cluster waiting in accept() at given address, and serve it
+    until it closes. Raise multiprocessing.AuthenticationError if it does
+    not prove it knows authkey (bytes).
+    """
+    connection = socket.socket(socket.AF_UNIX if isinstance(address, str) else socket.AF_INET)
+    connection.connect(address)
+    if connection.family != socket.AF_UNIX:
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    try:
+        _authenticate(connection, authkey, b'node', b'cluster')
+    except Exception:
+        connection.close()
+        raise
+    _serve(connection)
+
+
+class _Node:
+    """The interpreters of a node, and the commands of the cluster."""
+
+    def __init__(self):
+        self.clock = SimulatedClock()
+        self.poll_interval = 0.1
+        self.charts = {}
+        self.interpreters = {}
+        self.outbox = []  # (source, target, event) sent during the current round
+
+    def handle(self, commands):
+        """Run given commands, and return (True, result of the last one) or (False, error)."""
+        try:
+            result = None
+            for command in commands:
+                result = getattr(self, '_' + command[0])(*command[1:])
+            return True, result
+        except Exception as e:
+            return False, f'{type(e).__name__}: {e}'
+
+    def _configure(self, poll_interval):
+        self.poll_interval = poll_interval
+
+    def _chart(self, key, statechart):
+        self.charts[key] = statechart
+
+    def _add(self, name, key, kwargs):
+        self.interpreters[name] = CompiledInterpreter(self.charts[key], clock=self.clock, **kwargs)
+
+    def _bind(self, source, target):
+        send = lambda event: self.outbox.append((source, target, event))
+        self.interpreters[source].attach(InternalEventListener(send))
+
+    def _bridge(self, source, target, translate):
+        interpreter = self.interpreters[source]
+
+        def listener(meta_event):
+            event = translate(meta_event, interpreter)
+            if event is not None:
+                self.outbox.append((source, target, event))
+        interpreter.attach(listener)
+
+    def _queue(self, name, event):
+        self.interpreters[name].queue(event)
+
+    def _round(self, time):
+        if time > self.clock.time:
+            self.clock.time = time
+        earliest = None
+        for interpreter in self.interpreters.values():
+            deadline = next_deadline(interpreter, interpreter.compiled)
+            if deadline is not None and deadline <= time:
+                interpreter.execute()
+                deadline = polled_deadline(interpreter, self.poll_interval, interpreter.compiled, now=time)
+            if deadline is not None and (earliest is None or deadline < earliest):
+                earliest = deadline
+        outbox, self.outbox = self.outbox, []
+        return outbox, earliest
+
+    def _configuration(self, name):
+        return self.interpreters[name].configuration
+
+    def _context(self, name):
+        return {
+            k: v for k, v in self.interpreters[name].context.items()
+            if not callable(v) and not isinstance(v, types.ModuleType)
+        }
+
+
+class _SocketLink:
+    """A node at the other end of a stream socket."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def send(self, commands):
+        _write(self.connection, commands)
+
+    def receive(self):
+        reply = _read(self.connection)
+        if reply is None:
+            raise RemoteError('The node closed the connection')
+        return reply
+
+    def close(self):
+        try:
+            # Worker processes started after this one hold a copy of the socket:
+            # closing ours would not end the connection
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.connection.close()
+
+
+class _LocalLink:
+    """A node in the current process. Frames are pickled all the same: events are copies, as elsewhere."""
+
+    def __init__(self, node):
+        self.node = node
+        self.reply = None
+
+    def send(self, commands):
+        self.reply = pickle.dumps(self.node.handle(pickle.loads(pickle.dumps(commands, pickle.HIGHEST_PROTOCOL))))
+
+    def receive(self):
+        reply, self.reply = self.reply, None
+        return pickle.loads(reply)
+
+    def close(self):
+        pass
+
+
+def _serve(connection):
+    """Run a node on given socket, until the cluster closes it."""
+    node = _Node()
+    with connection:
+        while True:
+            commands = _read(connection)
+            if commands is None:
+                return
+            _write(connection, node.handle(commands))
+
+
+def _authenticate(connection, authkey, role, peer):
+    """
+    Prove to the other end of given connection that we know authkey, and
+    check that it does. Each end answers the other's challenge with an HMAC
+    of its role and the challenge: a challenge sent back is not answered.
+    """
+    if not isinstance(authkey, bytes):
+        raise TypeError('authkey must be bytes')
+    connection.settimeout(_HANDSHAKE_TIMEOUT)
+    challenge = os.urandom(_NONCE)
+    connection.sendall(challenge)
+    theirs = _read_exactly(connection, _NONCE)
+    if theirs is None:
+        raise multiprocessing.AuthenticationError('The connection was closed during the handshake')
+    connection.sendall(hmac.new(authkey, role + theirs, 'sha256').digest())
+    answer = _read_exactly(connection, _DIGEST)
+    if answer is None or not hmac.compare_digest(answer, hmac.new(authkey, peer + challenge, 'sha256').digest()):
+        raise multiprocessing.AuthenticationError('The other end does not know the key')
+    connection.settimeout(None)
+
+
+def _write(connection, value):
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    connection.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _read(connection):
+    """The next frame, or None if the connection is closed."""
+    header = _read_exactly(connection, _HEADER.size)
+    if header is None:
+        return None
+    data = _read_exactly(connection, _HEADER.unpack(header)[0])
+    if data is None:
+        return None
+    return pickle.loads(data)
+
+
+def _read_exactly(connection, size):
+    chunks = []
+    while size:
+        chunk = connection.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
@@ -0,0 +1,271 @@
+import asyncio
+import functools
+import inspect
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from sismic.model import Event
+
+from engine import CompiledInterpreter
+
+# ---------------------------------------------------------
+# Deferred side effects.
+#
+# In chapter 3, `hw.lock_mechanism()` runs inside the step: if the
+# solenoid takes 50 ms, the interpreter (and every other vault served by
+# the same thread) waits 50 ms.
+#
+# An effect target is a stand-in for such an object. Calling one of its
+# methods during a step only records the call. When the step ends, the
+# recorded calls are handed over to a dispatcher, which runs them in the
+# background:
+#   - calls on the same target run one after the other, in the order in
+#     which they were recorded
+#   - calls on different targets run concurrently
+#   - when a call returns (or raises), an EFFECT_DONE (or EFFECT_FAILED)
+#     event is queued on the interpreter whose step made the call
+#
+# ThreadedEffects runs the calls on a thread pool. AsyncioEffects runs them
+# on the running event loop (coroutine methods are awaited, the others run
+# in the loop's executor).
+# ---------------------------------------------------------
+
+DONE = 'EFFECT_DONE'
+FAILED = 'EFFECT_FAILED'
+
+
+class Effects:
+    """
+    Base class of the dispatchers: records the calls made on its targets
+    during the steps of the interpreters it is attached to.
+
+    :param done: name of the event queued when a call returns, with
+        target, method and result parameters (None: no event)
+    :param failed: name of the event queued when a call raises, with
+        target, method and error parameters (None: no event)
+    """
+
+    def __init__(self, *, done=DONE, failed=FAILED):
+        self.done = done
+        self.failed = failed
+        self._recorded = []  # Calls made since the beginning of the current step
+
+    def target(self, obj, name=None):
+        """
+        Return an effect target for given object, to put in the context of
+        an interpreter instead of the object itself.
+
+        :param obj: the object whose method calls are deferred
+        :param name: the name of the target in completion events (default
+            to the name of the class of the object)
+        """
+        return EffectTarget(self, obj, type(obj).__name__ if name is None else name)
+
+    def attach(self, interpreter):
+        """
+        Dispatch the calls made during the steps of given interpreter, when
+        each step ends. Attach every interpreter whose context holds targets
+        of this dispatcher: calls are attributed to the interpreter whose
+        step ends next.
+        """
+        listener = _StepListener(self, interpreter)
+        if isinstance(interpreter, CompiledInterpreter):
+            interpreter.attach(listener, names=['step started', 'step ended'])
+        else:
+            interpreter.attach(listener)
+        return listener
+
+    def _record(self, call):
+        self._recorded.append(call)
+
+    def _step_boundary(self, interpreter):
+        # At the end of a step, and at the beginning of the next one in case
+        # the previous step raised: its calls happened, as they would have
+        # without deferring them
+        if self._recorded:
+            calls, self._recorded = self._recorded, []
+            self._dispatch(interpreter, calls)
+
+    def _dispatch(self, interpreter, calls):
+        raise NotImplementedError()
+
+    def _completion(self, interpreter, call, result, error):
+        """The event to queue on given interpreter for given completed call, or None."""
+        target, method = call[0]._name, call[1]
+        if error is None:
+            return None if self.done is None else Event(self.done, target=target, method=method, result=result)
+        return None if self.failed is None else Event(self.failed, target=target, method=method, error=error)
+
+
+class EffectTarget:
+    """
+    Stand-in for an object whose method calls are deferred, see Effects.target.
+
+    Calls return None. Other attributes are read from the object, at the
+    time they are read.
+    """
+
+    __slots__ = ('_effects', '_obj', '_name')  # Underscores: not to hide the attributes of the object
+
+    def __init__(self, effects, obj, name):
+        self._effects = effects
+        self._obj = obj
+        self._name = name
+
+    def __getattr__(self, attribute):
+        value = getattr(self._obj, attribute)
+        if not callable(value):
+            return value
+        return functools.partial(self._call, attribute)
+
+    def _call(self, method, *args, **kwargs):
+        self._effects._record((self, method, args, kwargs))
+
+    def __repr__(self):
+        return f'EffectTarget({self._obj!r}, {self._name!r})'
+
+
+class ThreadedEffects(Effects):
+    """
+    Run deferred calls on a thread pool.
+
+    Completion events are not queued from the threads (interpreters are not
+    thread-safe): call deliver() or wait() from the thread that executes the
+    interpreters.
+
+    :param max_workers: passed to ThreadPoolExecutor
+    """
+
+    def __init__(self, max_workers=None, **kwargs):
+        super().__init__(**kwargs)
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='effects')
+        self._condition = threading.Condition()
+        self._lanes = {}  # id(target) -> deque of (interpreter, call), while a worker drains it
+        self._running = 0  # Calls dispatched and not completed yet
+        self._completions = queue.SimpleQueue()
+
+    def deliver(self):
+        """Queue the events of the calls completed so far on their interpreters, and return their number."""
+        count = 0
+        while True:
+            try:
+                interpreter, call, result, error = self._completions.get_nowait()
+            except queue.Empty:
+                return count
+            event = self._completion(interpreter, call, result, error)
+            if event is not None:
+                interpreter.queue(event)
+            count += 1
+
+    def wait(self, timeout=None):
+        """Wait until every dispatched call completed (or for at most timeout seconds), then deliver()."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._running == 0, timeout)
+        return self.deliver()
+
+    def shutdown(self):
+        """Wait for the dispatched calls, and stop the threads."""
+        self._executor.shutdown(wait=True)
+
+    def _dispatch(self, interpreter, calls):
+        with self._condition:
+            for call in calls:
+                key = id(call[0]._obj)
+                lane = self._lanes.get(key)
+                if lane is None:
+                    lane = self._lanes[key] = deque()
+                    self._executor.submit(self._drain, key)
+                lane.append((interpreter, call))
+                self._running += 1
+
+    def _drain(self, key):
+        """Run the calls of a target, in order, until there is none left."""
+        while True:
+            with self._condition:
+                lane = self._lanes[key]
+                if not lane:
+                    del self._lanes[key]
+                    return
+                interpreter, call = lane.popleft()
+
+            result, error = _run(call)
+            self._completions.put((interpreter, call, result, error))
+            with self._condition:
+                self._running -= 1
+                self._condition.notify_all()
+
+
+class AsyncioEffects(Effects):
+    """
+    Run deferred calls on the running event loop: the interpreters must be
+    executed from it, as AsyncSystem does. Coroutine methods are awaited,
+    the other ones run in the loop's default executor.
+
+    :param post: a callable (interpreter, event) that queues a completion
+        event, default to interpreter.queue(event). Use AsyncSystem.queue to
+        have the interpreter executed.
+    """
+
+    def __init__(self, *, post=None, **kwargs):
+        super().__init__(**kwargs)
+        self.post = post if post is not None else lambda interpreter, event: interpreter.queue(event)
+        self._lanes = {}  # id(target) -> deque of (interpreter, call), while a task drains it
+        self._tasks = set()
+
+    async def wait(self):
+        """Wait until every dispatched call completed and its event is posted."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+    def _dispatch(self, interpreter, calls):
+        for call in calls:
+            key = id(call[0]._obj)
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = self._lanes[key] = deque()
+                task = asyncio.get_running_loop().create_task(self._drain(key))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            lane.append((interpreter, call))
+
+    async def _drain(self, key):
+        loop = asyncio.get_running_loop()
+        lane = self._lanes[key]
+        while lane:
+            interpreter, call = lane.popleft()
+            target, method, args, kwargs = call
+            function = getattr(target._obj, method)
+            if inspect.iscoroutinefunction(function):
+                try:
+                    result, error = await function(*args, **kwargs), None
+                except Exception as e:
+                    result, error = None, e
+            else:
+                result, error = await loop.run_in_executor(None, _run, call)
+            event = self._completion(interpreter, call, result, error)
+            if event is not None:
+                self.post(interpreter, event)
+        del self._lanes[key]
+
+
+class _StepListener:
+    """Listener attached by Effects.attach."""
+
+    def __init__(self, effects, interpreter):
+        self.effects = effects
+        self.interpreter = interpreter
+
+    def __call__(self, meta_event):
+        if meta_event.name in ('step started', 'step ended'):
+            self.effects._step_boundary(self.interpreter)
+
+
+def _run(call):
+    """Make given recorded call: return (result, None), or (None, exception)."""
+    target, method, args, kwargs = call
+    try:
+        return getattr(target._obj, method)(*args, **kwargs), None
+    except Exception as e:
+        return None, e
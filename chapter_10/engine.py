@@ -0,0 +1,408 @@
+from sismic.code import PythonEvaluator
+from sismic.exceptions import CodeEvaluationError
+from sismic.interpreter import Interpreter
+from sismic.interpreter.listener import InternalEventListener
+from sismic.model import (
+    CompoundState,
+    DeepHistoryState,
+    FinalState,
+    InternalEvent,
+    MetaEvent,
+    MicroStep,
+    OrthogonalState,
+    ShallowHistoryState,
+)
+
+from compiler import compile_statechart
+
+# ---------------------------------------------------------
+# A drop-in Interpreter that runs on a CompiledStatechart.
+#
+# Same semantics as sismic.interpreter.Interpreter (and the same API), but
+# every structural question is answered from the precomputed tables, and
+# every piece of code is compiled once per statechart.
+# ---------------------------------------------------------
+
+
+class CompiledEvaluator(PythonEvaluator):
+    """
+    A PythonEvaluator that shares its code objects with every other
+    interpreter of the same statechart, and only exposes the helpers
+    (after, idle, active...) that a piece of code actually uses.
+    """
+
+    def __init__(self, interpreter=None, *, initial_context=None):
+        super().__init__(interpreter, initial_context=initial_context)
+        self._names = {}
+        if interpreter is not None:
+            self._link(compile_statechart(interpreter.statechart))
+
+    def _link(self, compiled):
+        self._evaluable_code = compiled.evaluable_code
+        self._executable_code = compiled.executable_code
+        self._names = compiled.names
+
+    def _evaluate_code(self, code, *, additional_context=None):
+        if code is None:
+            return True
+
+        names = self._names.get(code)
+        compiled_code = self._evaluable_code.get(code)
+        if names is None or compiled_code is None:
+            return super()._evaluate_code(code, additional_context=additional_context)
+
+        interpreter = self._interpreter
+        exposed_context = {'time': interpreter.time}
+        if 'active' in names:
+            exposed_context['active'] = lambda s: s in interpreter._configuration
+        if additional_context:
+            exposed_context.update(additional_context)
+
+        try:
+            return bool(eval(compiled_code, exposed_context, self._context))
+        except Exception as e:
+            raise CodeEvaluationError(f"'{e}' occurred while evaluating '{code}'") from e
+
+    def _execute_code(self, code, *, additional_context=None):
+        if code is None:
+            return []
+
+        names = self._names.get(code)
+        compiled_code = self._executable_code.get(code)
+        if names is None or compiled_code is None:
+            return super()._execute_code(code, additional_context=additional_context)
+
+        interpreter = self._interpreter
+        sent_events = []
+        exposed_context = {'time': interpreter.time}
+        if 'send' in names:
+            exposed_context['send'] = lambda name, **kwargs: sent_events.append(InternalEvent(name, **kwargs))
+        if 'notify' in names:
+            exposed_context['notify'] = lambda name, **kwargs: sent_events.append(MetaEvent(name, **kwargs))
+        if 'active' in names:
+            exposed_context['active'] = lambda s: s in interpreter._configuration
+        if 'setdefault' in names:
+            exposed_context['setdefault'] = self._setdefault
+        if additional_context:
+            exposed_context.update(additional_context)
+
+        try:
+            exec(compiled_code, exposed_context, self._context)  # noqa
+            return sent_events
+        except Exception as e:
+            raise CodeEvaluationError(f"'{e}' occurred while executing '{code}'") from e
+
+    def evaluate_guard(self, transition, event=None):
+        code = transition.guard
+        names = self._names.get(code)
+        if names is None:
+            return super().evaluate_guard(transition, event)
+
+        interpreter = self._interpreter
+        source = transition.source
+        additional_context = {'event': event}
+        if 'after' in names:
+            additional_context['after'] = (
+                lambda seconds: interpreter.time - seconds >= interpreter._entry_time[source]
+            )
+        if 'idle' in names:
+            additional_context['idle'] = (
+                lambda seconds: interpreter.time - seconds >= interpreter._idle_time[source]
+            )
+        return self._evaluate_code(code, additional_context=additional_context)
+
+    def __getstate__(self):
+        attributes = super().__getstate__()
+        attributes['_names'] = {}  # Re-linked by CompiledInterpreter.__setstate__
+        return attributes
+
+
+class CompiledInterpreter(Interpreter):
+    """
+    An Interpreter that selects transitions through an event index.
+
+    Accepts the same parameters as sismic.interpreter.Interpreter.
+    """
+
+    def __init__(self, statechart, **kwargs):
+        self._compiled = compile_statechart(statechart)
+        kwargs.setdefault('evaluator_klass', CompiledEvaluator)
+        super().__init__(statechart, **kwargs)
+        self._subscriptions = []
+        self._routes = {}  # Meta-event name -> callables
+        self._catch_all = ()  # Callables for the other meta-events
+        self._wanted = frozenset()  # Names of the meta-events someone listens to, None for all of them
+
+    @property
+    def compiled(self):
+        """The CompiledStatechart shared by every interpreter of this statechart."""
+        return self._compiled
+
+    @property
+    def configuration(self):
+        return sorted(self._configuration, key=self._compiled.outer_first.__getitem__)
+
+    def next_deadline(self):
+        """See next_deadline(interpreter)."""
+        return next_deadline(self, self._compiled)
+
+    def attach(self, listener, *, names=None, states=None, batch=False):
+        """
+        Attach given listener to the current interpreter, like Interpreter.attach.
+
+        :param listener: a callable that accepts meta-events
+        :param names: if given, only the meta-events with one of these names
+            ('state entered', 'event sent'...) are delivered
+        :param states: if given, 'state entered', 'state exited' and
+            'transition processed' are only delivered for these states
+            (other meta-events are not affected)
+        :param batch: if True, the listener is called once per macro step,
+            at its end, with the list of its meta-events
+        """
+        if names is None and states is None and isinstance(listener, InternalEventListener):
+            names = ['event sent']  # bind() only needs these ones
+        super().attach(listener)
+        self._subscriptions.append(_Subscription(listener, names, states, batch))
+        self._update_routes()
+
+    def detach(self, listener):
+        super().detach(listener)
+        for index, subscription in enumerate(self._subscriptions):
+            if subscription.listener == listener:
+                del self._subscriptions[index]
+                break
+        self._update_routes()
+
+    def _update_routes(self):
+        """
+        For every meta-event name that someone listens to, the callables to
+        call, in the order in which the listeners were attached. Listeners
+        without filters are called directly.
+        """
+        names = set()
+        for subscription in self._subscriptions:
+            names.update(subscription.names or ())
+            if subscription.batch:
+                names.update(('step started', 'step ended'))
+        catch_all = [s for s in self._subscriptions if s.names is None]
+
+        self._routes = {
+            name: tuple(s.handler for s in self._subscriptions if s.names is None or name in s.names
+                        or (s.batch and name in ('step started', 'step ended')))
+            for name in names
+        }
+        self._catch_all = tuple(s.handler for s in catch_all)
+        self._wanted = None if catch_all else frozenset(names)
+
+    def _raise_event(self, event):
+        if isinstance(event, InternalEvent):
+            self._queue_event(event)
+            # Meta-events built here are only built if someone listens to them
+            wanted = self._wanted
+            if wanted is None or 'event sent' in wanted:
+                self._raise_event(MetaEvent('event sent', event=event))
+            if 'delay' in event.data and (wanted is None or 'delayed event sent' in wanted):
+                self._raise_event(MetaEvent('delayed event sent', event=event))
+        elif isinstance(event, MetaEvent):
+            for handler in self._routes.get(event.name, self._catch_all):
+                handler(event)
+        else:
+            super()._raise_event(event)
+
+    def _queue_event(self, event):
+        # Sismic looks for getattr(event, 'delay', 0): for the many events
+        # without a delay, the AttributeError formats the whole event first
+        queue = self._internal_queue if isinstance(event, InternalEvent) else self._external_queue
+        time = self.time + event.data.get('delay', 0)
+        if queue and queue[-1][0] > time:
+            super()._queue_event(event)  # Before a delayed event
+        else:
+            queue.append((time, event))
+
+    def _select_transitions(self, event, states, *, eventless_first=True, inner_first=True):
+        if not (eventless_first and inner_first):
+            return super()._select_transitions(
+                event, states, eventless_first=eventless_first, inner_first=inner_first,
+            )
+
+        compiled = self._compiled
+        exclusive = compiled.exclusive
+        evaluate_guard = self._evaluator.evaluate_guard
+
+        # Eventless transitions first, then the ones waiting for this event.
+        # An event nobody listens to has no candidates: a single dict lookup.
+        eventless, by_event = self._candidates(states)
+        groups = [(eventless, None)]
+        if event is not None:
+            groups.append((by_event.get(event.name, ()), event))
+
+        for candidates, exposed_event in groups:
+            selected = []
+            ignored = set()
+            for source, priority_groups in candidates:
+                if source not in states or source in ignored:
+                    continue
+                for transitions in priority_groups:
+                    found = False
+                    for transition in transitions:
+                        if transition.guard is None or evaluate_guard(transition, exposed_event):
+                            selected.append(transition)
+                            found = True
+                            if id(transitions) in exclusive:
+                                break  # No other guard of this group can hold, see guards.py
+                    if found:
+                        # Inner-first/source state semantics
+                        ignored.update(compiled.ancestors[source])
+                        break
+            if selected:
+                return selected
+        return []
+
+    def _candidates(self, states):
+        """The candidate transitions (see CompiledStatechart._candidates) for given active states."""
+        return self._compiled.eventless, self._compiled.by_event
+
+    def _create_steps(self, event, transitions):
+        steps = []
+        for transition in transitions:
+            if transition.target is None:
+                steps.append(MicroStep(event=event, transition=transition))
+                continue
+
+            exit_candidates, entered_states = self._compiled.scope[id(transition)]
+            steps.append(
+                MicroStep(
+                    event=event,
+                    transition=transition,
+                    entered_states=list(entered_states),
+                    exited_states=[s for s in exit_candidates if s in self._configuration],
+                )
+            )
+        return steps
+
+    def _create_stabilization_step(self, names):
+        compiled = self._compiled
+        statechart = self._statechart
+        names = set(names)
+
+        for name in sorted(names, key=compiled.inner_first.__getitem__):
+            if any(descendant in names for descendant in compiled.descendants[name]):
+                continue  # Not a leaf
+
+            leaf = compiled.states[name]
+            if isinstance(leaf, FinalState) and compiled.parent[name] == statechart.root:
+                return MicroStep(exited_states=[name, statechart.root])
+            if isinstance(leaf, (ShallowHistoryState, DeepHistoryState)):
+                states_to_enter = self._memory.get(name, [leaf.memory])
+                states_to_enter.sort(key=lambda x: (compiled.depth[x], x))
+                return MicroStep(entered_states=states_to_enter, exited_states=[name])
+            elif isinstance(leaf, OrthogonalState) and compiled.children[name]:
+                return MicroStep(entered_states=sorted(compiled.children[name]))
+            elif isinstance(leaf, CompoundState) and leaf.initial:
+                return MicroStep(entered_states=[leaf.initial])
+
+        return None
+
+    def _evaluate_contract_conditions(self, obj, cond_type, step=None):
+        if self._ignore_contract:
+            return
+        if not getattr(obj, cond_type, None):
+            # Nothing to check, except that preconditions are also where the
+            # evaluator records __old__ for postconditions and invariants
+            if cond_type != 'preconditions' or not (
+                getattr(obj, 'postconditions', None) or getattr(obj, 'invariants', None)
+            ):
+                return
+        super()._evaluate_contract_conditions(obj, cond_type, step)
+
+    def __getstate__(self):
+        attributes = self.__dict__.copy()
+        del attributes['_compiled']  # Code objects cannot be pickled
+        return attributes
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compiled = compile_statechart(self._statechart)
+        if isinstance(self._evaluator, CompiledEvaluator):
+            self._evaluator._link(self._compiled)
+
+
+def next_deadline(interpreter, compiled=None):
+    """
+    Earliest time at which interpreter.execute() may have something to do:
+    the time of the first queued event, or the deadline of an after(N)/idle(N)
+    guard of an active state. Return None if nothing can happen until an
+    event is queued, and the current time if an active state uses time in
+    a way that cannot be predicted (the caller has to poll).
+
+    Works with any Interpreter: *compiled* defaults to the compiled version
+    of its statechart.
+    """
+    if compiled is None:
+        compiled = compile_statechart(interpreter.statechart)
+    if not interpreter._initialized:
+        return interpreter.time
+    if not compiled.clocked.isdisjoint(interpreter._configuration):
+        return interpreter.time
+
+    deadline = compiled.next_timeout(
+        interpreter._configuration, interpreter._entry_time, interpreter._idle_time, interpreter.time,
+    )
+    for queue in (interpreter._internal_queue, interpreter._external_queue):
+        if queue and (deadline is None or queue[0][0] < deadline):
+            deadline = queue[0][0]
+    return deadline
+
+
+def polled_deadline(interpreter, poll_interval, compiled=None, *, now=None):
+    """
+    next_deadline, for a caller that has just executed given interpreter at
+    time *now* (default to the interpreter's time): a deadline that is
+    already reached can only come from an active state that uses time in a
+    way that cannot be predicted, and is replaced by the next poll,
+    poll_interval seconds later. Return None if nothing can happen until an
+    event is queued.
+    """
+    now = interpreter.time if now is None else now
+    deadline = next_deadline(interpreter, compiled)
+    if deadline is not None and deadline <= now:
+        deadline = now + poll_interval
+    return deadline
+
+
+class _Subscription:
+    """A listener attached with CompiledInterpreter.attach, and its filters."""
+
+    __slots__ = ('listener', 'names', 'states', 'batch', 'buffer', 'handler')
+
+    def __init__(self, listener, names, states, batch):
+        self.listener = listener
+        self.names = None if names is None else frozenset(names)
+        self.states = None if states is None else frozenset(states)
+        self.batch = batch
+        self.buffer = []
+        self.handler = listener if self.states is None and not batch else self.deliver
+
+    def accepts(self, event):
+        if self.names is not None and event.name not in self.names:
+            return False
+        if self.states is not None:
+            if event.name in ('state entered', 'state exited'):
+                return event.state in self.states
+            if event.name == 'transition processed':
+                return event.source in self.states or event.target in self.states
+        return True
+
+    def deliver(self, event):
+        if not self.batch:
+            if self.accepts(event):
+                self.listener(event)
+            return
+
+        if event.name == 'step started':
+            self.buffer = []  # A step interrupted by an exception is dropped
+        if self.accepts(event):
+            self.buffer.append(event)
+        if event.name == 'step ended' and self.buffer:
+            events, self.buffer = self.buffer, []
+            self.listener(events)
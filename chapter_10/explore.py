@@ -0,0 +1,234 @@
+import contextlib
+import copy
+import hashlib
+import io
+import itertools
+import multiprocessing
+import os
+import pickle
+from collections import namedtuple
+
+from sismic.clock import SimulatedClock
+from sismic.exceptions import ContractError
+from sismic.model import Event
+
+from compiler import compile_statechart
+from engine import CompiledInterpreter, next_deadline
+from snapshot import restore, take
+
+# ---------------------------------------------------------
+# State-space exploration.
+#
+# The backdoor of chapter 6 (three DEV_TEST_FAIL in a row break
+# `attempts < MAX_ATTEMPTS`) was found because run_contract.py happens to
+# send exactly that sequence. explore() looks for such sequences itself.
+#
+# Given the events a statechart may receive (with a few values for their
+# parameters), it searches breadth-first every state the statechart can
+# reach: after each event, and after waiting for the next after(N) or
+# idle(N) deadline. A state is the configuration, the context, the history
+# memory, the queues, and how long ago the active states were entered.
+# States already seen are recognised by a hash of these, and not explored
+# again. Each level of the search is spread over a pool of processes.
+#
+# The first ContractError found is reported with the events that lead to
+# it. As the search is breadth-first, no shorter sequence leads to an error.
+# ---------------------------------------------------------
+
+# The result of explore(): the number of distinct states reached, the depth
+# searched, whether every reachable state was explored (within max_depth
+# and max_states), and the first Violation (or None)
+Exploration = namedtuple('Exploration', 'states depth complete violation')
+
+# A shortest sequence of moves (Events and Waits) that leads to an error:
+# the name of its type, and its message
+Violation = namedtuple('Violation', 'trace error message')
+
+# Let time pass, then call execute()
+Wait = namedtuple('Wait', 'seconds')
+
+
+def explore(statechart, events, *, waits=None, errors=(ContractError,), max_depth=20, max_states=100000,
+            processes=None, initial_context=None, interpreter_klass=CompiledInterpreter):
+    """
+    Search the states reachable from the initial state of given statechart,
+    breadth-first, for one in which an error is raised.
+
+    Other exceptions are propagated. Actions run for real: keep side
+    effects out of the initial context.
+
+    :param events: the events to send, as event names, Event instances, or
+        (name, parameters) pairs where parameters maps each parameter to the
+        values to try, e.g. ('PIN_ENTERED', {'code': [1234, 0]})
+    :param waits: the durations to wait, in seconds (default: wait until the
+        next after(N)/idle(N) deadline of the active states, if any)
+    :param errors: the exceptions to look for
+    :param max_depth: the length of the longest sequence to try
+    :param max_states: stop once that many distinct states were reached
+    :param processes: number of processes (default to the number of CPUs),
+        1 to explore in the current process
+    :param initial_context: variables that are not part of the state (their
+        changes are not tracked)
+    :return: an Exploration
+    """
+    search = _Search(statechart, _expand_templates(events), waits, errors, initial_context, interpreter_klass)
+    root, violation = search.start()
+    if violation is not None:
+        return Exploration(0, 0, True, violation)
+
+    visited = {search.key(root)}
+    frontier = [((), root)]  # (trace, state)
+    depth = 0
+    truncated = False
+    with _pool(processes, search) as pool:
+        while frontier and depth < max_depth and not truncated:
+            depth += 1
+            if pool is None:
+                expanded = map(_expand_in_worker, [state for _, state in frontier])
+            else:
+                chunksize = max(1, len(frontier) // (4 * (processes or os.cpu_count() or 1)))
+                expanded = pool.imap(_expand_in_worker, [state for _, state in frontier], chunksize)
+
+            following = []
+            for (trace, _), children in zip(frontier, expanded):
+                for move, key, state, error in children:
+                    if error is not None:
+                        return Exploration(len(visited), depth, False, Violation(trace + (move,), *error))
+                    if key in visited:
+                        continue
+                    if len(visited) >= max_states:
+                        truncated = True
+                        continue
+                    visited.add(key)
+                    following.append((trace + (move,), state))
+            frontier = following
+    return Exploration(len(visited), depth, not frontier and not truncated, None)
+
+
+class _Search:
+    """What is needed to expand states, in the current process or in a worker."""
+
+    def __init__(self, statechart, moves, waits, errors, initial_context, interpreter_klass):
+        self.statechart = statechart
+        self.moves = moves
+        self.waits = None if waits is None else tuple(Wait(seconds) for seconds in waits)
+        self.errors = tuple(errors)
+        self.initial_context = dict(initial_context or {})
+        self.interpreter_klass = interpreter_klass
+
+        # Entry and idle times further in the past than the longest delay make
+        # no difference, unless time is used in some other way
+        compiled = compile_statechart(statechart)
+        delays = [seconds for timers in compiled.timers.values() for _, seconds in timers]
+        self.horizon = None if compiled.clocked else max(delays, default=0.0)
+
+    def start(self):
+        """The state after the first call to execute(), and the error it raised (or None)."""
+        interpreter = self._interpreter(None)
+        return self._run(interpreter, None)
+
+    def expand(self, state):
+        """A list of (move, key, state, error) for every move from given state."""
+        moves = self.moves
+        if self.waits is not None:
+            moves = moves + self.waits
+        else:
+            interpreter = self._interpreter(state)
+            deadline = next_deadline(interpreter)
+            if deadline is not None and deadline > interpreter.time:
+                moves = moves + (Wait(deadline - interpreter.time),)
+
+        children = []
+        for move in moves:
+            child, error = self._run(self._interpreter(state), move)
+            children.append((move, None if error else self.key(child), child, error))
+        return children
+
+    def key(self, state):
+        """A hash of what makes given state behave the way it does from now on."""
+        now = state['time']
+        active = state['configuration']
+
+        def since(times):
+            if self.horizon is None:
+                return tuple(sorted((name, now - times[name]) for name in active))
+            return tuple(sorted((name, min(now - times[name], self.horizon)) for name in active))
+
+        def pending(queue):
+            return tuple((time - now, event.name, sorted(event.data.items())) for time, event in queue)
+
+        data = (
+            tuple(active), since(state['entry_time']), since(state['idle_time']),
+            sorted(state['history'].items()),
+            pending(state['internal_queue']), pending(state['external_queue']),
+            sorted(state['context'].items()),
+        )
+        return hashlib.blake2b(pickle.dumps(data, pickle.HIGHEST_PROTOCOL), digest_size=16).digest()
+
+    def _interpreter(self, state):
+        clock = SimulatedClock()
+        interpreter = self.interpreter_klass(self.statechart, clock=clock, initial_context=dict(self.initial_context))
+        if state is not None:
+            clock.time = state['time']
+            # Each branch gets its own lists, dicts...: log.append() must not change the parent state
+            restore(interpreter, dict(state, context=copy.deepcopy(state['context'])))
+        return interpreter
+
+    def _run(self, interpreter, move):
+        """Make given move (None: start), and return (state, None) or (None, (error, message))."""
+        with contextlib.redirect_stdout(io.StringIO()):  # Actions print
+            try:
+                if isinstance(move, Wait):
+                    interpreter.clock.time += move.seconds
+                elif move is not None:
+                    interpreter.queue(move)
+                interpreter.execute()
+            except self.errors as e:
+                return None, (type(e).__name__, str(e))
+        return take(interpreter, exclude=self.initial_context), None
+
+
+# ---------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------
+
+_worker = None  # The _Search of the current pool process
+
+
+def _expand_templates(events):
+    """A tuple of Events, one per combination of parameter values."""
+    moves = []
+    for template in events:
+        if isinstance(template, str):
+            moves.append(Event(template))
+        elif isinstance(template, Event):
+            moves.append(template)
+        else:
+            name, parameters = template
+            names = sorted(parameters)
+            for values in itertools.product(*(parameters[p] for p in names)):
+                moves.append(Event(name, **dict(zip(names, values))))
+    return tuple(moves)
+
+
+@contextlib.contextmanager
+def _pool(processes, search):
+    global _worker
+    if processes == 1:
+        _worker = search
+        try:
+            yield None
+        finally:
+            _worker = None
+    else:
+        with multiprocessing.Pool(processes, initializer=_initialize_worker, initargs=(search,)) as pool:
+            yield pool
+
+
+def _initialize_worker(search):
+    global _worker
+    _worker = search
+
+
+def _expand_in_worker(state):
+    return _worker.expand(state)
@@ -0,0 +1,86 @@
+from sismic.interpreter import Interpreter
+
+from engine import next_deadline, polled_deadline
+
+# ---------------------------------------------------------
+# Fast-forwarding simulated time.
+#
+# The tests of chapter 7 move a SimulatedClock by hand, and call execute()
+# to see whether a timer fired. A soak test that simulates a week of
+# battery cycles in steps of 0.1 second calls execute() six million times,
+# almost always for nothing.
+#
+# fast_forward() asks the interpreters when they next have something to do
+# (see next_deadline in engine.py), moves the clock straight to that
+# instant, executes them there, and repeats.
+# ---------------------------------------------------------
+
+
+def fast_forward(interpreters, until=None, *, predicate=None, poll_interval=0.1):
+    """
+    Move the SimulatedClock of given interpreters from deadline to deadline,
+    and execute them at each of these instants.
+
+    Interpreters that are bound to each other are executed until the events
+    they send to each other are all processed, before time moves on.
+
+    :param interpreters: an interpreter, or a list of interpreters sharing
+        the same SimulatedClock
+    :param until: stop at this time (the clock is left at this time)
+    :param predicate: stop as soon as this callable (without arguments)
+        returns True, after the instant at which it became true
+    :param poll_interval: how often interpreters whose time-based guards
+        cannot be predicted (for example `time > 5`) are executed
+    :return: a list of (time, steps) pairs, one per instant at which
+        something happened. For a single interpreter, steps is its list of
+        MacroStep; for a list of interpreters, a dict mapping the ones that
+        did something to their list of MacroStep.
+    """
+    if until is None and predicate is None:
+        raise ValueError('Give a time to stop at, a predicate, or both')
+    single = isinstance(interpreters, Interpreter)
+    interpreters = [interpreters] if single else list(interpreters)
+    clock = interpreters[0].clock
+
+    returned = []
+    while True:
+        now = clock.time
+        steps = _settle(interpreters, now)
+        if steps:
+            returned.append((now, steps[interpreters[0]] if single else steps))
+        if predicate is not None and predicate():
+            return returned
+
+        deadline = None
+        for interpreter in interpreters:
+            candidate = polled_deadline(interpreter, poll_interval, getattr(interpreter, 'compiled', None), now=now)
+            if candidate is not None and (deadline is None or candidate < deadline):
+                deadline = candidate
+
+        if deadline is None or (until is not None and deadline > until):
+            if until is not None and until > clock.time:
+                clock.time = until
+            return returned
+        clock.time = deadline
+
+
+def _settle(interpreters, now):
+    """Execute the interpreters that are due, until none of them is."""
+    steps = {}
+    due = [interpreter for interpreter in interpreters if _is_due(interpreter, now)]
+    while due:
+        for interpreter in due:
+            executed = interpreter.execute()
+            if executed:
+                steps.setdefault(interpreter, []).extend(executed)
+        # Events sent by an interpreter to another are due right away
+        due = [
+            interpreter for interpreter in interpreters
+            if interpreter._external_queue and interpreter._external_queue[0][0] <= now
+        ]
+    return steps
+
+
+def _is_due(interpreter, now):
+    deadline = next_deadline(interpreter, getattr(interpreter, 'compiled', None))
+    return deadline is not None and deadline <= now
@@ -0,0 +1,306 @@
+import bisect
+import copy
+from array import array
+from collections import ChainMap, deque
+
+from sismic.clock import SimulatedClock
+from sismic.interpreter.listener import InternalEventListener
+from sismic.model import Event
+
+from compiler import compile_statechart
+from engine import CompiledInterpreter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: timers are then checked one instance at a time
+    np = None
+
+# Values of the preamble that each instance copies (with their content) instead of sharing
+_CONTAINERS = (list, dict, set, bytearray, deque)
+
+# ---------------------------------------------------------
+# A fleet: many instances of ONE statechart, stored as columns.
+#
+# An Interpreter per vault means a configuration set, two time dicts, a
+# context dict, two queues and an evaluator per vault. A Fleet instead keeps,
+# per instance, an id of its (interned) configuration and the entry/idle
+# times of every state in flat arrays. The context is copy-on-write: every
+# instance reads the context produced by the preamble, and only gets its own
+# dict once it assigns a variable. The lists, dicts and sets of the preamble
+# are copied the first time an instance reads them, as they may be changed
+# in place (codes.append(...)).
+#
+# To step an instance, its columns are loaded into a single CompiledInterpreter
+# (the "cursor"), which is executed and then stored back.
+# ---------------------------------------------------------
+
+
+class Fleet:
+    """
+    Run *size* instances of given statechart.
+
+    :param statechart: statechart shared by every instance
+    :param size: number of instances, identified by their index
+    :param clock: clock shared by every instance (default to a SimulatedClock)
+    :param initial_context: initial context, shared by every instance
+    :param ignore_contract: set to True to ignore contract checking
+    """
+
+    def __init__(self, statechart, size, *, clock=None, initial_context=None, ignore_contract=False):
+        self.statechart = statechart
+        self.clock = SimulatedClock() if clock is None else clock
+        self._compiled = compile_statechart(statechart)
+        self._size = size
+
+        # The cursor runs the preamble once: its context is the shared base context
+        self._cursor = CompiledInterpreter(
+            statechart, clock=self.clock, initial_context=initial_context, ignore_contract=ignore_contract,
+        )
+        self._base = self._cursor._evaluator._context
+        self._shared = frozenset(initial_context or ())  # Shared by instances, as by interpreters
+        self.current = None  # Index of the instance being executed
+
+        # Interned configurations, and which states they contain
+        self._states = list(self._compiled.states)
+        self._column = {name: k for k, name in enumerate(self._states)}
+        self._configs = [frozenset()]
+        self._config_ids = {frozenset(): 0}
+        self._membership = None
+
+        # Per-instance columns
+        self._booted = bytearray(size)
+        if np is not None:
+            self._config = np.zeros(size, dtype=np.int32)
+            self._last = np.zeros(size)
+            self._entry = np.zeros((len(self._states), size))
+            self._idle = np.zeros((len(self._states), size))
+        else:
+            self._config = array('i', bytes(4 * size))
+            self._last = array('d', bytes(8 * size))
+            self._entry = [array('d', bytes(8 * size)) for _ in self._states]
+            self._idle = [array('d', bytes(8 * size)) for _ in self._states]
+
+        # Sparse per-instance data: only instances that have some are stored
+        self._overlay = {}  # Context variables assigned by the instance
+        self._queues = {}  # Pending external events
+        self._internal = {}  # Pending (delayed) internal events
+        self._history = {}  # History states memory
+        self._old = {}  # Contract __old__ values
+        self._woken = set()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        """Memory used by the dense per-instance columns."""
+        if np is not None:
+            columns = self._config.nbytes + self._last.nbytes + self._entry.nbytes + self._idle.nbytes
+        else:
+            columns = sum(a.itemsize * len(a) for a in [self._config, self._last] + self._entry + self._idle)
+        return len(self._booted) + columns
+
+    def configuration(self, index):
+        """Active states of given instance, ordered like Interpreter.configuration."""
+        return sorted(self._configs[self._config[index]], key=self._compiled.outer_first.__getitem__)
+
+    def context(self, index):
+        """
+        Context of given instance. Assigning a variable only affects this
+        instance. Call wake(index) if guards should see the new value before
+        the next event.
+        """
+        overlay = self._overlay.setdefault(index, {})
+        return InstanceContext(overlay, self._base, self._shared)
+
+    def count(self, state):
+        """Number of instances in which given state is active."""
+        k = self._column[state]
+        if np is not None:
+            return int(self._members()[:, k][self._config].sum())
+        members = [state in config for config in self._configs]
+        return sum(1 for cid in self._config if members[cid])
+
+    def wake(self, index):
+        """Make sure given instance is executed on the next call to execute()."""
+        self._woken.add(index)
+
+    def queue(self, index, event_or_name, *event_or_names, **parameters):
+        """Queue events for given instance, like Interpreter.queue."""
+        queue = self._queues.setdefault(index, [])
+        for event in (event_or_name,) + event_or_names:
+            event = Event(event, **parameters) if isinstance(event, str) else event
+            time = float(self._last[index]) + getattr(event, 'delay', 0)
+            position = bisect.bisect_right([t for t, _ in queue], time)
+            queue.insert(position, (time, event))
+        return self
+
+    def attach(self, listener):
+        """Attach a listener that is called with (index, meta_event) for every meta-event."""
+        wrapper = lambda meta_event: listener(self.current, meta_event)
+        self._cursor.attach(wrapper)
+        return wrapper
+
+    def bind(self, callable):
+        """Bind a callable that is called with (index, event) for every sent event."""
+        listener = InternalEventListener(lambda event: callable(self.current, event))
+        self._cursor.attach(listener)
+        return listener
+
+    def execute(self):
+        """
+        Execute every instance that has something to do at the current time:
+        not booted yet, a pending event, or an after()/idle() deadline that
+        was reached since its last step. Idle instances cost nothing.
+
+        :return: a dict mapping the index of executed instances to their
+            (non-empty) list of MacroStep.
+        """
+        now = self.clock.time
+        returned = {}
+        for index in self._due(now):
+            self._load(index)
+            self.current = index
+            try:
+                steps = self._cursor.execute()
+            finally:
+                self.current = None
+                self._store(index)
+            if steps:
+                returned[index] = steps
+        return returned
+
+    # ---------------------------------------------------------
+    # Finding instances that have something to do
+    # ---------------------------------------------------------
+
+    def _due(self, now):
+        due = set(self._woken)
+        self._woken.clear()
+
+        for index, queue in self._queues.items():
+            if queue and queue[0][0] <= now:
+                due.add(index)
+        for index, queue in self._internal.items():
+            if queue and queue[0][0] <= now:
+                due.add(index)
+
+        if np is not None:
+            due.update(np.flatnonzero(self._due_mask(now)).tolist())
+        else:
+            due.update(self._due_scan(now))
+        return sorted(due)
+
+    def _due_mask(self, now):
+        """Vectorised: one pass over the columns per (state, timer) pair."""
+        mask = np.frombuffer(self._booted, dtype=np.uint8) == 0
+        members = self._members()
+        for state in self._compiled.clocked:
+            mask |= members[:, self._column[state]][self._config]
+        for state, timers in self._compiled.timers.items():
+            k = self._column[state]
+            active = members[:, k][self._config]
+            if not active.any():
+                continue
+            for kind, seconds in timers:
+                # Same arithmetic as after()/idle(): time - seconds >= entry time
+                since = self._entry[k] if kind == 'after' else self._idle[k]
+                mask |= active & (since <= now - seconds) & (since > self._last - seconds)
+        return mask
+
+    def _due_scan(self, now):
+        """Same as _due_mask, one instance at a time."""
+        columns = [
+            (state, self._column[state], timers) for state, timers in self._compiled.timers.items()
+        ]
+        for index in range(self._size):
+            if not self._booted[index]:
+                yield index
+                continue
+            config = self._configs[self._config[index]]
+            last = self._last[index]
+            if any(state in config for state in self._compiled.clocked):
+                yield index
+                continue
+            for state, k, timers in columns:
+                if state in config and any(
+                    last - seconds < (self._entry[k] if kind == 'after' else self._idle[k])[index] <= now - seconds
+                    for kind, seconds in timers
+                ):
+                    yield index
+                    break
+
+    def _members(self):
+        """Boolean matrix: configuration id x state column."""
+        if self._membership is None or len(self._membership) != len(self._configs):
+            self._membership = np.array(
+                [[state in config for state in self._states] for config in self._configs], dtype=bool,
+            ).reshape(len(self._configs), len(self._states))
+        return self._membership
+
+    # ---------------------------------------------------------
+    # Moving an instance in and out of the cursor
+    # ---------------------------------------------------------
+
+    def _load(self, index):
+        cursor = self._cursor
+        config = self._configs[self._config[index]]
+
+        cursor._initialized = bool(self._booted[index])
+        cursor._configuration = set(config)
+        cursor._entry_time = {s: float(self._entry[self._column[s]][index]) for s in config}
+        cursor._idle_time = {s: float(self._idle[self._column[s]][index]) for s in config}
+        cursor._memory = self._history.pop(index, {})
+        cursor._external_queue = self._queues.pop(index, [])
+        cursor._internal_queue = self._internal.pop(index, [])
+        cursor._time = float(self._last[index])
+        cursor._evaluator._context = InstanceContext(self._overlay.pop(index, {}), self._base, self._shared)
+        cursor._evaluator._memory = self._old.pop(index, {})
+
+    def _store(self, index):
+        cursor = self._cursor
+        config = frozenset(cursor._configuration)
+        cid = self._config_ids.get(config)
+        if cid is None:
+            cid = self._config_ids[config] = len(self._configs)
+            self._configs.append(config)
+
+        self._config[index] = cid
+        self._booted[index] = cursor._initialized
+        self._last[index] = cursor._time
+        for state in config:
+            k = self._column[state]
+            self._entry[k][index] = cursor._entry_time[state]
+            self._idle[k][index] = cursor._idle_time[state]
+
+        for store, value in (
+            (self._history, cursor._memory),
+            (self._queues, cursor._external_queue),
+            (self._internal, cursor._internal_queue),
+            (self._overlay, cursor._evaluator._context.maps[0]),
+            (self._old, cursor._evaluator._memory),
+        ):
+            if value:
+                store[index] = value
+
+
+class InstanceContext(ChainMap):
+    """
+    The context of an instance: its own variables, then the shared base
+    context. Lists, dicts and sets of the base context are copied into the
+    instance's variables the first time they are read, except the ones of
+    the initial context (shared names).
+    """
+
+    def __init__(self, overlay, base, shared=frozenset()):
+        super().__init__(overlay, base)
+        self.shared = shared
+
+    def __getitem__(self, name):
+        overlay = self.maps[0]
+        if name in overlay:
+            return overlay[name]
+        value = self.maps[1][name]
+        if isinstance(value, _CONTAINERS) and name not in self.shared:
+            value = overlay[name] = copy.deepcopy(value)
+        return value
@@ -0,0 +1,247 @@
+import copy
+from collections import deque
+
+from sismic.clock import SimulatedClock
+
+from fast_forward import fast_forward
+
+# ---------------------------------------------------------
+# Forking interpreters.
+#
+# "What would this vault do if it received these events in the next ten
+# minutes?" must not be asked to the live interpreter. The pickle
+# round-trip of chapter 9 gives a copy to play with, but it copies
+# everything: the statechart, the compiled code, every value of the
+# context.
+#
+# A ForkPoint captures the state of an interpreter once. Each fork() then
+# builds a new interpreter around it:
+#   - the statechart, its compiled tables and code are shared
+#   - the configuration, the entry times and the queues (a few entries
+#     each) are copied
+#   - lists, dicts and sets in the context are copied the first time a
+#     fork reads or writes them, every other value is shared
+# A fork has its own SimulatedClock, and no listeners: it does not talk to
+# the live system. Objects in the context (hardware...) are shared too:
+# give forks stand-ins for them.
+# ---------------------------------------------------------
+
+# Context values that forks copy (with their content) instead of sharing
+_CONTAINERS = (list, dict, set, bytearray, deque)
+
+# Attributes of an interpreter that a fork must not share, and their value in a fork
+_DETACHED = {
+    '_listeners': list,
+    '_subscriptions': list,  # CompiledInterpreter
+    '_routes': dict,
+    '_catch_all': tuple,
+    '_wanted': frozenset,
+}
+
+
+def fork(interpreter, *, clock=None, context=None):
+    """
+    Return a copy of given interpreter that can be run without affecting
+    it. See ForkPoint.fork.
+    """
+    return ForkPoint(interpreter, context=context).fork(clock=clock)
+
+
+def simulate(interpreter, scenarios, duration, *, context=None):
+    """
+    Run every scenario on a fork of given interpreter, for duration seconds
+    of simulated time.
+
+    :param scenarios: an iterable of lists of events, to queue on a fork
+        (use the delay parameter of Event to send them later)
+    :param context: see ForkPoint
+    :return: the list of forks, stopped duration seconds later
+    """
+    point = ForkPoint(interpreter, context=context)
+    forks = []
+    for events in scenarios:
+        forked = point.fork()
+        if events:
+            forked.queue(*events)
+        fast_forward(forked, until=forked.time + duration)
+        forks.append(forked)
+    return forks
+
+
+class ForkPoint:
+    """
+    The state of an interpreter at one point in time, from which any number
+    of forks can be made. Later changes to the interpreter do not affect it.
+
+    Interpreters that hold outside resources (the journal of a
+    JournaledInterpreter...) should not be forked: a fork runs the code of
+    their class.
+
+    :param interpreter: the interpreter to capture
+    :param context: values to use in the forks instead of the interpreter's,
+        typically stand-ins for hardware. They are shared by the forks, as
+        any other object but lists, dicts and sets.
+    """
+
+    def __init__(self, interpreter, *, context=None):
+        self.time = interpreter.time
+        self._klass = type(interpreter)
+        self._attributes = _copied(vars(interpreter))
+        for name, factory in _DETACHED.items():
+            if name in self._attributes:
+                self._attributes[name] = factory()
+
+        evaluator = interpreter._evaluator
+        self._evaluator_klass = type(evaluator)
+        self._evaluator_attributes = _copied(vars(evaluator))
+
+        # Containers are copied once here, so that the interpreter can change
+        # them, and once more by each fork that uses them
+        self._shared = {}
+        self._frozen = {}
+        values = dict(evaluator._context)
+        values.update(context or {})
+        for name, value in values.items():
+            if name in (context or ()) or not isinstance(value, _CONTAINERS):
+                self._shared[name] = value
+            else:
+                self._frozen[name] = copy.deepcopy(value)
+
+    def fork(self, *, clock=None):
+        """
+        Return a new interpreter in the captured state.
+
+        :param clock: the clock of the fork (default to a new SimulatedClock
+            at the captured time)
+        """
+        if clock is None:
+            clock = SimulatedClock()
+            clock.time = self.time
+
+        forked = object.__new__(self._klass)
+        forked.__dict__.update(_copied(self._attributes))
+        forked.clock = clock
+
+        evaluator = object.__new__(self._evaluator_klass)
+        evaluator.__dict__.update(_copied(self._evaluator_attributes))
+        evaluator._interpreter = forked
+        evaluator._context = ForkedContext(self._shared, self._frozen)
+        forked._evaluator = evaluator
+        return forked
+
+
+class ForkedContext(dict):
+    """
+    The context of a fork: a dict whose lists, dicts and sets are copied
+    from the ForkPoint the first time they are used.
+    """
+
+    def __init__(self, shared, frozen):
+        super().__init__(shared)
+        self._frozen = dict(frozen)  # Name -> value not copied yet
+
+    def _thaw(self, name):
+        value = copy.deepcopy(self._frozen.pop(name))
+        super().__setitem__(name, value)
+        return value
+
+    def _thaw_all(self):
+        for name in list(self._frozen):
+            self._thaw(name)
+
+    def __missing__(self, name):
+        if name in self._frozen:
+            return self._thaw(name)
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        return name in self._frozen or super().__contains__(name)
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __setitem__(self, name, value):
+        self._frozen.pop(name, None)
+        super().__setitem__(name, value)
+
+    def __delitem__(self, name):
+        if name in self._frozen:
+            del self._frozen[name]
+        else:
+            super().__delitem__(name)
+
+    def setdefault(self, name, default=None):
+        if name in self._frozen:
+            return self._thaw(name)
+        return super().setdefault(name, default)
+
+    def pop(self, name, *default):
+        if name in self._frozen:
+            self._thaw(name)
+        return super().pop(name, *default)
+
+    def update(self, *args, **kwargs):
+        for name, value in dict(*args, **kwargs).items():
+            self[name] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        self._frozen.clear()
+        super().clear()
+
+    # Everything that sees all the values copies them first
+    def __iter__(self):
+        self._thaw_all()
+        return super().__iter__()
+
+    def __len__(self):
+        return super().__len__() + len(self._frozen)
+
+    def __eq__(self, other):
+        self._thaw_all()
+        return super().__eq__(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        self._thaw_all()
+        return super().__repr__()
+
+    def keys(self):
+        self._thaw_all()
+        return super().keys()
+
+    def values(self):
+        self._thaw_all()
+        return super().values()
+
+    def items(self):
+        self._thaw_all()
+        return super().items()
+
+    def popitem(self):
+        self._thaw_all()
+        return super().popitem()
+
+    def copy(self):
+        self._thaw_all()
+        return dict(super().items())
+
+    def __reduce__(self):
+        return dict, (self.copy(),)  # A plain dict in pickled interpreters
+
+
+def _copied(attributes):
+    """A copy of given attributes, with a copy of their (small) lists, dicts and sets."""
+    return {
+        name: type(value)(value) if type(value) in (list, dict, set) else value
+        for name, value in attributes.items()
+    }
+
@@ -0,0 +1,357 @@
+import ast
+import itertools
+import operator
+
+# ---------------------------------------------------------
+# Static analysis of guards.
+#
+# When several transitions leave the same state on the same event, Sismic
+# evaluates every guard, to raise an error if more than one of them holds
+# (see chapter 2). Most of the time, the guards were written to be
+# exclusive: "event.code == CORRECT_PIN" and "event.code != CORRECT_PIN".
+# If we can prove it, the first guard that holds is the only one, and the
+# others do not have to be evaluated.
+#
+# A guard is turned into a disjunction of conjunctions of:
+#   comparisons     a pure expression (event.code, attempts + 1...) compared
+#                   to a constant: a literal, or a name the preamble binds
+#                   to an immutable literal and that no code ever assigns
+#                   again
+#   atoms           any other pure expression (is_open, x is None...), true
+#                   or false
+# Functions of the preamble that only return an expression of their
+# parameters (def is_admin(code): return code == 9999) are inlined. Calls
+# to anything else are unknown: they prove nothing.
+#
+# Two guards are exclusive if no conjunction of the first one is compatible
+# with a conjunction of the second one. Values are assumed to compare like
+# numbers and strings do.
+# ---------------------------------------------------------
+
+MAX_CONJUNCTIONS = 64  # Give up on guards with more alternatives than that
+
+_OPERATORS = {
+    ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=',
+    ast.In: 'in', ast.NotIn: 'not in',
+}
+_FLIPPED = {'==': '==', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}  # Constant on the left
+_NEGATED = {'==': '!=', '!=': '==', 'in': 'not in', 'not in': 'in'}
+_ORDERINGS = ('<', '<=', '>', '>=')
+_CHECK = {
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt,
+    '>=': operator.ge, 'in': lambda a, b: a in b, 'not in': lambda a, b: a not in b,
+}
+_IMPURE = (
+    ast.Call, ast.Await, ast.Yield, ast.YieldFrom, ast.NamedExpr, ast.Lambda,
+    ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp,
+)
+
+
+class _Unknown(Exception):
+    """The guard is too large to be analysed."""
+
+
+class GuardAnalysis:
+    """
+    What can be proven about the guards of a statechart.
+
+    :param statechart: the statechart whose preamble defines the constants
+        and functions that guards may use
+    """
+
+    def __init__(self, statechart):
+        self.constants, self.functions = _preamble_definitions(statechart)
+        self._dnf = {}  # Guard -> list of conjunctions, or None if it cannot be analysed
+
+    def exclusive(self, guards):
+        """True if it is proven that at most one of given guards (None for no guard) holds at a time."""
+        forms = [self.dnf(guard) for guard in guards]
+        if any(form is None for form in forms):
+            return False
+        return all(
+            not _satisfiable(first + second)
+            for form_a, form_b in itertools.combinations(forms, 2)
+            for first in form_a for second in form_b
+        )
+
+    def dnf(self, guard):
+        """
+        Given guard as a list of conjunctions (lists of comparisons and
+        atoms), or None if it cannot be analysed. An empty list never holds,
+        a list with an empty conjunction may always hold.
+        """
+        if guard is None:
+            return [[]]
+        if guard not in self._dnf:
+            try:
+                tree = ast.parse(guard.strip(), mode='eval').body
+                self._dnf[guard] = self._to_dnf(self._substitute(tree), True)
+            except (SyntaxError, _Unknown):
+                self._dnf[guard] = None
+        return self._dnf[guard]
+
+    # ---------------------------------------------------------
+    # Normal form
+    # ---------------------------------------------------------
+
+    def _substitute(self, tree, depth=0):
+        """Replace constants by their value, and inline the functions of the preamble."""
+        analysis = self
+
+        class Substitute(ast.NodeTransformer):
+            def visit_Name(self, node):
+                if isinstance(node.ctx, ast.Load) and node.id in analysis.constants:
+                    return ast.Constant(analysis.constants[node.id])
+                return node
+
+            def visit_Call(self, node):
+                self.generic_visit(node)
+                function = analysis.functions.get(getattr(node.func, 'id', None))
+                if function is None or node.keywords or len(node.args) != len(function[0]) or depth > 4:
+                    return node
+                parameters, body = function
+                arguments = dict(zip(parameters, node.args))
+                inlined = _Rename(arguments).visit(_copy(body))
+                return analysis._substitute(inlined, depth + 1)
+
+        return Substitute().visit(tree)
+
+    def _to_dnf(self, node, positive):
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return self._to_dnf(node.operand, not positive)
+        if isinstance(node, ast.BoolOp):
+            forms = [self._to_dnf(value, positive) for value in node.values]
+            conjunctive = isinstance(node.op, ast.And) == positive  # De Morgan
+            return _conjunction(forms) if conjunctive else _disjunction(forms)
+        if isinstance(node, ast.Constant):
+            return [[]] if bool(node.value) == positive else []
+        if isinstance(node, ast.Compare):
+            operands = [node.left] + node.comparators
+            forms = [
+                self._comparison(left, op, right, positive)
+                for left, op, right in zip(operands, node.ops, operands[1:])
+            ]
+            # a < b < c is (a < b) and (b < c)
+            return _conjunction(forms) if positive else _disjunction(forms)
+        if _pure(node):
+            return [[('atom', ast.dump(node), positive)]]
+        return [[]]  # Unknown: might hold
+
+    def _comparison(self, left, op, right, positive):
+        if isinstance(op, (ast.Is, ast.IsNot)):
+            # x is not None is the negation of x is None
+            atom = ('atom', ast.dump(ast.Compare(left, [ast.Is()], [right])), positive == isinstance(op, ast.Is))
+            return [[atom]] if _pure(left) and _pure(right) else [[]]
+        name = _OPERATORS.get(type(op))
+        left_value, right_value = _literal(left), _literal(right)
+        if name is None:
+            subject = None
+        elif right_value is not _NO_VALUE and left_value is not _NO_VALUE:
+            try:
+                return [[]] if bool(_CHECK[name](left_value, right_value)) == positive else []
+            except Exception:
+                return [[]]
+        elif right_value is not _NO_VALUE:
+            subject, value = left, right_value
+        elif left_value is not _NO_VALUE and name in _FLIPPED:
+            subject, value, name = right, left_value, _FLIPPED[name]
+        else:
+            subject = None
+
+        atom = ('atom', ast.dump(ast.Compare(left, [op], [right])), positive)
+        if subject is None or not _pure(subject):
+            return [[atom]] if _pure(left) and _pure(right) else [[]]
+        if name in _ORDERINGS:
+            # not (x < 3) is not x >= 3 for every value (NaN): only the atom is negated
+            return [[('compare', ast.dump(subject), name, value), atom]] if positive else [[atom]]
+        name = name if positive else _NEGATED[name]
+        return [[('compare', ast.dump(subject), name, value)]]
+
+
+# ---------------------------------------------------------
+# Satisfiability
+# ---------------------------------------------------------
+
+def _satisfiable(conjunction):
+    """False if it is proven that the items of given conjunction cannot all hold together."""
+    atoms = {}
+    constraints = {}
+    for item in conjunction:
+        if item[0] == 'atom':
+            if atoms.setdefault(item[1], item[2]) != item[2]:
+                return False
+        else:
+            constraints.setdefault(item[1], []).append(item[2:])
+    return all(_possible(items) for items in constraints.values())
+
+
+def _possible(constraints):
+    """False if no value satisfies every (operator, constant) constraint on the same subject."""
+    try:
+        for name, value in constraints:
+            # The value is one of a few: try them all. `x in 'abc'` also holds for
+            # substrings ('ab'): only collections give every candidate
+            if name == '==' or (name == 'in' and type(value) in _COLLECTIONS):
+                candidates = [value] if name == '==' else list(value)
+                return any(all(_CHECK[n](c, v) for n, v in constraints) for c in candidates)
+
+        lower = upper = None  # (bound, strict)
+        for name, value in constraints:
+            if name in ('>', '>='):
+                if lower is None or value > lower[0] or (value == lower[0] and name == '>'):
+                    lower = (value, name == '>')
+            elif name in ('<', '<='):
+                if upper is None or value < upper[0] or (value == upper[0] and name == '<'):
+                    upper = (value, name == '<')
+        if lower is None or upper is None:
+            return True
+        if lower[0] > upper[0]:
+            return False
+        if lower[0] == upper[0]:
+            # Only one value left
+            return not (lower[1] or upper[1]) and all(_CHECK[n](lower[0], v) for n, v in constraints)
+        return True
+    except Exception:  # Constants that do not compare (1 < 'a'...): no proof
+        return True
+
+
+# ---------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------
+
+def _conjunction(forms):
+    result = [[]]
+    for form in forms:
+        result = [first + second for first in result for second in form]
+        if len(result) > MAX_CONJUNCTIONS:
+            raise _Unknown()
+    return result
+
+
+def _disjunction(forms):
+    result = [conjunction for form in forms for conjunction in form]
+    if len(result) > MAX_CONJUNCTIONS:
+        raise _Unknown()
+    return result
+
+
+_NO_VALUE = object()
+_COLLECTIONS = (tuple, list, set, frozenset)  # Containers whose `in` is membership
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return _NO_VALUE
+
+
+def _immutable(value):
+    if type(value) in (tuple, frozenset):
+        return all(_immutable(item) for item in value)
+    return value is None or type(value) in (bool, int, float, complex, str, bytes)
+
+
+def _pure(node):
+    """True if given expression has no side effect, and gives the same result when evaluated twice."""
+    return not any(isinstance(child, _IMPURE) for child in ast.walk(node))
+
+
+def _copy(node):
+    return ast.parse(ast.unparse(node), mode='eval').body
+
+
+class _Rename(ast.NodeTransformer):
+    """Replace the parameters of an inlined function by its arguments."""
+
+    def __init__(self, arguments):
+        self.arguments = arguments
+
+    def visit_Name(self, node):
+        return self.arguments.get(node.id, node)
+
+
+def _preamble_definitions(statechart):
+    """
+    The constants (name -> literal value) and the inlinable functions
+    (name -> (parameters, returned expression)) of the preamble of given
+    statechart. A name that any code of the statechart assigns (again) is
+    neither, and a mutable literal (a list, a dict...) is not a constant:
+    CODES.append(3) changes it without assigning it.
+    """
+    try:
+        preamble = ast.parse(statechart.preamble or '')
+    except SyntaxError:
+        return {}, {}
+
+    candidates = {}
+    for statement in preamble.body:
+        if (isinstance(statement, ast.Assign) and len(statement.targets) == 1
+                and isinstance(statement.targets[0], ast.Name)):
+            value = _literal(statement.value)
+            if value is not _NO_VALUE and _immutable(value):
+                candidates[statement.targets[0].id] = ('constant', value)
+        elif isinstance(statement, ast.FunctionDef):
+            function = _inlinable(statement)
+            if function is not None:
+                candidates[statement.name] = ('function', function)
+
+    # Names assigned anywhere: in the preamble (once is expected), and in any other code
+    assigned = {}
+    codes = [(statechart.preamble, 'exec')]
+    for name in statechart.states:
+        state = statechart.state_for(name)
+        codes += [(getattr(state, 'on_entry', None), 'exec'), (getattr(state, 'on_exit', None), 'exec')]
+    for transition in statechart.transitions:
+        codes += [(transition.guard, 'eval'), (transition.action, 'exec')]
+    for code, mode in codes:
+        if not code:
+            continue
+        try:
+            tree = ast.parse(code.strip() if mode == 'eval' else code, mode=mode)
+        except SyntaxError:
+            continue
+        for name in _assigned_names(tree):
+            assigned[name] = assigned.get(name, 0) + 1
+
+    constants, functions = {}, {}
+    for name, (kind, definition) in candidates.items():
+        if assigned.get(name, 0) != 1:
+            continue
+        if kind == 'constant':
+            constants[name] = definition
+        else:
+            functions[name] = definition
+    return constants, functions
+
+
+def _inlinable(function):
+    """(parameters, returned expression) if given function only returns an expression of its parameters."""
+    arguments = function.args
+    if (function.decorator_list or arguments.vararg or arguments.kwarg or arguments.kwonlyargs
+            or arguments.defaults or arguments.posonlyargs):
+        return None
+    body = function.body
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant):
+        body = body[1:]  # Docstring
+    if len(body) != 1 or not isinstance(body[0], ast.Return) or body[0].value is None:
+        return None
+    parameters = [argument.arg for argument in arguments.args]
+    expression = body[0].value
+    names = {node.id for node in ast.walk(expression) if isinstance(node, ast.Name)}
+    if not names <= set(parameters) or not _pure(expression):
+        return None
+    return parameters, expression
+
+
+def _assigned_names(tree):
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            yield node.id
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            yield node.name
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                yield (alias.asname or alias.name).split('.')[0]
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            yield from node.names
@@ -0,0 +1,312 @@
+import asyncio
+import glob
+import json
+import os
+import socket
+import stat
+import threading
+import types
+
+from sismic.clock import UtcClock
+from sismic.model import Event
+
+from chart_cache import CACHE_DIR, load_statechart
+from engine import CompiledInterpreter
+
+# ---------------------------------------------------------
+# A resident statechart host.
+#
+# Every run_*.py script pays for starting Python, importing sismic, parsing
+# YAML and booting an interpreter, before it sends a single event. A CLI
+# tool that sends one event per call pays it every time.
+#
+# A Host is a long-running process that loads a set of charts once, keeps
+# named interpreters, and serves requests on a Unix-domain socket. Clients
+# keep their connection open, and talk to warm interpreters.
+#
+# The protocol is one JSON document per line, in both directions:
+#   request     {"op": "queue", "instance": "v1", "event": "PIN_ENTERED", "data": {"code": 1234}}
+#   response    {"result": ...} or {"error": "KeyError: ..."}
+# A line may also hold a list of requests (a batch): they are handled in
+# order, and answered with the list of their responses. Clients may send
+# several lines before reading the responses, which come in the same
+# order.
+#
+# Operations: charts, instances, create (instance, chart, context), delete
+# (instance), queue (instance, event, data), execute (instance),
+# configuration (instance), context (instance).
+# ---------------------------------------------------------
+
+OPERATIONS = ('charts', 'instances', 'create', 'delete', 'queue', 'execute', 'configuration', 'context')
+_LINE_LIMIT = 2 ** 24  # Longest request line, in bytes
+
+
+class HostError(Exception):
+    """An error reported by the host, for a request of a Client."""
+
+
+class Host:
+    """
+    Named interpreters for a set of preloaded statecharts, served on a
+    Unix-domain socket.
+
+    Interpreters are only executed on request: time-based transitions
+    happen at the first execute after their deadline.
+
+    :param charts: a directory (its YAML files and the ones of its
+        subdirectories are loaded), or a list of YAML files. Charts are named
+        after their file, without extension.
+    :param interpreter_klass: the class of the interpreters
+    :param clock: called without arguments to give each interpreter its
+        clock (default to UtcClock: real time)
+    :param cache_dir: passed to load_statechart
+    """
+
+    def __init__(self, charts, *, interpreter_klass=CompiledInterpreter, clock=UtcClock, cache_dir=CACHE_DIR):
+        if isinstance(charts, (str, os.PathLike)):
+            charts = sorted(glob.glob(os.path.join(charts, '**', '*.yaml'), recursive=True))
+        self.charts = {}
+        for path in charts:
+            name = os.path.splitext(os.path.basename(path))[0]
+            if name in self.charts:
+                raise ValueError(f'Two charts are named {name!r}')
+            self.charts[name] = load_statechart(filepath=path, cache_dir=cache_dir)
+        self.instances = {}
+        self.interpreter_klass = interpreter_klass
+        self.clock = clock
+        self._thread = None
+        self._stop = None
+
+    def handle(self, request):
+        """Handle a request (a dict, or a list of dicts) and return its response."""
+        if isinstance(request, list):
+            return [self.handle(item) for item in request]
+        try:
+            op = request['op']
+            if op not in OPERATIONS:
+                raise ValueError(f'Unknown operation {op!r}')
+            arguments = {k: v for k, v in request.items() if k != 'op'}
+            return {'result': getattr(self, '_' + op)(**arguments)}
+        except Exception as e:
+            return {'error': f'{type(e).__name__}: {e}'}
+
+    # ---------------------------------------------------------
+    # Serving
+    # ---------------------------------------------------------
+
+    async def serve(self, path, ready=None):
+        """
+        Serve on a Unix-domain socket at given path, until cancelled.
+
+        :param ready: a callable, called once the socket accepts connections
+        """
+        _remove_stale_socket(path)
+        server = await asyncio.start_unix_server(self._connection, path, limit=_LINE_LIMIT)
+        try:
+            async with server:
+                if ready is not None:
+                    ready()
+                await server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def serve_forever(self, path):
+        """Serve on a Unix-domain socket at given path, in the current thread."""
+        asyncio.run(self.serve(path))
+
+    def start(self, path):
+        """Serve on a Unix-domain socket at given path, in a background thread."""
+        if self._thread is not None:
+            raise RuntimeError('The host is already started')
+        loop = asyncio.new_event_loop()
+        listening = threading.Event()
+        task = loop.create_task(self.serve(path, ready=listening.set))
+
+        failure = []
+
+        def run():
+            try:
+                loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                pass  # Stopped
+            except Exception as e:
+                failure.append(e)  # Could not listen
+            finally:
+                loop.close()
+                listening.set()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._stop = lambda: loop.call_soon_threadsafe(task.cancel)
+        self._thread.start()
+        listening.wait()
+        if failure:
+            self._thread.join()
+            self._thread = self._stop = None
+            raise failure[0]
+
+    def stop(self):
+        """Stop the background thread started by start()."""
+        if self._thread is not None:
+            self._stop()
+            self._thread.join()
+            self._thread = self._stop = None
+
+    async def _connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = self.handle(json.loads(line))
+                except ValueError as e:
+                    response = {'error': f'{type(e).__name__}: {e}'}  # Not JSON
+                writer.write(json.dumps(response, default=repr).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # ---------------------------------------------------------
+    # Operations
+    # ---------------------------------------------------------
+
+    def _charts(self):
+        return sorted(self.charts)
+
+    def _instances(self):
+        return sorted(self.instances)
+
+    def _create(self, instance, chart, context=None):
+        if instance in self.instances:
+            raise ValueError(f'Instance {instance!r} already exists')
+        interpreter = self.interpreter_klass(self.charts[chart], clock=self.clock(), initial_context=context)
+        interpreter.execute()  # Boot it, as every runner script does
+        self.instances[instance] = interpreter
+        return interpreter.configuration
+
+    def _delete(self, instance):
+        del self.instances[instance]
+
+    def _queue(self, instance, event, data=None):
+        self.instances[instance].queue(Event(event, **(data or {})))
+
+    def _execute(self, instance):
+        return [
+            {
+                'time': step.time,
+                'event': None if step.event is None else step.event.name,
+                'transitions': [str(transition) for transition in step.transitions],
+                'entered': step.entered_states,
+                'exited': step.exited_states,
+            }
+            for step in self.instances[instance].execute()
+        ]
+
+    def _configuration(self, instance):
+        return self.instances[instance].configuration
+
+    def _context(self, instance):
+        return {
+            name: value for name, value in self.instances[instance].context.items()
+            if not callable(value) and not isinstance(value, types.ModuleType)
+        }
+
+
+class Client:
+    """
+    A persistent connection to a Host.
+
+    :param path: the path of the socket of the host
+    """
+
+    def __init__(self, path):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(path)
+        self._file = self._socket.makefile('rwb')
+
+    def call(self, op, **arguments):
+        """Send a request, and return its result. Raise HostError if it failed."""
+        self._send(dict(arguments, op=op))
+        return _result(self._receive())
+
+    def batch(self, requests):
+        """
+        Send a list of requests (dicts with an 'op' key) at once, and return
+        the list of their results. A request that failed has a HostError
+        instead of a result: the following ones were handled anyway.
+        """
+        self._send(list(requests))
+        returned = []
+        for response in self._receive():
+            try:
+                returned.append(_result(response))
+            except HostError as e:
+                returned.append(e)
+        return returned
+
+    def create(self, instance, chart, **context):
+        return self.call('create', instance=instance, chart=chart, context=context)
+
+    def queue(self, instance, event, **data):
+        return self.call('queue', instance=instance, event=event, data=data)
+
+    def execute(self, instance):
+        return self.call('execute', instance=instance)
+
+    def configuration(self, instance):
+        return self.call('configuration', instance=instance)
+
+    def context(self, instance):
+        return self.call('context', instance=instance)
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _send(self, request):
+        self._file.write(json.dumps(request).encode() + b'\n')
+        self._file.flush()
+
+    def _receive(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('The host closed the connection')
+        return json.loads(line)
+
+
+def _remove_stale_socket(path):
+    """
+    Remove the socket left at given path by a host that did not stop
+    cleanly. Raise FileExistsError if something else is there: a file, or
+    the socket of a host that is still running.
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f'{path} exists and is not a socket')
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)  # Nobody listens
+        return
+    finally:
+        probe.close()
+    raise FileExistsError(f'A host is already serving on {path}')
+
+
+def _result(response):
+    if 'error' in response:
+        raise HostError(response['error'])
+    return response['result']
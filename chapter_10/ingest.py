@@ -0,0 +1,161 @@
+from sismic.interpreter import Interpreter
+from sismic.model import Event, MacroStep, MetaEvent
+
+from compiler import compile_statechart
+
+# ---------------------------------------------------------
+# Bulk ingestion.
+#
+# chapter_09/run_persistence.py calls queue('CHUNK_RECEIVED').execute()
+# once per chunk. Every call builds Event, MacroStep and MicroStep objects,
+# emits 'step started'/'step ended' meta-events, and checks invariants,
+# twice: once for the step that consumes the event, and once more to find
+# out that there is nothing left to do.
+#
+# ingest() takes a whole batch of events, and does for each of them what
+# queue(event).execute() does, in the same order and with the same steps.
+# The per-batch work (which methods to call, which meta-events someone
+# listens to, whether the chart has invariants) is done once, and what
+# nobody asked for is skipped: meta-events without a listener, invariants
+# of a chart without any, and MacroStep objects.
+# ---------------------------------------------------------
+
+# Methods that must not be overridden for ingest() to run its own loop
+_PLAIN = ('queue', 'execute', 'execute_once')
+
+
+def ingest(interpreter, events, *, results=False):
+    """
+    Queue and execute given events, one at a time: the same as calling
+    interpreter.queue(event).execute() for each of them.
+
+    Interpreters whose queue()/execute() are overridden (a journal, a
+    profiler...), and anything else with a queue()/execute() interface, are
+    called as such, so their own behaviour is preserved.
+
+    :param interpreter: an Interpreter (or anything with the same interface)
+    :param events: an iterable (or a generator) of event names and Event
+        instances
+    :param results: if True, return, for every event, the tuple of the
+        transitions it fired (including the eventless ones and the ones of
+        the internal events it led to)
+    :return: the number of events, or the list of results
+    """
+    run = _runner(interpreter)
+    if not results:
+        count = 0
+        for event in events:
+            run(event, None)
+            count += 1
+        return count
+
+    returned = []
+    for event in events:
+        fired = []
+        run(event, fired)
+        returned.append(tuple(fired))
+    return returned
+
+
+def ingest_many(items, *, results=False):
+    """
+    Like ingest(), for events addressed to many interpreters.
+
+    Events are processed in the given order, even when consecutive events
+    go to different interpreters: interpreters bound to each other see the
+    same interleaving as with queue().execute().
+
+    :param items: an iterable of (interpreter, event) pairs
+    :param results: see ingest()
+    :return: the number of events, or the list of results
+    """
+    runners = {}
+    count = 0
+    returned = [] if results else None
+    for interpreter, event in items:
+        run = runners.get(id(interpreter))
+        if run is None:
+            run = runners[id(interpreter)] = _runner(interpreter)  # Keeps the interpreter (and its id) alive
+        if returned is None:
+            run(event, None)
+            count += 1
+        else:
+            fired = []
+            run(event, fired)
+            returned.append(tuple(fired))
+    return count if returned is None else returned
+
+
+def _runner(interpreter):
+    """A function (event, fired) that does interpreter.queue(event).execute(), appending transitions to fired."""
+    if not _is_plain(interpreter):
+        def run(event, fired):
+            for macro_step in interpreter.queue(event).execute():
+                if fired is not None:
+                    fired.extend(macro_step.transitions)
+        return run
+
+    statechart = interpreter.statechart
+    states = compile_statechart(statechart).states.values()
+    invariants = not interpreter._ignore_contract and any(getattr(s, 'invariants', None) for s in states)
+    queue_event = interpreter._queue_event
+    compute_steps = interpreter._compute_steps
+    select_event = interpreter._select_event
+    apply_step = interpreter._apply_step
+    stabilize = interpreter._stabilize
+    raise_event = interpreter._raise_event
+    sent_events = interpreter._sent_events
+
+    def run(event, fired):
+        queue_event(Event(event) if isinstance(event, str) else event)
+
+        # Listeners may come and go between two events
+        wanted = getattr(interpreter, '_wanted', None if interpreter._listeners else frozenset())
+        started = wanted is None or 'step started' in wanted
+        consumed = wanted is None or 'event consumed' in wanted
+        ended = wanted is None or 'step ended' in wanted
+
+        # Interpreter.execute_once(), until it has nothing to do
+        while True:
+            interpreter._time = interpreter.clock.time
+            sent_events.clear()
+            if started:
+                raise_event(MetaEvent('step started', time=interpreter._time))
+
+            steps = compute_steps()
+            executed = []
+            if steps:
+                if steps[0].event is not None:
+                    consumed_event = select_event(consume=True)
+                    if consumed:
+                        raise_event(MetaEvent('event consumed', event=consumed_event))
+                for step in steps:
+                    applied = apply_step(step)
+                    stabilization = stabilize()
+                    if invariants:
+                        executed.append(applied)
+                        executed.extend(stabilization)
+                    if fired is not None and step.transition is not None:
+                        fired.append(step.transition)
+
+            if invariants:
+                macro_step = MacroStep(time=interpreter._time, steps=executed) if steps else None
+                for name in interpreter.configuration:
+                    interpreter._evaluate_contract_conditions(statechart.state_for(name), 'invariants', macro_step)
+            if ended:
+                raise_event(MetaEvent('step ended'))
+            if not steps:
+                return
+
+    return run
+
+
+def _is_plain(interpreter):
+    """True if given interpreter steps exactly as Interpreter.execute_once() does."""
+    if not isinstance(interpreter, Interpreter):
+        return False
+    if any(getattr(type(interpreter), name) is not getattr(Interpreter, name) for name in _PLAIN):
+        return False
+    if any(name in vars(interpreter) for name in _PLAIN):
+        return False  # Wrapped, e.g. by a Profiler
+    return not hasattr(interpreter._evaluator, 'on_step_starts')  # Deprecated hook
@@ -0,0 +1,176 @@
+import glob
+import os
+import pickle
+import struct
+
+from sismic.clock import SimulatedClock
+from sismic.model import Event
+
+import snapshot
+from engine import CompiledInterpreter
+
+# ---------------------------------------------------------
+# Event sourcing.
+#
+# Chapter 9 pickled the whole interpreter after every CHUNK_RECEIVED. An
+# interpreter is deterministic: given the same events at the same times, it
+# ends up in the same state. So it is enough to write down what happened to
+# it: the events it received, and the times at which it was executed. Every
+# N steps a snapshot is taken, and the journal starts over.
+#
+# A directory holds one journaled interpreter:
+#   snapshot       the number of the journal that follows it (4 bytes), and
+#                  the latest snapshot (see snapshot.encode)
+#   journal.<n>    the records written since snapshot n
+# ---------------------------------------------------------
+
+SNAPSHOT = 'snapshot'
+JOURNAL = 'journal.{}'
+
+
+class JournaledInterpreter(CompiledInterpreter):
+    """
+    A CompiledInterpreter that records its events and steps in given
+    directory, and resumes from it when the directory is not empty.
+
+    Records are pickled one after the other in the journal: an event (its
+    name, or the Event itself if it has parameters) for every queued event,
+    and a float for every call to execute() that did something, or that
+    moved the time events are queued at (their delay counts from it). During a
+    call to execute(), the clock is read only once, so replaying the journal
+    under a SimulatedClock gives the same steps.
+
+    Resuming runs the actions of the replayed steps again: keep side effects
+    (hardware, ...) out of the initial context if they must not be repeated.
+
+    :param statechart: statechart to interpret
+    :param directory: where the snapshot and the journal are stored
+    :param checkpoint_every: take a snapshot every N calls to execute()
+        that did something
+    :param fsync: flush every record to the disk (slower, survives an
+        operating system crash and not only a process crash)
+    :param kwargs: passed to CompiledInterpreter
+    """
+
+    def __init__(self, statechart, directory, *, checkpoint_every=100, fsync=False, **kwargs):
+        super().__init__(statechart, **kwargs)
+        self.directory = directory
+        self.checkpoint_every = checkpoint_every
+        self.fsync = fsync
+        self._exclude = set((kwargs.get('initial_context') or {}).keys())
+        self._steps_since_checkpoint = 0
+        self._file = None
+
+        os.makedirs(directory, exist_ok=True)
+        self.replayed = self._resume()
+        self._journaled_time = self._time  # The time a replay of the journal ends at
+
+    def queue(self, event_or_name, *event_or_names, **parameters):
+        if self._time != self._journaled_time:
+            # Set by an execute() that did nothing: delays count from it
+            self._record_execute(self._time)
+
+        for event in (event_or_name,) + event_or_names:
+            event = Event(event, **parameters) if isinstance(event, str) else event
+            super().queue(event)
+            # Plain events are recorded by name: a few bytes
+            self._write(event.name if type(event) is Event and not event.data else event)
+        return self
+
+    def execute(self, max_steps=-1):
+        clock = self.clock
+        self.clock = SimulatedClock()
+        self.clock.time = now = clock.time
+        try:
+            steps = super().execute(max_steps)
+        finally:
+            self.clock = clock
+        if steps:
+            self._record_execute(now)
+            if self._steps_since_checkpoint >= self.checkpoint_every:
+                self.checkpoint()
+        return steps
+
+    def checkpoint(self):
+        """Take a snapshot now, and start a new journal."""
+        number = self._number + 1
+        path = os.path.join(self.directory, SNAPSHOT)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(struct.pack('<I', number) + snapshot.encode(self, exclude=self._exclude))
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)  # Atomic: the previous snapshot stays valid until here
+
+        self._open(number)
+        for path in glob.glob(os.path.join(self.directory, JOURNAL.format('*'))):
+            if path != self._file.name:
+                os.remove(path)
+        self._steps_since_checkpoint = 0
+        self._journaled_time = self._time
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __getstate__(self):
+        raise TypeError('A JournaledInterpreter is persisted by its journal, not by pickle')
+
+    # ---------------------------------------------------------
+    # Journal files
+    # ---------------------------------------------------------
+
+    def _open(self, number):
+        self.close()
+        self._number = number
+        self._file = open(os.path.join(self.directory, JOURNAL.format(number)), 'ab')
+
+    def _record_execute(self, time):
+        self._write(float(time))
+        self._journaled_time = time
+        self._steps_since_checkpoint += 1
+
+    def _write(self, record):
+        if self._file is None:  # Replaying
+            return
+        pickle.dump(record, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _resume(self):
+        """Load the snapshot, replay the journal that follows it, return the number of records replayed."""
+        number = 0
+        path = os.path.join(self.directory, SNAPSHOT)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            number, = struct.unpack_from('<I', data)
+            snapshot.restore(self, snapshot.decode(data[4:], self.statechart))
+
+        replayed = 0
+        path = os.path.join(self.directory, JOURNAL.format(number))
+        if os.path.exists(path):
+            with open(path, 'r+b') as f:
+                while True:
+                    position = f.tell()
+                    try:
+                        record = pickle.load(f)
+                    except (EOFError, pickle.UnpicklingError, ValueError):
+                        # A record was being written when the process died
+                        f.truncate(position)
+                        break
+                    if isinstance(record, float):
+                        self.clock, clock = SimulatedClock(), self.clock
+                        self.clock.time = record
+                        try:
+                            super().execute()
+                        finally:
+                            self.clock = clock
+                        self._steps_since_checkpoint += 1
+                    else:
+                        super().queue(record)
+                    replayed += 1
+
+        self._open(number)
+        return replayed
@@ -0,0 +1,243 @@
+import ast
+import functools
+import types
+import weakref
+from collections import OrderedDict
+
+from contracts import _VOLATILE, _immutable
+from engine import CompiledEvaluator, CompiledInterpreter
+
+# ---------------------------------------------------------
+# Guard memoisation.
+#
+# The three PIN_ENTERED transitions of chapter_02/vault_passcode.yaml
+# evaluate their guards for every PIN_ENTERED event: is_admin(event.code)
+# is called twice per event. That is nothing for `code == 9999`, but a
+# real validator hashes the code, asks a table, checks a signature...
+# and the same few codes come again and again.
+#
+# A statechart declares what is pure in its preamble:
+#   __pure__ = ['is_admin', 'event.code == correct_pin']
+# (or MemoInterpreter is given the same list with pure=):
+#   - a name is a preamble function: its results are kept in a bounded LRU
+#     cache, keyed by its arguments and their types. Preamble functions
+#     only see their arguments (and builtins): nothing else can change
+#     their result.
+#   - anything else is the text of a guard: its results are kept in a
+#     bounded LRU cache, keyed by the values it reads: the attributes of
+#     the event it uses (event.code), and the context variables it uses
+#     (correct_pin, and the function is_admin itself), with their types:
+#     1, 1.0 and True are equal, but `is True` tells them apart.
+#
+# Context variables are part of the key: when an action assigns one, the
+# guard is evaluated again for the new value, and the entries of the old
+# value leave the cache in their turn. A guard is evaluated without the
+# cache when one of the values it reads is mutable (a list, an object...).
+# A guard that uses time, after(), idle(), active()... cannot be declared
+# pure: its result does not only depend on what it reads.
+# ---------------------------------------------------------
+
+# Values that can be part of a key: they do not change behind our back
+_STABLE_TYPES = (types.FunctionType, types.BuiltinFunctionType, types.ModuleType)
+_MISSING = object()  # In keys: a variable or an attribute that does not exist
+
+# Per statechart: guard -> its _GuardPlan, None if it cannot be memoised
+_plans = weakref.WeakKeyDictionary()
+
+
+class MemoInterpreter(CompiledInterpreter):
+    """
+    A CompiledInterpreter that memoises the functions and the guards
+    declared pure, by the statechart (__pure__ in its preamble) or with
+    the pure parameter. Same semantics, as long as they are.
+
+    guard_hits and guard_misses count the guard evaluations answered from
+    (and added to) the cache. The cache_info() of a memoised function is
+    the one of functools.lru_cache.
+
+    :param pure: names of preamble functions, and guards, that are pure
+    :param cache_size: the number of results kept, per function and for
+        all the guards
+    """
+
+    def __init__(self, statechart, *, pure=(), cache_size=1024, **kwargs):
+        kwargs.setdefault('evaluator_klass', MemoEvaluator)
+        super().__init__(statechart, **kwargs)
+
+        declared = set(pure) | set(declared_pure(statechart))
+        guards = {transition.guard.strip(): transition.guard for transition in statechart.transitions if transition.guard}
+        context = self._evaluator._context
+        memoised_guards = {}
+        for entry in declared:
+            if entry.isidentifier() and isinstance(context.get(entry), types.FunctionType):
+                context[entry] = _memoised(context[entry], cache_size)
+            elif entry.strip() in guards:
+                guard = guards[entry.strip()]
+                memoised_guards[guard] = _plan(self._compiled, guard)
+            else:
+                raise ValueError(f'{entry!r} is neither a function of the preamble nor a guard of {statechart.name!r}')
+        self._evaluator._memoise(memoised_guards, cache_size)
+
+    @property
+    def guard_hits(self):
+        return self._evaluator.hits
+
+    @property
+    def guard_misses(self):
+        return self._evaluator.misses
+
+
+class MemoEvaluator(CompiledEvaluator):
+    """A CompiledEvaluator that keeps the results of some guards in a bounded LRU cache."""
+
+    def __init__(self, interpreter=None, *, initial_context=None):
+        super().__init__(interpreter, initial_context=initial_context)
+        self._memoise({}, 0)
+
+    def _memoise(self, plans, cache_size):
+        self._plans = plans  # Guard -> _GuardPlan
+        self._cache = OrderedDict()  # (guard, values read) -> result
+        self._cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+    def evaluate_guard(self, transition, event=None):
+        plan = self._plans.get(transition.guard)
+        key = None if plan is None else plan.key(self._context, event)
+        if key is None:
+            return super().evaluate_guard(transition, event)
+
+        cache = self._cache
+        try:
+            result = cache[key]
+        except KeyError:
+            pass
+        else:
+            cache.move_to_end(key)
+            self.hits += 1
+            return result
+
+        result = super().evaluate_guard(transition, event)  # Errors are not cached
+        self.misses += 1
+        cache[key] = result
+        if len(cache) > self._cache_size:
+            cache.popitem(last=False)
+        return result
+
+    def __getstate__(self):
+        attributes = super().__getstate__()
+        attributes['_cache'] = OrderedDict()
+        return attributes
+
+
+def declared_pure(statechart):
+    """The entries of the __pure__ list (or tuple, or set) of the preamble of given statechart."""
+    try:
+        preamble = ast.parse(statechart.preamble or '')
+    except SyntaxError:
+        return []
+    for statement in preamble.body:
+        if (isinstance(statement, ast.Assign) and len(statement.targets) == 1
+                and isinstance(statement.targets[0], ast.Name) and statement.targets[0].id == '__pure__'):
+            try:
+                return list(ast.literal_eval(statement.value))
+            except ValueError:
+                raise ValueError(f'__pure__ of {statechart.name!r} must be a literal list of strings') from None
+    return []
+
+
+class _GuardPlan:
+    """What the key of a guard is made of."""
+
+    def __init__(self, guard, names, attributes):
+        self.guard = guard
+        self.names = names  # Names that may be context variables
+        self.attributes = attributes  # Attributes of the event it reads, None for the whole event
+
+    def key(self, context, event):
+        """The key of the values read by the guard, or None if one of them may change in place."""
+        values = [self.guard]
+        for name in self.names:
+            if name in context:
+                value = context[name]
+                if not (_immutable(value) or isinstance(value, _STABLE_TYPES)):
+                    return None
+                values.append(_typed(value))
+            else:
+                values.append(_MISSING)
+
+        read = []
+        if event is None:
+            values.append(None)
+        elif self.attributes is None:
+            values.append(event.name)
+            read = sorted(event.data.items())
+        else:
+            read = [getattr(event, attribute, _MISSING) for attribute in self.attributes]
+        for value in read:
+            if not (_immutable(value) or value is _MISSING):
+                return None
+            values.append(_typed(value))
+        return tuple(values)
+
+
+def _typed(value):
+    """Given value with its type, and the ones of its items: 1, 1.0 and True are equal, but not the same."""
+    if type(value) in (tuple, frozenset):
+        return type(value), type(value)(_typed(item) for item in value)
+    return type(value), value
+
+
+def _plan(compiled, guard):
+    plans = _plans.get(compiled.statechart)
+    if plans is None:
+        plans = _plans[compiled.statechart] = {}
+    if guard not in plans:
+        plans[guard] = _analyse(compiled, guard)
+    plan = plans[guard]
+    if plan is None:
+        volatile = sorted(compiled.names.get(guard, frozenset()) & (_VOLATILE - {'event'}))
+        reason = f'uses {", ".join(volatile)}' if volatile else 'does not compile'
+        raise ValueError(f'Guard {guard!r} {reason}: it cannot be memoised')
+    return plan
+
+
+def _analyse(compiled, guard):
+    """The _GuardPlan of given guard, or None if its result may change while its inputs do not."""
+    referenced = compiled.names.get(guard)
+    if referenced is None or not referenced.isdisjoint(_VOLATILE - {'event'}):
+        return None
+    try:
+        tree = ast.parse(guard.strip(), mode='eval')
+    except SyntaxError:
+        return None
+
+    names, attributes, whole_event = set(), set(), False
+    parents = {child: node for node in ast.walk(tree) for child in ast.iter_child_nodes(node)}
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Name):
+            continue
+        if node.id != 'event':
+            names.add(node.id)  # Bound by a comprehension, builtins...: part of the key if in the context
+        elif isinstance(parents.get(node), ast.Attribute):
+            attributes.add(parents[node].attr)
+        else:
+            whole_event = True  # Given to a function, compared...: use its name and all its data
+    return _GuardPlan(guard, tuple(sorted(names)), None if whole_event else tuple(sorted(attributes)))
+
+
+def _memoised(function, cache_size):
+    """Given function, with a bounded LRU cache of its results. Calls with unhashable arguments are not cached."""
+    cached = functools.lru_cache(maxsize=cache_size, typed=True)(function)
+
+    @functools.wraps(function)
+    def memoised(*args, **kwargs):
+        try:
+            hash((args, tuple(kwargs.items())))
+        except TypeError:
+            return function(*args, **kwargs)
+        return cached(*args, **kwargs)
+
+    memoised.cache_info = cached.cache_info
+    memoised.cache_clear = cached.cache_clear
+    return memoised
@@ -0,0 +1,155 @@
+from collections.abc import Set
+
+from sismic.clock import SynchronizedClock
+from sismic.exceptions import PropertyStatechartError
+from sismic.model import Event
+
+from compiler import compile_statechart
+from engine import CompiledInterpreter
+
+# ---------------------------------------------------------
+# Property statecharts, driven once per macro step.
+#
+# Sismic's bind_property_statechart queues every meta-event of the
+# monitored interpreter into the property statechart and executes it right
+# away: a dozen calls to execute() per step, per monitor. The bridge of
+# chapter 8 did the same with a 'step' event, and copied the whole
+# configuration every time.
+#
+# Here a single batch listener (see CompiledInterpreter.attach) collects
+# the meta-events of a macro step that the monitors have transitions for,
+# then drives every monitor once. Thanks to the event index of the
+# compiled property statechart, a monitor only makes a step for the
+# events that one of its active states listens to.
+# ---------------------------------------------------------
+
+STEP = 'step'  # Event summarizing a macro step, as in chapter 8
+
+
+class Monitoring:
+    """
+    Run property statecharts against one or many CompiledInterpreters.
+
+    A property statechart receives the meta-events it has transitions for
+    ('state entered', 'event consumed'...), as with Sismic's
+    bind_property_statechart. If it has transitions for 'step', it also
+    receives one 'step' event per macro step that entered or exited states,
+    with:
+
+    * entered_states: the states entered during the step,
+    * exited_states: the states exited during the step,
+    * configuration: the active states of the monitored interpreter, as a
+      read-only set (a view, not a copy: only valid while the event is
+      processed).
+
+    A PropertyStatechartError is raised at the end of the macro step in
+    which a property statechart reaches a final state.
+
+    An event that no active state of a property statechart listens to is
+    not queued at all (unless the property statechart has eventless
+    transitions, which have to be checked on every step).
+
+    :param statecharts: the property statecharts
+    :param interpreter_klass: class of the property statechart interpreters
+    """
+
+    def __init__(self, *statecharts, interpreter_klass=CompiledInterpreter):
+        self.statecharts = statecharts
+        self.interpreter_klass = interpreter_klass
+        self._watches = {}  # monitored interpreter -> its _Watch
+
+        # What each property statechart listens to, and in which states
+        self._properties = []
+        for statechart in statecharts:
+            compiled = compile_statechart(statechart)
+            sources = {
+                name: frozenset(source for source, _ in candidates)
+                for name, candidates in compiled.by_event.items()
+            }
+            meta_names = frozenset(sources) - {STEP}
+            self._properties.append((statechart, meta_names, STEP in sources, None if compiled.eventless else sources))
+
+    def __len__(self):
+        return len(self._watches)
+
+    def __contains__(self, interpreter):
+        return interpreter in self._watches
+
+    def watch(self, interpreter):
+        """Monitor given CompiledInterpreter with every property statechart, and return it."""
+        watch = _Watch(self, interpreter)
+        names = set()
+        for _, meta_names, steps, _ in self._properties:
+            names.update(meta_names)
+            if steps:
+                names.update(('state entered', 'state exited'))
+        interpreter.attach(watch, names=names, batch=True)
+        self._watches[interpreter] = watch
+        return interpreter
+
+    def unwatch(self, interpreter):
+        """Stop monitoring given interpreter."""
+        interpreter.detach(self._watches.pop(interpreter))
+
+    def monitors(self, interpreter):
+        """The property statechart interpreters of given monitored interpreter."""
+        return [monitor for monitor, _, _, _ in self._watches[interpreter].monitors]
+
+
+class _Watch:
+    """The batch listener of a monitored interpreter, and its monitors."""
+
+    def __init__(self, monitoring, interpreter):
+        self.configuration = ActiveStates(interpreter)
+        self.monitors = []
+        for statechart, meta_names, steps, sources in monitoring._properties:
+            monitor = monitoring.interpreter_klass(statechart, clock=SynchronizedClock(interpreter))
+            monitor.execute()
+            self.monitors.append((monitor, meta_names, steps, sources))
+
+    def __call__(self, meta_events):
+        entered = [e.state for e in meta_events if e.name == 'state entered']
+        exited = [e.state for e in meta_events if e.name == 'state exited']
+        step = None
+        if entered or exited:
+            step = Event(STEP, entered_states=entered, exited_states=exited, configuration=self.configuration)
+
+        for monitor, meta_names, steps, sources in self.monitors:
+            events = [e for e in meta_events if e.name in meta_names]
+            if steps and step is not None:
+                events.append(step)
+            if not events:
+                continue
+
+            if sources is None:
+                monitor.queue(*events).execute()
+            else:
+                # One step per event, and only if an active state listens to it
+                for event in events:
+                    if not sources[event.name].isdisjoint(monitor._configuration):
+                        monitor.queue(event).execute_once()
+                        if monitor._internal_queue:
+                            monitor.execute()  # The property statechart sent events to itself
+            if monitor.final:
+                raise PropertyStatechartError(monitor)
+
+
+class ActiveStates(Set):
+    """A read-only view of the active states of an interpreter."""
+
+    __slots__ = ('_interpreter',)
+
+    def __init__(self, interpreter):
+        self._interpreter = interpreter
+
+    def __contains__(self, name):
+        return name in self._interpreter._configuration
+
+    def __iter__(self):
+        return iter(self._interpreter._configuration)
+
+    def __len__(self):
+        return len(self._interpreter._configuration)
+
+    def __repr__(self):
+        return f'ActiveStates({sorted(self._interpreter._configuration)})'
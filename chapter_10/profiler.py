@@ -0,0 +1,224 @@
+import time
+
+# ---------------------------------------------------------
+# A profiler for statecharts.
+#
+# cProfile tells us that time goes into eval(), not which guard is slow.
+# This profiler wraps the methods of an interpreter (and of its evaluator)
+# that run a piece of the statechart: guards, actions, on entry/on exit
+# blocks, contract clauses, and the phases of a step. Every call is timed,
+# and recorded under a label ("guard Locked -> Unlocked on PIN_ENTERED
+# [is_admin(event.code)]") and under the stack of labels it was called
+# from, for flame graphs.
+#
+# The wrappers are set on the instances, and removed by detach(): an
+# interpreter that is not profiled runs exactly the same code as before.
+# ---------------------------------------------------------
+
+_CONTRACTS = ('preconditions', 'postconditions', 'invariants')
+
+
+class Timing:
+    """
+    Call count and latency histogram of one label.
+
+    The histogram has 4 buckets per power of two of nanoseconds, so
+    percentiles are known within 25%.
+    """
+
+    __slots__ = ('count', 'total', 'maximum', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0  # Nanoseconds
+        self.maximum = 0
+        self.buckets = [0] * 256
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.maximum:
+            self.maximum = duration
+        bits = duration.bit_length()
+        self.buckets[duration if bits <= 3 else 4 * bits - 4 + ((duration >> (bits - 3)) & 3)] += 1
+
+    @property
+    def mean(self):
+        """Mean duration, in seconds."""
+        return self.total / self.count / 1e9 if self.count else 0.0
+
+    def percentile(self, fraction):
+        """Upper bound of the duration of the given fraction of the calls, in seconds."""
+        threshold = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= threshold:
+                return min(_upper_bound(index), self.maximum) / 1e9
+        return 0.0
+
+
+def _upper_bound(index):
+    if index < 8:
+        return index + 1
+    bits, quarter = divmod(index + 4, 4)
+    return (5 + quarter) << (bits - 3)
+
+
+class Profiler:
+    """
+    Record call counts and latency histograms of the code of statecharts.
+
+    Attach it to one or many interpreters (their timings are added up).
+    Labels are:
+
+    * step, select transitions, apply step, stabilize: the phases of a step,
+    * guard, action: the code of a transition,
+    * on entry, on exit: the code of a state,
+    * preconditions, postconditions, invariants: the contract of a state or
+      a transition, and each of its clauses.
+    """
+
+    def __init__(self):
+        self.timings = {}  # label -> Timing
+        self.stacks = {}  # tuple of labels -> total nanoseconds
+        self._stack = []
+        self._labels = {}  # (kind, id(obj)) -> (obj, label)
+        self._attached = {}  # interpreter -> names of the wrapped attributes (interpreter, evaluator)
+
+    def attach(self, interpreter):
+        """Start profiling given interpreter, and return it."""
+        if interpreter in self._attached:
+            return interpreter
+        evaluator = interpreter._evaluator
+
+        wrapped_interpreter = {
+            'execute_once': lambda: 'step',
+            '_select_transitions': lambda event, states, **kwargs: 'select transitions',
+            '_apply_step': lambda step: 'apply step',
+            '_stabilize': lambda: 'stabilize',
+            '_evaluate_contract_conditions': self._contract_label,
+        }
+        wrapped_evaluator = {
+            'evaluate_guard': lambda transition, event=None: self._label(
+                'guard', transition, lambda t: f'guard {_transition(t)} [{_code(t.guard)}]',
+            ),
+            'execute_action': lambda transition, event=None: self._label(
+                'action', transition, lambda t: f'action {_transition(t)}',
+            ) if transition.action else None,
+            'execute_on_entry': lambda state: self._label(
+                'on entry', state, lambda s: f'on entry {s.name}',
+            ) if getattr(state, 'on_entry', None) else None,
+            'execute_on_exit': lambda state: self._label(
+                'on exit', state, lambda s: f'on exit {s.name}',
+            ) if getattr(state, 'on_exit', None) else None,
+            '_evaluate_code': self._clause_label,
+        }
+        for target, wrappers in ((interpreter, wrapped_interpreter), (evaluator, wrapped_evaluator)):
+            for name, label in wrappers.items():
+                setattr(target, name, self._wrap(getattr(target, name), label))
+        self._attached[interpreter] = (list(wrapped_interpreter), list(wrapped_evaluator))
+        return interpreter
+
+    def detach(self, interpreter):
+        """Stop profiling given interpreter: it runs its original code again."""
+        interpreter_names, evaluator_names = self._attached.pop(interpreter)
+        for name in interpreter_names:
+            del interpreter.__dict__[name]
+        for name in evaluator_names:
+            del interpreter._evaluator.__dict__[name]
+
+    def reset(self):
+        """Forget every recorded timing."""
+        self.timings.clear()
+        self.stacks.clear()
+
+    def report(self, *, limit=None):
+        """A text table of the labels, the most expensive first."""
+        lines = [f"{'calls':>8} {'total ms':>9} {'mean us':>8} {'p50 us':>8} {'p99 us':>8} {'max us':>8}  label"]
+        ordered = sorted(self.timings.items(), key=lambda item: -item[1].total)
+        for label, timing in ordered[:limit]:
+            lines.append(
+                f'{timing.count:8d} {timing.total / 1e6:9.2f} {timing.mean * 1e6:8.1f} '
+                f'{timing.percentile(0.5) * 1e6:8.1f} {timing.percentile(0.99) * 1e6:8.1f} '
+                f'{timing.maximum / 1e3:8.1f}  {label}'
+            )
+        return '\n'.join(lines)
+
+    def flamegraph(self):
+        """
+        The recorded stacks in the "folded" format of flamegraph.pl and
+        speedscope: one "step;apply step;on entry Unlocked <nanoseconds>"
+        line per stack, with the time spent in the frame itself.
+        """
+        own = dict(self.stacks)
+        for stack, total in self.stacks.items():
+            if len(stack) > 1:
+                own[stack[:-1]] = own.get(stack[:-1], 0) - total
+        return '\n'.join(
+            f"{';'.join(stack)} {max(0, duration)}" for stack, duration in sorted(own.items())
+        ) + '\n'
+
+    def write_flamegraph(self, path):
+        with open(path, 'w') as f:
+            f.write(self.flamegraph())
+
+    # ---------------------------------------------------------
+    # Wrappers
+    # ---------------------------------------------------------
+
+    def _wrap(self, function, label):
+        """Time function under the label returned by label(*args), unless it is None."""
+        stack, timings, stacks = self._stack, self.timings, self.stacks
+        perf_counter_ns = time.perf_counter_ns
+
+        def wrapper(*args, **kwargs):
+            name = label(*args, **kwargs)
+            if name is None:
+                return function(*args, **kwargs)
+            stack.append(name)
+            start = perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                duration = perf_counter_ns() - start
+                timing = timings.get(name)
+                if timing is None:
+                    timing = timings[name] = Timing()
+                timing.add(duration)
+                key = tuple(stack)
+                stacks[key] = stacks.get(key, 0) + duration
+                stack.pop()
+
+        return wrapper
+
+    def _label(self, kind, obj, make):
+        cached = self._labels.get((kind, id(obj)))
+        if cached is None or cached[0] is not obj:
+            cached = self._labels[kind, id(obj)] = (obj, make(obj).replace(';', ','))
+        return cached[1]
+
+    def _contract_label(self, obj, cond_type, step=None):
+        if not getattr(obj, cond_type, None):
+            return None
+        return self._label(cond_type, obj, lambda o: f'{cond_type} {_owner(o)}')
+
+    def _clause_label(self, code, *, additional_context=None):
+        # Only the code evaluated by a contract: guards have their own label
+        if self._stack and self._stack[-1].startswith(_CONTRACTS):
+            return f'clause {_code(code)}'.replace(';', ',')
+        return None
+
+
+def _transition(transition):
+    description = f'{transition.source} -> {transition.target or transition.source}'
+    return f'{description} on {transition.event}' if transition.event else description
+
+
+def _owner(obj):
+    return _transition(obj) if hasattr(obj, 'source') else obj.name
+
+
+def _code(code, width=40):
+    code = ' '.join(str(code).split())
+    return code if len(code) <= width else code[:width - 3] + '...'
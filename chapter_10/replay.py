@@ -0,0 +1,238 @@
+import gzip
+import multiprocessing
+import os
+import pickle
+from collections import namedtuple
+
+from sismic.clock import SimulatedClock
+from sismic.model import Event, InternalEvent
+
+from engine import CompiledInterpreter
+
+# ---------------------------------------------------------
+# Record and replay.
+#
+# Before a new version of a statechart goes to production, we would like to
+# know what it does with the sessions of the current one. A Recorder writes
+# down the external events a live interpreter consumed, the times at which
+# it consumed them, and the configuration it ended up in. replay() feeds
+# such a trace to a (new) statechart under a SimulatedClock, and reports
+# the first instant at which the configurations differ.
+#
+# A trace is a stream of pickled records, read one at a time: it does not
+# have to fit in memory. Configurations and event names are written in full
+# the first time only, and then by number. Traces whose name ends with .gz
+# are compressed.
+#
+#   header      {'statechart': name of the recorded statechart}
+#   instant     (time, events, configuration)
+#       events          one item per consumed external event: its name, or
+#                       (name, parameters)
+#       configuration   the active states at the end of the instant
+#
+# A name or a configuration is a str or a tuple the first time it appears,
+# and the number of its first appearance afterwards.
+# ---------------------------------------------------------
+
+# What a recorded interpreter did at one point in time: the external events
+# it consumed (Events), and its active states afterwards (a frozenset)
+Instant = namedtuple('Instant', 'time events configuration')
+
+# The result of replay(): how many instants were replayed, and the first
+# Divergence (or None)
+Replayed = namedtuple('Replayed', 'trace instants divergence')
+
+# The replayed interpreter did not end up in the recorded configuration, or
+# raised an error (its type and message)
+Divergence = namedtuple('Divergence', 'time recorded replayed error')
+
+
+class Recorder:
+    """
+    A listener that records the external events consumed by an interpreter,
+    and its configuration, in a trace.
+
+    Only the instants at which something happened are recorded (a call to
+    execute() that did nothing is not). Attach it before the first call to
+    execute(), and call close() when the session ends: records are
+    buffered.
+
+    :param interpreter: the interpreter to record
+    :param path: the trace to write (compressed if it ends with .gz)
+    """
+
+    def __init__(self, interpreter, path):
+        self.interpreter = interpreter
+        self.path = path
+        self._file = _open(path, 'wb')
+        self._symbols = {}  # Name or configuration -> number
+        self._time = None  # Time of the current instant
+        self._events = []
+        self._active = False  # Did something happen during the current instant?
+        self._write({'statechart': interpreter.statechart.name})
+
+        names = ['step started', 'event consumed', 'state entered', 'transition processed']
+        if isinstance(interpreter, CompiledInterpreter):
+            interpreter.attach(self, names=names)
+        else:
+            interpreter.attach(self)
+
+    def __call__(self, meta_event):
+        name = meta_event.name
+        if name == 'step started':
+            # Nothing has changed yet: the configuration is the one the previous instant ended in
+            if meta_event.time != self._time:
+                if self._active:
+                    self._flush()
+                self._time = meta_event.time
+        elif name == 'event consumed':
+            self._active = True
+            if not isinstance(meta_event.event, InternalEvent):
+                self._events.append(meta_event.event)
+        elif name in ('state entered', 'transition processed'):
+            self._active = True
+
+    def close(self):
+        """Write the current instant, stop recording, and close the trace."""
+        if self._file is None:
+            return
+        self.interpreter.detach(self)
+        if self._active:
+            self._flush()
+        self._file.close()
+        self._file = None
+
+    def _flush(self):
+        events = tuple(
+            self._symbol(event.name) if not event.data else (self._symbol(event.name), dict(event.data))
+            for event in self._events
+        )
+        configuration = self._symbol(tuple(sorted(self.interpreter._configuration)))
+        self._write((self._time, events, configuration))
+        self._events.clear()
+        self._active = False
+
+    def _symbol(self, value):
+        number = self._symbols.get(value)
+        if number is None:
+            self._symbols[value] = len(self._symbols)
+            return value
+        return number
+
+    def _write(self, record):
+        # Protocol 2 has no frame header: the smallest records
+        pickle.dump(record, self._file, protocol=2)
+
+
+def record(interpreter, path):
+    """Start recording given interpreter in a trace, and return the Recorder."""
+    return Recorder(interpreter, path)
+
+
+def read(path):
+    """
+    Iterate over the instants of a trace, one record at a time.
+
+    A record that was being written when the process died is ignored.
+    """
+    symbols = []
+    with _open(path, 'rb') as f:
+        try:
+            pickle.load(f)  # Header
+            while True:
+                time, events, configuration = pickle.load(f)
+                yield Instant(
+                    time,
+                    [
+                        Event(_resolve(symbols, item)) if not isinstance(item, tuple)
+                        else Event(_resolve(symbols, item[0]), **item[1])
+                        for item in events
+                    ],
+                    _resolve(symbols, configuration, frozenset),
+                )
+        except (EOFError, pickle.UnpicklingError, ValueError):
+            return
+
+
+def header(path):
+    """The header of a trace: {'statechart': name}."""
+    with _open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def replay(statechart, path, *, interpreter_klass=CompiledInterpreter, initial_context=None, **kwargs):
+    """
+    Replay a trace with given statechart, under a SimulatedClock.
+
+    At each recorded instant, the recorded events are queued and the
+    interpreter is executed, then its configuration is compared with the
+    recorded one. The replay stops at the first difference.
+
+    Actions run as they did in production: keep side effects out of the
+    initial context.
+
+    :param kwargs: passed to the interpreter
+    :return: a Replayed
+    """
+    clock = SimulatedClock()
+    interpreter = interpreter_klass(statechart, clock=clock, initial_context=initial_context, **kwargs)
+    instants = 0
+    for time, events, recorded in read(path):
+        clock.time = time
+        try:
+            if events:
+                interpreter.queue(*events)
+            interpreter.execute()
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            return Replayed(path, instants, Divergence(time, recorded, frozenset(interpreter._configuration), error))
+        instants += 1
+        if interpreter._configuration != recorded:
+            return Replayed(path, instants, Divergence(time, recorded, frozenset(interpreter._configuration), None))
+    return Replayed(path, instants, None)
+
+
+def replay_many(statechart, paths, *, processes=None, chunksize=16, **kwargs):
+    """
+    Replay many traces in a pool of processes.
+
+    The statechart and kwargs are sent once to every process. Results are
+    yielded as soon as they are known, not in the order of paths.
+
+    :param processes: number of processes (default to the number of CPUs)
+    :param kwargs: passed to replay()
+    :return: an iterator of Replayed
+    """
+    with multiprocessing.Pool(processes, initializer=_initialize_worker, initargs=(statechart, kwargs)) as pool:
+        yield from pool.imap_unordered(_replay_in_worker, paths, chunksize)
+
+
+# ---------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------
+
+_worker = None  # (statechart, kwargs) of the current pool process
+
+
+def _initialize_worker(statechart, kwargs):
+    global _worker
+    _worker = (statechart, kwargs)
+
+
+def _replay_in_worker(path):
+    statechart, kwargs = _worker
+    return replay(statechart, path, **kwargs)
+
+
+def _resolve(symbols, value, convert=None):
+    if isinstance(value, int):
+        return symbols[value]
+    value = value if convert is None else convert(value)
+    symbols.append(value)
+    return value
+
+
+def _open(path, mode):
+    if os.fspath(path).endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
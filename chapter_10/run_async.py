@@ -0,0 +1,67 @@
+import asyncio
+import os
+
+from chart_cache import load_statechart
+from async_runtime import AsyncSystem
+from engine import CompiledInterpreter
+
+async def run_async_demo():
+    path = os.path.join(os.path.dirname(__file__), '..', 'chapter_08')
+    vault_sc = load_statechart(filepath=os.path.join(path, 'vault_ch8.yaml'))
+    charger_sc = load_statechart(filepath=os.path.join(path, 'charger_ch8.yaml'))
+    monitor_sc = load_statechart(filepath=os.path.join(path, 'monitor_ch8.yaml'))
+
+    system = AsyncSystem()  # Owns a SimulatedClock, moved by system.advance()
+
+    vault = system.add(CompiledInterpreter(vault_sc, clock=system.clock))
+    charger = system.add(CompiledInterpreter(charger_sc, clock=system.clock))
+    monitor = system.add(CompiledInterpreter(monitor_sc, clock=system.clock))
+
+    # WIRING: same as chapter 8, but events go through mailboxes
+    system.bind(vault, charger)
+    system.bind(charger, vault)
+
+    def bridge_to_monitor(meta_event):
+        if meta_event.name == 'state entered':
+            system.queue(monitor, 'step', entered_states=[meta_event.state], configuration=vault.configuration)
+
+    vault.attach(bridge_to_monitor)
+
+    async with system:
+        print("--- SYSTEM STARTUP ---")
+        await system.run_until_quiescent()
+
+        # No more propagate_system(): advance() stops at every deadline
+        # and waits until no message is left in flight
+        print("\n[Scenario 1] Waiting for battery drain...")
+        await system.advance(2.0)
+        print_status(vault, charger)
+
+        print("\n[Scenario 1] Waiting for charge cycle (5s)...")
+        await system.advance(5.0)
+        print_status(vault, charger)
+
+        print("\n[Scenario 2] Creating a Hazard...")
+        print(">> Aging battery by 1.6s (approaching death)...")
+        await system.advance(1.6)
+
+        print(">> User Unlocks Door")
+        system.queue(vault, 'PIN_ENTERED', code=1234)
+        await system.run_until_quiescent()
+
+        print(">> Advancing 0.5s...")
+        await system.advance(0.5)
+
+    if len(monitor.configuration) == 0:
+        print("\nMonitor successfully caught the violation and terminated.")
+    else:
+        print("\nMonitor failed to catch violation.")
+        print(f"Monitor State: {monitor.configuration}")
+
+def print_status(vault, charger):
+    v_state = [s for s in vault.configuration if s in ['Full', 'Low', 'Charging', 'Locked', 'Unlocked']]
+    c_state = [s for s in charger.configuration if s in ['Idle', 'Charging']]
+    print(f"STATUS | Vault: {v_state} | Charger: {c_state}")
+
+if __name__ == '__main__':
+    asyncio.run(run_async_demo())
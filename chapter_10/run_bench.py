@@ -0,0 +1,37 @@
+import argparse
+import sys
+
+import bench
+
+def run_bench(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every statechart of the tutorial.')
+    parser.add_argument('--output', default='bench.json', help='where to write the results (JSON)')
+    parser.add_argument('--baseline', help='results of a previous run, to flag regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='relative change allowed (default 0.25)')
+    parser.add_argument('--events', type=int, default=2000, help='events per chart and engine')
+    parser.add_argument('charts', nargs='*', help='YAML files (default: every chart of the tutorial)')
+    args = parser.parse_args(argv)
+
+    report = bench.run(args.charts or bench.CHARTS, events=args.events)
+    bench.save(report, args.output)
+
+    print(f"{'chart':<35}{'engine':<21}{'load ms':>8}{'events/s':>10}{'p50 us':>8}{'p99 us':>8}"
+          f"{'B/inst':>8}{'snap B':>8}{'save us':>9}{'rest. us':>9}")
+    for chart, engines in report['charts'].items():
+        for engine, m in engines.items():
+            print(f"{chart:<35}{engine:<21}{m['load_ms']:8.2f}{m['events_per_s']:10.0f}{m['p50_us']:8.1f}"
+                  f"{m['p99_us']:8.1f}{m['bytes_per_instance']:8.0f}{m['snapshot_bytes']:8d}"
+                  f"{m['save_us']:9.1f}{m['restore_us']:9.1f}")
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        regressions = bench.compare(bench.load(args.baseline), report, tolerance=args.tolerance)
+        for chart, engine, metric, before, after in regressions:
+            print(f"REGRESSION {chart} ({engine}): {metric} {before:.1f} -> {after:.1f}")
+        if regressions:
+            return 1
+        print(f"No regression against {args.baseline}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(run_bench())
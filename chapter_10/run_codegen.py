@@ -0,0 +1,47 @@
+import contextlib
+import io
+import os
+import sys
+import time
+
+from sismic.interpreter import Interpreter
+
+from chart_cache import load_statechart
+from codegen import generate_module, machine_class
+from engine import CompiledInterpreter
+from table import TableInterpreter
+
+ROUNDS = 5000
+
+def run_codegen_demo():
+    timer = load_statechart(filepath=os.path.join(os.path.dirname(__file__), '..', 'chapter_04', 'vault_timer.yaml'))
+    print("--- The generated method for PIN_ENTERED in chapter_04/vault_timer.yaml ---")
+    source = generate_module(timer)
+    start = source.index('    def _on_PIN_ENTERED')
+    print(source[start:source.index('\n\n', start)])
+
+    for chart in ('chapter_02/vault_passcode.yaml', 'chapter_04/vault_timer.yaml'):
+        statechart = load_statechart(filepath=os.path.join(os.path.dirname(__file__), '..', chart))
+        print(f"\n--- {chart}: a wrong PIN, RESET, the right PIN, LOCK/LOCK_CMD ---")
+        factories = [
+            (klass.__name__, lambda klass=klass: klass(statechart)) for klass in (Interpreter, CompiledInterpreter, TableInterpreter)
+        ]
+        factories.append(('generated Machine', machine_class(statechart)))
+
+        for name, factory in factories:
+            machine = factory()
+            # The YAML prints on every transition: keep the console quiet
+            with contextlib.redirect_stdout(io.StringIO()):
+                machine.execute()
+                start = time.perf_counter()
+                for _ in range(ROUNDS):
+                    machine.queue('PIN_ENTERED', code=1111).execute()
+                    machine.queue('RESET').execute()  # Each chart ignores the events it does not know
+                    machine.queue('PIN_ENTERED', code=1234).execute()
+                    machine.queue('LOCK', 'LOCK_CMD').execute()
+                elapsed = time.perf_counter() - start
+            print(f"{name:>20}: {5 * ROUNDS / elapsed:9,.0f} events/s  Current State: {machine.configuration}",
+                  file=sys.__stdout__)
+
+if __name__ == '__main__':
+    run_codegen_demo()
@@ -0,0 +1,51 @@
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+from sismic.exceptions import ContractError
+from sismic.interpreter import Interpreter
+
+from chart_cache import load_statechart
+from contracts import IncrementalContractInterpreter
+from engine import CompiledInterpreter
+
+EVENTS = 20000
+
+def run_contracts_demo():
+    statechart = load_statechart(filepath=os.path.join(os.path.dirname(__file__), '..', 'chapter_06', 'vault_contract.yaml'))
+
+    print("--- chapter_06/vault_contract.yaml: the backdoor is still caught ---")
+    interpreter = IncrementalContractInterpreter(statechart)
+    interpreter.execute()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(3):
+                interpreter.queue('DEV_TEST_FAIL').execute()
+    except ContractError as e:
+        print(f"{type(e).__name__}: {e._assertion} (attempts = {interpreter.context['attempts']})")
+
+    print(f"\n--- {EVENTS} events: mostly status polls, some PINs and locks ---")
+    rng = random.Random(7)
+    events = rng.choices(
+        [('STATUS', {}), ('PIN_ENTERED', {'code': 1234}), ('PIN_ENTERED', {'code': 1}), ('LOCK_CMD', {})],
+        weights=[8, 1, 1, 1],
+        k=EVENTS,
+    )
+    for interpreter_klass in (Interpreter, CompiledInterpreter, IncrementalContractInterpreter):
+        interpreter = interpreter_klass(statechart)
+        interpreter.execute()
+        start = time.perf_counter()
+        for name, data in events:
+            interpreter.queue(name, **data).execute()
+            interpreter.clock.time += 0.5  # Unlocked re-locks after 2 seconds, Lockdown ends after 3
+        elapsed = time.perf_counter() - start
+        line = f"{interpreter_klass.__name__:>31}: {EVENTS / elapsed:8,.0f} events/s"
+        if interpreter_klass is IncrementalContractInterpreter:
+            line += f", invariants evaluated {interpreter.invariants_checked} times, skipped {interpreter.invariants_skipped} times"
+        print(line, file=sys.__stdout__)
+
+if __name__ == '__main__':
+    run_contracts_demo()
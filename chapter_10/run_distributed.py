@@ -0,0 +1,38 @@
+import contextlib
+import io
+import os
+import sys
+import time
+
+from chart_cache import load_statechart
+from distributed import Cluster
+
+PAIRS = 300
+SECONDS = 30
+
+def run_distributed_demo():
+    path = os.path.join(os.path.dirname(__file__), '..', 'chapter_08')
+    vault = load_statechart(filepath=os.path.join(path, 'vault_ch8.yaml'))
+    charger = load_statechart(filepath=os.path.join(path, 'charger_ch8.yaml'))
+
+    print(f"--- {PAIRS} vaults, each bound to its charger, {SECONDS} simulated seconds ---")
+    for processes in sorted({0, 2, os.cpu_count() or 1}):
+        # The charts print on every charge: keep the console quiet (worker processes print to the same console)
+        with contextlib.redirect_stdout(io.StringIO()), Cluster(processes) as cluster:
+            start = time.perf_counter()
+            for k in range(PAIRS):
+                # A vault and its charger on the same node: their events still travel through the cluster
+                cluster.add(f'vault-{k}', vault, node=k % cluster.nodes)
+                cluster.add(f'charger-{k}', charger, node=k % cluster.nodes)
+                cluster.bind(f'vault-{k}', f'charger-{k}')
+                cluster.bind(f'charger-{k}', f'vault-{k}')
+            cluster.advance(SECONDS)
+            elapsed = time.perf_counter() - start
+            charging = sum('Charging' in cluster.configuration(f'vault-{k}') for k in range(PAIRS))
+
+        label = 'in this process' if processes == 0 else f'{processes} worker processes'
+        print(f"{label:>20}: {elapsed:5.2f}s, {charging} vaults charging at t={SECONDS}", file=sys.__stdout__)
+    print(f"({os.cpu_count()} CPU(s) on this machine)")
+
+if __name__ == '__main__':
+    run_distributed_demo()
@@ -0,0 +1,68 @@
+import os
+import time
+
+from chart_cache import load_statechart
+from effects import ThreadedEffects
+from engine import CompiledInterpreter
+
+VAULTS = 8
+SOLENOID = 0.02  # Seconds to move the bolt
+
+class SlowHardware:
+    """chapter 3's VaultHardware, with a solenoid that takes some time."""
+    def __init__(self):
+        self.calls = []
+
+    def set_led(self, color):
+        self.calls.append(f'led {color}')
+
+    def lock_mechanism(self):
+        time.sleep(SOLENOID)
+        self.calls.append('locked')
+
+    def unlock_mechanism(self):
+        time.sleep(SOLENOID)
+        self.calls.append('unlocked')
+
+    def beep(self, times):
+        self.calls.append(f'beep x{times}')
+
+    def flash_led(self, color):
+        self.calls.append(f'flash {color}')
+
+def run_effects_demo():
+    statechart = load_statechart(filepath=os.path.join(os.path.dirname(__file__), '..', 'chapter_03', 'vault_binding.yaml'))
+
+    for deferred in (False, True):
+        effects = ThreadedEffects(max_workers=VAULTS) if deferred else None
+        hardware = [SlowHardware() for _ in range(VAULTS)]
+        vaults = []
+        for hw in hardware:
+            context = {'hw': effects.target(hw, 'hw') if deferred else hw}
+            vault = CompiledInterpreter(statechart, initial_context=context)
+            if deferred:
+                effects.attach(vault)
+            vaults.append(vault)
+
+        start = time.perf_counter()
+        for vault in vaults:
+            vault.execute()
+            vault.queue('PIN_ENTERED', code=1234).execute()
+            vault.queue('PIN_ENTERED', code=9999).execute()
+            vault.queue('LOCK_CMD').execute()
+        stepping = time.perf_counter() - start
+        if deferred:
+            completed = effects.wait()
+            effects.shutdown()
+        total = time.perf_counter() - start
+
+        print(f"--- {'Deferred effects (thread pool)' if deferred else 'Synchronous calls (chapter 3)'} ---")
+        print(f"    Statechart thread busy for {stepping * 1000:6.1f} ms, hardware done after {total * 1000:6.1f} ms")
+        print(f"    Vault 0 hardware: {hardware[0].calls}")
+        if deferred:
+            done = [event for _, event in vaults[0]._external_queue]
+            print(f"    {completed} EFFECT_DONE events queued, e.g. {done[1]}")
+        print()
+
+if __name__ == '__main__':
+    run_effects_demo()
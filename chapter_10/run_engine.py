@@ -0,0 +1,35 @@
+import contextlib
+import io
+import os
+import time
+
+from sismic.interpreter import Interpreter
+
+from chart_cache import load_statechart
+from engine import CompiledInterpreter
+
+EVENTS = 3000
+
+def run_engine_demo():
+    filepath = os.path.join(os.path.dirname(__file__), '..', 'chapter_02', 'vault_passcode.yaml')
+    statechart = load_statechart(filepath=filepath)
+
+    print(f"--- {EVENTS} wrong PINs + resets on '{statechart.name}' ---")
+    for interpreter_klass in (Interpreter, CompiledInterpreter):
+        interpreter = interpreter_klass(statechart)
+        interpreter.execute()
+
+        # The YAML prints on every transition: keep the console quiet
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for _ in range(EVENTS):
+                interpreter.queue('PIN_ENTERED', code=0000).execute()  # -> ErrorState
+                interpreter.queue('DOOR_KNOCK').execute()  # Nobody listens to this one
+                interpreter.queue('RESET').execute()  # -> Locked
+            elapsed = time.perf_counter() - start
+
+        print(f"{interpreter_klass.__name__:>20}: {elapsed / (3 * EVENTS) * 1e6:6.1f} us per queue().execute()")
+        print(f"{'':>20}  Current State: {interpreter.configuration}")
+
+if __name__ == '__main__':
+    run_engine_demo()
@@ -0,0 +1,46 @@
+import contextlib
+import io
+import os
+import time
+
+from sismic.exceptions import ContractError
+from sismic.interpreter import Interpreter
+
+from bench import NullHardware
+from chart_cache import load_statechart
+from explore import Wait, explore
+
+def run_explore_demo():
+    statechart = load_statechart(filepath=os.path.join(os.path.dirname(__file__), '..', 'chapter_06', 'vault_contract.yaml'))
+    events = ['DEV_TEST_FAIL', 'LOCK_CMD', ('PIN_ENTERED', {'code': [1234, 0]})]
+
+    print("--- chapter_06/vault_contract.yaml ---")
+    found = explore(statechart, events)
+    print(f"{found.states} states explored, {found.violation.error} after {len(found.violation.trace)} moves:")
+    for move in found.violation.trace:
+        print(f"    wait {move.seconds}s" if isinstance(move, Wait) else f"    {move}")
+
+    # The trace reproduces the error with the reference interpreter
+    interpreter = Interpreter(statechart)
+    interpreter.execute()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for move in found.violation.trace:
+                interpreter.queue(move).execute()
+    except ContractError as e:
+        print(f"Replayed: {type(e).__name__} on {e._assertion}")
+
+    print("\n--- chapter_07/vault_complicated.yaml: no contract, the whole state space ---")
+    statechart = load_statechart(filepath=os.path.join(os.path.dirname(__file__), '..', 'chapter_07', 'vault_complicated.yaml'))
+    events = [(name, {'code': [1234, 0, 1]}) for name in statechart.events_for()]
+    for processes in (1, os.cpu_count()):
+        start = time.perf_counter()
+        found = explore(
+            statechart, events, waits=[0.5, 1, 2], processes=processes, initial_context={'hw': NullHardware()},
+        )
+        elapsed = time.perf_counter() - start
+        print(f"{processes:>2} process(es): {found.states} states, depth {found.depth}, "
+              f"complete: {found.complete}, {elapsed:.2f}s ({found.states / elapsed:,.0f} states/s)")
+
+if __name__ == '__main__':
+    run_explore_demo()
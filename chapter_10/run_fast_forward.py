@@ -0,0 +1,66 @@
+import contextlib
+import io
+import os
+import sys
+import time
+
+from sismic.clock import SimulatedClock
+
+from chart_cache import load_statechart
+from engine import CompiledInterpreter
+from fast_forward import fast_forward
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+def build():
+    path = os.path.join(os.path.dirname(__file__), '..', 'chapter_08')
+    clock = SimulatedClock()
+    vault = CompiledInterpreter(load_statechart(filepath=os.path.join(path, 'vault_ch8.yaml')), clock=clock)
+    charger = CompiledInterpreter(load_statechart(filepath=os.path.join(path, 'charger_ch8.yaml')), clock=clock)
+    vault.bind(charger)
+    charger.bind(vault)
+    return clock, vault, charger
+
+def charges(steps):
+    return sum(1 for step in steps for transition in step.transitions if transition.source == 'Charging')
+
+def report(message):
+    print(message, file=sys.__stdout__)
+
+def run_fast_forward_demo():
+    with contextlib.redirect_stdout(io.StringIO()):  # The charts print on every charge
+        # Chapter 8's way: small increments, and execute() "enough times"
+        clock, vault, charger = build()
+        start = time.perf_counter()
+        calls = done = 0
+        while clock.time < HOUR:
+            clock.time += 0.1
+            for _ in range(3):
+                done += charges(vault.execute())
+                charger.execute()
+                calls += 2
+        report("--- Battery cycles of the chapter 8 vault ---")
+        report(f"1 hour, 0.1s increments: {time.perf_counter() - start:6.2f} s, "
+               f"{calls} calls to execute(), {done} charges")
+
+        clock, vault, charger = build()
+        start = time.perf_counter()
+        instants = fast_forward([vault, charger], until=HOUR)
+        done = sum(charges(steps.get(vault, [])) for _, steps in instants)
+        report(f"1 hour, fast-forward:    {time.perf_counter() - start:6.2f} s, "
+               f"{len(instants)} instants, {done} charges")
+
+        start = time.perf_counter()
+        instants = fast_forward([vault, charger], until=HOUR + DAY)
+        done = sum(charges(steps.get(vault, [])) for _, steps in instants)
+        report(f"+1 day, fast-forward:    {time.perf_counter() - start:6.2f} s, "
+               f"{len(instants)} instants, {done} charges")
+
+        # Stop as soon as something happens
+        vault.queue('PIN_ENTERED', code=1234)
+        instants = fast_forward([vault, charger], predicate=lambda: 'Locked' in vault.configuration)
+        report(f"Unlocked at {instants[0][0]:g}s, relocked at {instants[-1][0]:g}s")
+
+if __name__ == '__main__':
+    run_fast_forward_demo()
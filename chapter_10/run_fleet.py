@@ -0,0 +1,59 @@
+import contextlib
+import io
+import os
+import time
+import tracemalloc
+
+from sismic.clock import SimulatedClock
+
+from chart_cache import load_statechart
+from engine import CompiledInterpreter
+from fleet import Fleet
+
+VAULTS = 10000
+
+def run_fleet_demo():
+    filepath = os.path.join(os.path.dirname(__file__), '..', 'chapter_05', 'vault_complex.yaml')
+    statechart = load_statechart(filepath=filepath)
+    clock = SimulatedClock()
+
+    tracemalloc.start()
+    vaults = Fleet(statechart, VAULTS, clock=clock)
+
+    # The YAML prints on every transition: keep the console quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        vaults.execute()  # Boot every vault
+        fleet_memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        for index in range(0, VAULTS, 100):
+            vaults.queue(index, 'PIN_ENTERED', code=1234)
+
+        ticks = []
+        while clock.time < 10:
+            start = time.perf_counter()
+            executed = vaults.execute()
+            ticks.append((clock.time, len(executed), time.perf_counter() - start))
+            clock.time += 0.5
+
+    print(f"--- {VAULTS} vaults of '{statechart.name}' ---")
+    for now, executed, elapsed in ticks:
+        print(f"t={now:4.1f}s: {executed:5d} vaults executed in {elapsed * 1e3:7.2f} ms")
+    print(f"Unlocked: {vaults.count('Unlocked')}, Locked: {vaults.count('Locked')}, "
+          f"DeadBattery: {vaults.count('DeadBattery')}")
+
+    # Same number of vaults, one interpreter each
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        interpreters = [CompiledInterpreter(statechart, clock=clock) for _ in range(VAULTS)]
+        for interpreter in interpreters:
+            interpreter.execute()
+    interpreters_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"Memory: {fleet_memory / VAULTS:7.0f} bytes per vault in a Fleet "
+          f"({vaults.nbytes / VAULTS:.0f} of them in columns)")
+    print(f"        {interpreters_memory / VAULTS:7.0f} bytes per vault with one interpreter each")
+
+if __name__ == '__main__':
+    run_fleet_demo()
@@ -0,0 +1,65 @@
+import contextlib
+import io
+import os
+import pickle
+import time
+import tracemalloc
+
+from sismic.exceptions import ContractError
+from sismic.model import Event
+
+from bench import NullHardware
+from chart_cache import load_statechart
+from engine import CompiledInterpreter
+from fork import ForkPoint, simulate
+
+FORKS = 1000
+
+def run_fork_demo():
+    statechart = load_statechart(filepath=os.path.join(os.path.dirname(__file__), '..', 'chapter_08', 'vault_ch8.yaml'))
+    live = CompiledInterpreter(statechart, initial_context={'hw': NullHardware()})
+    with contextlib.redirect_stdout(io.StringIO()):
+        live.execute()
+        live.queue(Event('PIN_ENTERED', code=0)).execute()
+
+    print(f"--- Copying the live vault {FORKS} times ---")
+    start = time.perf_counter()
+    for _ in range(FORKS):
+        pickle.loads(pickle.dumps(live))
+    print(f"   pickle round-trip: {(time.perf_counter() - start) / FORKS * 1e6:7.1f} us per copy")
+
+    point = ForkPoint(live)
+    start = time.perf_counter()
+    for _ in range(FORKS):
+        point.fork()
+    print(f"              fork(): {(time.perf_counter() - start) / FORKS * 1e6:7.1f} us per copy")
+
+    tracemalloc.start()
+    forks = [point.fork() for _ in range(FORKS)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"              memory: {size / FORKS / 1024:7.1f} KiB per fork")
+    del forks
+
+    print("\n--- chapter_06/vault_contract.yaml: where will it be in 10 minutes, if... ---")
+    statechart = load_statechart(filepath=os.path.join(os.path.dirname(__file__), '..', 'chapter_06', 'vault_contract.yaml'))
+    live = CompiledInterpreter(statechart)
+    live.execute()
+    live.queue(Event('PIN_ENTERED', code=0)).execute()
+    scenarios = {
+        'nothing happens': [],
+        'the owner comes back at 9:59': [Event('PIN_ENTERED', code=1234, delay=599)],
+        'two more wrong codes at 9:58': [Event('PIN_ENTERED', code=c, delay=598) for c in (1, 2)],
+        'a developer tests the backdoor': [Event('DEV_TEST_FAIL', delay=60 * i) for i in range(1, 4)],
+    }
+    for name, events in scenarios.items():
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                forked, = simulate(live, [events], 600)
+            print(f"{name:>32}: {forked.configuration}, attempts = {forked.context['attempts']}")
+        except ContractError as e:
+            print(f"{name:>32}: {type(e).__name__} ({e._assertion})")
+    print(f"{'(the live vault)':>32}: {live.configuration}, attempts = {live.context['attempts']}")
+
+if __name__ == '__main__':
+    run_fork_demo()
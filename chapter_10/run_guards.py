@@ -0,0 +1,61 @@
+import contextlib
+import glob
+import io
+import os
+import random
+
+from sismic.io import import_from_yaml
+
+from compiler import compile_statechart
+from engine import CompiledInterpreter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+EVENTS = 20000
+
+def run_guards_demo():
+    print("--- Transitions sharing a source state and an event ---")
+    for path in sorted(glob.glob(os.path.join(ROOT, 'chapter_*', '*.yaml'))):
+        compiled = compile_statechart(read(path))
+        for event, candidates in sorted(compiled.by_event.items()):
+            for source, priority_groups in candidates:
+                for group in priority_groups:
+                    if len(group) > 1:
+                        verdict = 'exclusive' if id(group) in compiled.exclusive else 'checked at runtime'
+                        print(f"{os.path.relpath(path, ROOT)}: {source} on {event}, {len(group)} guards: {verdict}")
+                        for transition in group:
+                            print(f"    {transition.guard}")
+
+    print("\n--- chapter_02/vault_passcode.yaml, random PINs ---")
+    for proven in (False, True):
+        statechart = read(os.path.join(ROOT, 'chapter_02', 'vault_passcode.yaml'))
+        if not proven:
+            compile_statechart(statechart).exclusive.clear()
+        label = 'stop at the first true guard' if proven else 'evaluate every guard'
+        print(f"{label}: {run(statechart) / EVENTS:.2f} guards per PIN_ENTERED")
+
+def read(path):
+    with open(path) as f:
+        return import_from_yaml(f.read())
+
+def run(statechart):
+    """Enter random PINs, return the number of guards evaluated."""
+    interpreter = CompiledInterpreter(statechart)
+    evaluate_guard = interpreter._evaluator.evaluate_guard
+    evaluations = 0
+
+    def counting(transition, event=None):
+        nonlocal evaluations
+        evaluations += 1
+        return evaluate_guard(transition, event)
+
+    interpreter._evaluator.evaluate_guard = counting
+    rng = random.Random(42)
+    with contextlib.redirect_stdout(io.StringIO()):
+        interpreter.execute()
+        for _ in range(EVENTS):
+            interpreter.queue('PIN_ENTERED', code=rng.choice([1234, 9999, 0, 1111])).execute()
+            interpreter.queue('LOCK', 'RESET').execute()
+    return evaluations
+
+if __name__ == '__main__':
+    run_guards_demo()
@@ -0,0 +1,78 @@
+import argparse
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from host import Client, Host
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ROUND_TRIPS = 2000
+
+# What a one-shot CLI tool does: start, import, parse, boot, send one event
+ONE_SHOT = """
+from sismic.io import import_from_yaml
+from sismic.interpreter import Interpreter
+interpreter = Interpreter(import_from_yaml(filepath={path!r}))
+interpreter.execute()
+interpreter.queue('PIN_ENTERED', code=1234).execute()
+print(interpreter.configuration)
+"""
+
+def run_host_demo():
+    chart = os.path.join(ROOT, 'chapter_02', 'vault_passcode.yaml')
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', ONE_SHOT.format(path=chart)], capture_output=True, text=True).stdout
+    print(f"One-shot script: {(time.perf_counter() - start) * 1e3:6.1f} ms -> {output.splitlines()[-1]}")
+
+    start = time.perf_counter()
+    host = Host(ROOT)
+    print(f"Host startup:    {(time.perf_counter() - start) * 1e3:6.1f} ms, {len(host.charts)} charts preloaded")
+
+    directory = tempfile.TemporaryDirectory()
+    path = os.path.join(directory.name, 'host.sock')
+    host.start(path)
+    try:
+        # The chart prints on every transition, from the host's thread: keep the console quiet
+        with Client(path) as client, contextlib.redirect_stdout(io.StringIO()):
+            client.create('vault-1', 'vault_passcode')
+            start = time.perf_counter()
+            for _ in range(ROUND_TRIPS):
+                client.batch([
+                    {'op': 'queue', 'instance': 'vault-1', 'event': 'PIN_ENTERED', 'data': {'code': 1234}},
+                    {'op': 'execute', 'instance': 'vault-1'},
+                    {'op': 'configuration', 'instance': 'vault-1'},
+                ])
+                client.batch([
+                    {'op': 'queue', 'instance': 'vault-1', 'event': 'LOCK'},
+                    {'op': 'execute', 'instance': 'vault-1'},
+                ])
+            elapsed = time.perf_counter() - start
+            print(f"Warm host:       {elapsed / (2 * ROUND_TRIPS) * 1e3:6.3f} ms per batch "
+                  f"(queue + execute [+ configuration]), {2 * ROUND_TRIPS} batches on one connection", file=sys.__stdout__)
+            print(f"                 -> {client.configuration('vault-1')}", file=sys.__stdout__)
+    finally:
+        host.stop()
+        directory.cleanup()
+
+def run_host(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the statecharts of a directory on a Unix-domain socket.')
+    parser.add_argument('--serve', metavar='SOCKET', help='serve on this socket until interrupted (default: run the demo)')
+    parser.add_argument('charts', nargs='?', default=ROOT, help='directory of YAML files (default: the tutorial)')
+    args = parser.parse_args(argv)
+
+    if args.serve is None:
+        run_host_demo()
+        return
+    host = Host(args.charts)
+    print(f"Serving {len(host.charts)} charts on {args.serve}")
+    try:
+        host.serve_forever(args.serve)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    run_host()
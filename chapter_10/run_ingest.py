@@ -0,0 +1,50 @@
+import contextlib
+import io
+import os
+import sys
+import time
+
+from sismic.interpreter import Interpreter
+
+from chart_cache import load_statechart
+from engine import CompiledInterpreter
+from ingest import ingest
+
+CHUNKS = 20000
+
+def chunks():
+    """What the network hands us: a whole update, in one batch."""
+    yield 'START_UPDATE'
+    for _ in range(CHUNKS):
+        yield 'CHUNK_RECEIVED'
+
+def run_ingest_demo():
+    statechart = load_statechart(filepath=os.path.join(os.path.dirname(__file__), '..', 'chapter_09', 'firmware.yaml'))
+    print(f"--- chapter_09/firmware.yaml: START_UPDATE, then {CHUNKS} CHUNK_RECEIVED ---")
+
+    for interpreter_klass in (Interpreter, CompiledInterpreter):
+        for label in ('queue().execute()', 'ingest()'):
+            interpreter = interpreter_klass(statechart)
+            # The YAML prints on every chunk: keep the console quiet
+            with contextlib.redirect_stdout(io.StringIO()):
+                interpreter.execute()
+                start = time.perf_counter()
+                if label == 'ingest()':
+                    ingest(interpreter, chunks())
+                else:
+                    for event in chunks():
+                        interpreter.queue(event).execute()
+                elapsed = time.perf_counter() - start
+            print(f"{interpreter_klass.__name__:>20} {label:>18}: {(CHUNKS + 1) / elapsed:9,.0f} events/s"
+                  f"  Current State: {interpreter.configuration}", file=sys.__stdout__)
+
+    # Compact results, on request: what each event fired
+    interpreter = CompiledInterpreter(statechart)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = ingest(interpreter, ['START_UPDATE', 'CHUNK_RECEIVED', 'UNKNOWN', 'CHUNK_RECEIVED'], results=True)
+    print("\n--- ingest(..., results=True) ---")
+    for fired in results:
+        print(f"    {[str(transition) for transition in fired]}")
+
+if __name__ == '__main__':
+    run_ingest_demo()
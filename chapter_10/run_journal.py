@@ -0,0 +1,67 @@
+import contextlib
+import io
+import os
+import pickle
+import tempfile
+
+from sismic.interpreter import Interpreter
+
+from chart_cache import load_statechart
+from journal import JournaledInterpreter
+
+def run_journal_demo():
+    yaml_path = os.path.join(os.path.dirname(__file__), '..', 'chapter_09', 'firmware.yaml')
+    statechart = load_statechart(filepath=yaml_path)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # ==========================================
+        # SESSION 1: The Crash
+        # ==========================================
+        print("--- SESSION 1: STARTING UPDATE ---")
+        interpreter = JournaledInterpreter(statechart, directory, checkpoint_every=5)
+        interpreter.execute()
+        interpreter.queue('START_UPDATE').execute()
+
+        for _ in range(6):
+            before = disk_usage(directory)
+            interpreter.queue('CHUNK_RECEIVED').execute()
+            print(f"   (journal: +{disk_usage(directory) - before} bytes)")
+
+        print(f"\n[Status] Current State: {interpreter.configuration}")
+        print(f"[Status] Progress Variable: {interpreter.context['progress']}%")
+        print(f"[Disk] {sorted(os.listdir(directory))}, {disk_usage(directory)} bytes")
+
+        # For comparison: chapter 9 pickles the whole interpreter after every chunk
+        reference = Interpreter(statechart)
+        with contextlib.redirect_stdout(io.StringIO()):
+            reference.execute()
+            reference.queue('START_UPDATE', *['CHUNK_RECEIVED'] * 6).execute()
+        print(f"[Disk] Chapter 9 would write {len(pickle.dumps(reference))} bytes per chunk")
+
+        print("\n⚡ POWER FAILURE! ⚡ (nothing to save: the journal is already on disk)")
+        del interpreter
+
+        # ==========================================
+        # SESSION 2: The Resume
+        # ==========================================
+        print("\n\n--- SESSION 2: REBOOT & RESUME ---")
+        # Replaying runs the actions again: keep the console quiet
+        with contextlib.redirect_stdout(io.StringIO()):
+            resumed = JournaledInterpreter(statechart, directory, checkpoint_every=5)
+        print(f">> Loaded snapshot, replayed {resumed.replayed} journal records")
+        print(f"[Status] Resumed State: {resumed.configuration}")
+        print(f"[Status] Resumed Progress: {resumed.context['progress']}%")
+
+        print("\n>> Resuming Download...")
+        while resumed.context['progress'] < 100:
+            resumed.queue('CHUNK_RECEIVED').execute()
+        resumed.close()
+
+        print("\n>> Process Finished.")
+        print(f"[Status] Final State: {resumed.configuration}")
+
+def disk_usage(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+if __name__ == '__main__':
+    run_journal_demo()
@@ -0,0 +1,92 @@
+import contextlib
+import io
+import os
+import sys
+import time
+
+from sismic.clock import SimulatedClock
+
+from chart_cache import load_statechart
+from engine import CompiledInterpreter
+
+STEPS = 20000
+
+# Three observers of every vault, as in chapter 8
+calls = 0
+
+def technician_log(meta_event):
+    global calls
+    calls += 1
+    if meta_event.name in ('step started', 'state entered', 'event sent'):
+        technician_log.lines += 1
+technician_log.lines = 0
+
+def monitor_bridge(meta_event):
+    global calls
+    calls += 1
+    if meta_event.name == 'state entered' and meta_event.state == 'Unlocked':
+        monitor_bridge.entered += 1
+monitor_bridge.entered = 0
+
+def audit(meta_events):
+    global calls
+    calls += 1
+    audit.steps += 1
+audit.steps = 0
+
+def audit_filtering(meta_event):
+    # Without batches, the audit has to find the end of every step by itself
+    global calls
+    calls += 1
+    if meta_event.name == 'state entered':
+        audit_filtering.pending = True
+    elif meta_event.name == 'step ended' and audit_filtering.pending:
+        audit_filtering.pending = False
+        audit.steps += 1
+audit_filtering.pending = False
+
+def run(statechart, attach):
+    clock = SimulatedClock()
+    interpreter = CompiledInterpreter(statechart, clock=clock)
+    attach(interpreter)
+    interpreter.execute()
+    start = time.perf_counter()
+    for _ in range(STEPS // 2):
+        interpreter.queue('PIN_ENTERED', code=1234).execute()
+        clock.time += 2
+        interpreter.execute()
+    return (time.perf_counter() - start) / STEPS
+
+def attach_all(interpreter):
+    interpreter.attach(technician_log)
+    interpreter.attach(monitor_bridge)
+    interpreter.attach(audit_filtering)
+
+def attach_selective(interpreter):
+    interpreter.attach(technician_log, names=['step started', 'state entered', 'event sent'])
+    interpreter.attach(monitor_bridge, names=['state entered'], states=['Unlocked'])
+    interpreter.attach(audit, names=['state entered'], batch=True)
+
+def run_listeners_demo():
+    filepath = os.path.join(os.path.dirname(__file__), '..', 'chapter_04', 'vault_timer.yaml')
+    statechart = load_statechart(filepath=filepath)
+
+    global calls
+    with contextlib.redirect_stdout(io.StringIO()):  # The YAML prints on every transition
+        bare = run(statechart, lambda interpreter: None)
+        results = []
+        for attach in (attach_all, attach_selective):
+            calls = technician_log.lines = monitor_bridge.entered = audit.steps = 0
+            elapsed = run(statechart, attach)
+            results.append((elapsed, calls, technician_log.lines, monitor_bridge.entered, audit.steps))
+
+    print(f"--- {STEPS} steps of a vault with three observers ---", file=sys.__stdout__)
+    print(f"{'no observer':>22}: {bare * 1e6:5.1f} us per step", file=sys.__stdout__)
+    for label, (elapsed, count, lines, entered, steps) in zip(('attach(listener)', 'attach(listener, ...)'), results):
+        print(f"{label:>22}: {elapsed * 1e6:5.1f} us per step, {count / STEPS:4.1f} listener calls per step",
+              file=sys.__stdout__)
+        print(f"{'':>24}technician: {lines} lines, monitor: {entered} unlocks, audit: {steps} steps",
+              file=sys.__stdout__)
+
+if __name__ == '__main__':
+    run_listeners_demo()
@@ -0,0 +1,59 @@
+import contextlib
+import hashlib
+import io
+import os
+import random
+import sys
+import time
+
+from sismic.io import import_from_yaml
+
+from engine import CompiledInterpreter
+from memo import MemoInterpreter
+
+EVENTS = 1000
+ROUNDS = 5000  # PBKDF2 iterations: what a real admin check costs
+
+def expensive_vault():
+    """chapter_02/vault_passcode.yaml, with an is_admin() that hashes the code, declared pure."""
+    with open(os.path.join(os.path.dirname(__file__), '..', 'chapter_02', 'vault_passcode.yaml')) as f:
+        text = f.read()
+    admin_hash = hashlib.pbkdf2_hmac('sha256', b'9999', b'vault', ROUNDS).hex()
+    text = text.replace(
+        "        return code == 9999\n",
+        "        import hashlib\n"
+        f"        return hashlib.pbkdf2_hmac('sha256', str(code).encode(), b'vault', {ROUNDS}).hex() == '{admin_hash}'\n"
+        "    __pure__ = ['is_admin', 'event.code == correct_pin']\n",
+    )
+    return import_from_yaml(text)
+
+def run_memo_demo():
+    statechart = expensive_vault()
+    rng = random.Random(3)
+    codes = rng.choices([1234, 9999, 1111, 4321, 42], weights=[5, 1, 2, 2, 1], k=EVENTS)
+
+    print(f"--- {EVENTS} PINs (5 distinct codes), is_admin() runs PBKDF2 ({ROUNDS} rounds) ---")
+    results = []
+    for interpreter_klass in (CompiledInterpreter, MemoInterpreter):
+        interpreter = interpreter_klass(statechart)
+        configurations = []
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.execute()
+            for code in codes:
+                interpreter.queue('PIN_ENTERED', code=code).execute()
+                configurations.append(interpreter.configuration)
+                interpreter.queue('RESET', 'LOCK').execute()
+        elapsed = time.perf_counter() - start
+        results.append(configurations)
+
+        line = f"{interpreter_klass.__name__:>19}: {EVENTS / elapsed:8,.0f} PINs/s"
+        if interpreter_klass is MemoInterpreter:
+            info = interpreter.context['is_admin'].cache_info()
+            line += (f", is_admin() ran {info.misses} times ({info.hits} cached),"
+                     f" guard cache: {interpreter.guard_hits} hits, {interpreter.guard_misses} misses")
+        print(line, file=sys.__stdout__)
+    print(f"Same configurations after every PIN: {results[0] == results[1]}")
+
+if __name__ == '__main__':
+    run_memo_demo()
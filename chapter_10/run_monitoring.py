@@ -0,0 +1,83 @@
+import contextlib
+import io
+import os
+import sys
+import time
+
+from sismic.clock import SimulatedClock
+
+from chart_cache import load_statechart
+from engine import CompiledInterpreter
+from monitoring import Monitoring
+
+PAIRS = 200
+MONITORS = 3
+CYCLES = 10
+
+def load(name):
+    return load_statechart(filepath=os.path.join(os.path.dirname(__file__), '..', 'chapter_08', name))
+
+def build(vault_sc, charger_sc):
+    clock = SimulatedClock()
+    pairs = []
+    for _ in range(PAIRS):
+        vault = CompiledInterpreter(vault_sc, clock=clock)
+        charger = CompiledInterpreter(charger_sc, clock=clock)
+        vault.bind(charger)
+        charger.bind(vault)
+        pairs.append((vault, charger))
+    return clock, pairs
+
+def bridge(monitor_sc, vault):
+    """The bridge of chapter_08/run_sync.py, one per monitor."""
+    monitor = CompiledInterpreter(monitor_sc, clock=vault.clock)
+    monitor.execute()
+    def bridge_to_monitor(meta_event):
+        if meta_event.name == 'state entered':
+            monitor.queue('step', entered_states=[meta_event.state], configuration=vault.configuration).execute()
+    vault.attach(bridge_to_monitor)
+    return monitor
+
+def simulate(clock, pairs):
+    """Charge cycles, and a customer who opens the vault when a charge is complete."""
+    start = time.perf_counter()
+    for cycle in range(CYCLES):
+        for seconds in (0, 2.0, 5.0):
+            clock.time += seconds
+            for _ in range(3):
+                for vault, charger in pairs:
+                    vault.execute()
+                    charger.execute()
+        for vault, _ in pairs:
+            vault.queue('PIN_ENTERED', code=1234).execute()
+    return time.perf_counter() - start
+
+def run_monitoring_demo():
+    vault_sc, charger_sc, monitor_sc = load('vault_ch8.yaml'), load('charger_ch8.yaml'), load('monitor_ch8.yaml')
+
+    with contextlib.redirect_stdout(io.StringIO()):  # The charts print on every charge
+        clock, pairs = build(vault_sc, charger_sc)
+        bare = simulate(clock, pairs)
+
+        clock, pairs = build(vault_sc, charger_sc)
+        for vault, _ in pairs:
+            for _ in range(MONITORS):
+                bridge(monitor_sc, vault)
+        bridged = simulate(clock, pairs)
+
+        clock, pairs = build(vault_sc, charger_sc)
+        monitoring = Monitoring(*[monitor_sc] * MONITORS)
+        for vault, _ in pairs:
+            monitoring.watch(vault)
+        monitored = simulate(clock, pairs)
+
+    print(f"--- {PAIRS} vaults and chargers, {CYCLES} charge cycles, {MONITORS} safety monitors per vault ---",
+          file=sys.__stdout__)
+    for label, elapsed in (('no monitor', bare), ('chapter 8 bridges', bridged), ('Monitoring', monitored)):
+        print(f"{label:>18}: {elapsed * 1e3:7.1f} ms", file=sys.__stdout__)
+    safe = all(monitor.configuration == ['Monitoring', 'Safe']
+               for vault, _ in pairs for monitor in monitoring.monitors(vault))
+    print(f"Every monitor still in 'Safe': {safe}", file=sys.__stdout__)
+
+if __name__ == '__main__':
+    run_monitoring_demo()
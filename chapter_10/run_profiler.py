@@ -0,0 +1,56 @@
+import contextlib
+import io
+import os
+import sys
+import time
+
+from sismic.clock import SimulatedClock
+
+from chart_cache import load_statechart
+from engine import CompiledInterpreter
+from profiler import Profiler
+
+VAULTS = 100
+
+class SlowSolenoid:
+    """Chapter 3's hardware, with a solenoid that takes half a millisecond to move."""
+    def set_led(self, color): pass
+    def beep(self, times): pass
+    def flash_led(self, color): pass
+    def lock_mechanism(self): time.sleep(0.0005)
+    def unlock_mechanism(self): time.sleep(0.0005)
+
+def load(chapter, name):
+    return load_statechart(filepath=os.path.join(os.path.dirname(__file__), '..', chapter, name))
+
+def run_profiler_demo(flamegraph_path=None):
+    passcode = load('chapter_02', 'vault_passcode.yaml')
+    binding = load('chapter_03', 'vault_binding.yaml')
+
+    profiler = Profiler()
+    clock = SimulatedClock()
+    vaults = [CompiledInterpreter(passcode, clock=clock) for _ in range(VAULTS)]
+    vaults += [CompiledInterpreter(binding, clock=clock, initial_context={'hw': SlowSolenoid()}) for _ in range(VAULTS)]
+    for vault in vaults:
+        profiler.attach(vault)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for vault in vaults:
+            vault.execute()
+            for code in (0, 9999, 1234):
+                vault.queue('PIN_ENTERED', code=code).execute()
+            vault.queue('RESET', 'LOCK_CMD').execute()
+
+    print(f"--- {len(vaults)} vaults of chapters 2 and 3, profiled ---")
+    print(profiler.report(limit=15))
+
+    if flamegraph_path:
+        profiler.write_flamegraph(flamegraph_path)
+        print(f"\nFlame graph written to {flamegraph_path} (open it with speedscope or flamegraph.pl)")
+
+    # Detached: the vaults run their original code again
+    for vault in vaults:
+        profiler.detach(vault)
+
+if __name__ == '__main__':
+    run_profiler_demo(*sys.argv[1:2])
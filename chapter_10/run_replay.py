@@ -0,0 +1,76 @@
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sismic.clock import SimulatedClock
+from sismic.io import import_from_yaml
+
+from chart_cache import load_statechart
+from engine import CompiledInterpreter
+from replay import read, record, replay, replay_many
+
+SESSIONS = 1000
+
+def run_replay_demo():
+    filepath = os.path.join(os.path.dirname(__file__), '..', 'chapter_07', 'vault_complicated.yaml')
+    statechart = load_statechart(filepath=filepath)
+
+    # Version 2: the door stays unlocked for 3 seconds instead of 2
+    with open(filepath) as f:
+        version_2 = import_from_yaml(f.read().replace('after(2)', 'after(3)'))
+
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+        # "Production": every session is recorded
+        paths = [os.path.join(directory, f'session.{n}.gz') for n in range(SESSIONS)]
+        start = time.perf_counter()
+        for seed, path in enumerate(paths):
+            run_session(statechart, path, random.Random(seed))
+        report(f"Recorded {SESSIONS} sessions", start)
+        instants = sum(1 for path in paths for _ in read(path))
+        size = sum(os.path.getsize(path) for path in paths)
+        report(f"{instants} instants, {size / instants:.1f} bytes per instant (compressed)", None)
+
+        start = time.perf_counter()
+        replayed = [replay(statechart, path) for path in paths]
+        report(f"Replayed with the same version: {count(replayed)} sessions diverge", start)
+
+        start = time.perf_counter()
+        replayed = [replay(version_2, path) for path in paths]
+        report(f"Replayed with version 2: {count(replayed)} sessions diverge", start)
+
+        start = time.perf_counter()
+        replayed = list(replay_many(version_2, paths, processes=4))
+        report(f"Same thing in 4 processes: {count(replayed)} sessions diverge", start)
+
+    first = min((r for r in replayed if r.divergence), key=lambda r: r.divergence.time)
+    divergence = first.divergence
+    report(f"\nEarliest divergence, {os.path.basename(first.trace)} at t={divergence.time:g}s:", None)
+    report(f"  recorded: {sorted(divergence.recorded)}", None)
+    report(f"  replayed: {sorted(divergence.replayed)}", None)
+
+def run_session(statechart, path, rng):
+    """A customer using the vault for a while, recorded."""
+    clock = SimulatedClock()
+    vault = CompiledInterpreter(statechart, clock=clock)
+    recorder = record(vault, path)
+    vault.execute()
+    for _ in range(rng.randint(5, 40)):
+        clock.time += rng.choice([0.5, 1.0, 2.5, 10.0])
+        name = rng.choice(['PIN_ENTERED'] * 8 + ['MASTER_RESET', 'REBOOT'])
+        vault.queue(name, code=rng.choice([1234, 1234, 0])).execute()
+    recorder.close()
+
+def count(replayed):
+    return sum(1 for r in replayed if r.divergence)
+
+def report(message, start):
+    # The YAML prints on every transition: only our messages go to the console
+    elapsed = '' if start is None else f" ({(time.perf_counter() - start) * 1e3:.0f} ms)"
+    print(message + elapsed, file=sys.__stdout__)
+
+if __name__ == '__main__':
+    run_replay_demo()
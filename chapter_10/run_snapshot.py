@@ -0,0 +1,50 @@
+import contextlib
+import io
+import os
+import pickle
+import time
+
+import snapshot
+from chart_cache import load_statechart
+from engine import CompiledInterpreter
+
+UPDATES = 10000
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def run_snapshot_demo():
+    yaml_path = os.path.join(os.path.dirname(__file__), '..', 'chapter_09', 'firmware.yaml')
+    statechart = load_statechart(filepath=yaml_path)
+
+    # Many paused updates, at various stages
+    interpreters = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for index in range(UPDATES):
+            interpreter = CompiledInterpreter(statechart)
+            interpreter.execute()
+            interpreter.queue('START_UPDATE', *['CHUNK_RECEIVED'] * (index % 10)).execute()
+            interpreters.append(interpreter)
+
+    print(f"--- {UPDATES} paused firmware updates ---")
+    print(f"Chart reference: {snapshot.chart_ref(statechart)}")
+
+    pickles, pickle_time = timed(lambda: [pickle.dumps(i) for i in interpreters])
+    _, unpickle_time = timed(lambda: [pickle.loads(p) for p in pickles])
+    blobs, encode_time = timed(snapshot.encode_many, interpreters)
+    _, decode_time = timed(snapshot.decode_many, blobs, statechart)
+    resumed, resume_time = timed(snapshot.resume_many, blobs, statechart)
+
+    print(f"{'pickle (chapter 9)':>20}: {sum(map(len, pickles)) / UPDATES:6.0f} bytes each, "
+          f"save {pickle_time * 1e6 / UPDATES:6.1f} us, load {unpickle_time * 1e6 / UPDATES:6.1f} us")
+    print(f"{'snapshot':>20}: {sum(map(len, blobs)) / UPDATES:6.0f} bytes each, "
+          f"save {encode_time * 1e6 / UPDATES:6.1f} us, load {decode_time * 1e6 / UPDATES:6.1f} us "
+          f"(+ interpreter: {resume_time * 1e6 / UPDATES:.1f} us)")
+
+    assert [i.context['progress'] for i in resumed] == [i.context['progress'] for i in interpreters]
+    print(f"Resumed update #7: {resumed[7].configuration}, progress {resumed[7].context['progress']}%")
+
+if __name__ == '__main__':
+    run_snapshot_demo()
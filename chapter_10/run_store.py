@@ -0,0 +1,59 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from chart_cache import load_statechart
+from store import InterpreterStore
+
+VAULTS = 1000000
+
+def run_store_demo():
+    filepath = os.path.join(os.path.dirname(__file__), '..', 'chapter_04', 'vault_timer.yaml')
+    statechart = load_statechart(filepath=filepath)
+
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+        path = os.path.join(directory, 'vaults.store')
+        vaults = InterpreterStore(path, statechart, max_live=1000)
+
+        start = time.perf_counter()
+        vaults.create_many(VAULTS)
+        report(f"Created {VAULTS} vaults", start)
+        report(f"File: {os.path.getsize(path) / VAULTS:.0f} bytes per vault", None)
+
+        # 500 customers enter their PIN: only their vaults are loaded
+        start = time.perf_counter()
+        for index in range(0, VAULTS, VAULTS // 500):
+            vaults.queue(index, 'PIN_ENTERED', code=1234)
+        executed = vaults.execute()
+        report(f"{len(executed)} vaults unlocked, {len(vaults.live)} live interpreters", start)
+
+        start = time.perf_counter()
+        unlocked = vaults.with_state('Unlocked')
+        report(f"Secondary index: {len(unlocked)} vaults in 'Unlocked'", start)
+
+        # Evict them: they are written back with their after(2) deadline
+        for index in range(1, 2001, 2):
+            vaults.get(index)
+        report(f"Loaded other vaults: {len(unlocked & set(vaults.live))} unlocked vaults still live", None)
+
+        start = time.perf_counter()
+        vaults.execute()
+        report("Nothing to do: one pass over the index", start)
+
+        vaults.clock.time = 2
+        start = time.perf_counter()
+        executed = vaults.execute()
+        report(f"t=2s: {len(executed)} vaults woken up by their deadline and relocked", start)
+        report(f"{len(vaults.with_state('Unlocked'))} vaults left in 'Unlocked'", None)
+        vaults.close()
+
+def report(message, start):
+    # The YAML prints on every transition: only our messages go to the console
+    elapsed = '' if start is None else f" ({(time.perf_counter() - start) * 1e3:.1f} ms)"
+    print(message + elapsed, file=sys.__stdout__)
+
+if __name__ == '__main__':
+    run_store_demo()
@@ -0,0 +1,38 @@
+import contextlib
+import io
+import os
+import time
+
+from sismic.interpreter import Interpreter
+
+from chart_cache import load_statechart
+from engine import CompiledInterpreter
+from table import TableInterpreter
+
+ROUNDS = 3000
+
+def run_table_demo():
+    for chart in ('chapter_05/vault_complex.yaml', 'chapter_07/vault_complicated.yaml'):
+        statechart = load_statechart(filepath=os.path.join(os.path.dirname(__file__), '..', chart))
+        table = TableInterpreter(statechart).table
+        stable = sum(1 for row in table.rows.values() if row[3] is None)
+        print(f"--- {chart}: {len(table)} configurations in the table, {stable} of them stable ---")
+
+        for interpreter_klass in (Interpreter, CompiledInterpreter, TableInterpreter):
+            interpreter = interpreter_klass(statechart)
+
+            # The YAML prints on every transition: keep the console quiet
+            with contextlib.redirect_stdout(io.StringIO()):
+                interpreter.execute()
+                start = time.perf_counter()
+                for _ in range(ROUNDS):
+                    interpreter.queue('PIN_ENTERED', code=1234).execute()  # Into the parallel state
+                    interpreter.queue('MASTER_RESET').execute()  # Out of every region at once
+                    interpreter.queue('REBOOT').execute()  # Back in, through the initial states
+                elapsed = time.perf_counter() - start
+
+            print(f"{interpreter_klass.__name__:>20}: {elapsed / (3 * ROUNDS) * 1e6:6.1f} us per queue().execute()")
+        print(f"{'':>20}  Current State: {interpreter.configuration}\n")
+
+if __name__ == '__main__':
+    run_table_demo()
@@ -0,0 +1,156 @@
+import heapq
+import itertools
+import threading
+
+from sismic.clock import SimulatedClock
+
+from engine import polled_deadline
+
+# ---------------------------------------------------------
+# A deadline-driven scheduler.
+#
+# Instead of calling execute() on every interpreter every 100ms "just in
+# case", we ask each interpreter when it will next have something to do
+# (CompiledInterpreter.next_deadline) and keep the answers in a heap.
+# Interpreters are only executed when their deadline is reached, or when
+# an event is queued for them.
+# ---------------------------------------------------------
+
+
+class Scheduler:
+    """
+    Execute many CompiledInterpreters when, and only when, they have
+    something to do.
+
+    :param clock: clock shared by the scheduler and its interpreters
+        (default to a SimulatedClock)
+    :param poll_interval: how often interpreters whose time-based guards
+        cannot be predicted are executed
+    """
+
+    def __init__(self, clock=None, *, poll_interval=0.1):
+        self.clock = SimulatedClock() if clock is None else clock
+        self.poll_interval = poll_interval
+        self._heap = []  # (deadline, tie breaker, interpreter)
+        self._deadlines = {}  # interpreter -> its deadline in the heap, None if idle
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, interpreter):
+        return interpreter in self._deadlines
+
+    def add(self, interpreter):
+        """Manage given interpreter. It is executed on the next call to execute()."""
+        with self._condition:
+            self._schedule(interpreter, self.clock.time)
+        return interpreter
+
+    def remove(self, interpreter):
+        """Stop managing given interpreter."""
+        with self._condition:
+            del self._deadlines[interpreter]  # Its heap entries are now stale
+
+    def queue(self, interpreter, event_or_name, *event_or_names, **parameters):
+        """
+        Queue events for given interpreter, like Interpreter.queue, and wake
+        it up. Can be called from any thread.
+        """
+        with self._condition:
+            interpreter.queue(event_or_name, *event_or_names, **parameters)
+            self._reschedule(interpreter)
+            self._condition.notify()
+        return interpreter
+
+    @property
+    def next_time(self):
+        """Earliest deadline of the managed interpreters, or None if they are all idle."""
+        with self._condition:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def execute(self):
+        """
+        Execute every interpreter whose deadline is reached.
+
+        :return: a dict mapping executed interpreters to their (non-empty)
+            list of MacroStep.
+        """
+        returned = {}
+        with self._condition:
+            now = self.clock.time
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, interpreter = heapq.heappop(self._heap)
+                if interpreter in self._deadlines and self._deadlines[interpreter] == deadline:
+                    self._deadlines[interpreter] = None  # Makes remaining heap entries stale
+                    due.append(interpreter)
+
+            for position, interpreter in enumerate(due):
+                try:
+                    steps = interpreter.execute()
+                except BaseException:
+                    for pending in due[position + 1:]:
+                        self._schedule(pending, now)  # Not run: still due
+                    raise
+                finally:
+                    self._reschedule(interpreter, executed=True)
+                if steps:
+                    returned[interpreter] = steps
+        return returned
+
+    def advance(self, until):
+        """
+        For a SimulatedClock: move the clock from deadline to deadline up to
+        given time, executing interpreters on the way.
+
+        :return: a list of (time, executed interpreters) pairs, one per call to execute()
+        """
+        returned = []
+        while True:
+            deadline = self.next_time
+            if deadline is None or deadline > until:
+                break
+            self.clock.time = max(self.clock.time, deadline)
+            returned.append((self.clock.time, self.execute()))
+        self.clock.time = max(self.clock.time, until)
+        return returned
+
+    def run(self, stop):
+        """
+        For a real clock: sleep until the next deadline or the next queued
+        event, execute, repeat until given threading.Event is set.
+        """
+        while not stop.is_set():
+            self.execute()
+            with self._condition:
+                deadline = self.next_time
+                timeout = None if deadline is None else max(0, deadline - self.clock.time)
+                # Wake up regularly to check the stop flag
+                self._condition.wait(min(timeout, 0.5) if timeout is not None else 0.5)
+
+    # ---------------------------------------------------------
+    # Heap maintenance
+    # ---------------------------------------------------------
+
+    def _reschedule(self, interpreter, executed=False):
+        if interpreter not in self._deadlines:
+            return
+        if executed:
+            deadline = polled_deadline(interpreter, self.poll_interval, interpreter.compiled, now=self.clock.time)
+        else:
+            deadline = interpreter.next_deadline()
+        self._schedule(interpreter, deadline)
+
+    def _schedule(self, interpreter, deadline):
+        if self._deadlines.get(interpreter, None) == deadline and deadline is not None:
+            return
+        self._deadlines[interpreter] = deadline
+        if deadline is not None:
+            heapq.heappush(self._heap, (deadline, next(self._counter), interpreter))
+
+    def _drop_stale(self):
+        while self._heap and self._deadlines.get(self._heap[0][2], None) != self._heap[0][0]:
+            heapq.heappop(self._heap)
@@ -0,0 +1,227 @@
+import hashlib
+import pickle
+import struct
+import types
+import weakref
+
+from sismic.io import export_to_yaml
+
+from engine import CompiledInterpreter
+
+# ---------------------------------------------------------
+# Snapshots: the state of an interpreter, without the interpreter.
+#
+# Pickling an Interpreter (chapter 9) also pickles its statechart, its
+# evaluator, its clock and its listeners. Only a handful of attributes
+# actually change while it runs: those are what a snapshot contains.
+#
+# encode() packs a snapshot into a few dozen bytes:
+#   format (1 byte), chart name (1 byte length + UTF-8), chart hash (8 bytes)
+#   flags (1 byte), time (float64)
+#   active states, as a bitmask over the (sorted) states of the chart
+#   entry times of the active states (float64 each)
+#   idle times of the active states, unless they are the entry times
+#   pickle of (history memory, internal queue, external queue, context)
+# ---------------------------------------------------------
+
+FORMAT = 1
+_INITIALIZED, _IDLE_IS_ENTRY = 1, 2
+_FLAGS_AND_TIME = struct.Struct('<Bd')
+
+
+def take(interpreter, *, exclude=()):
+    """
+    Return the state of given interpreter as a dict of plain values.
+
+    :param interpreter: an Interpreter
+    :param exclude: context variables not to include, typically the ones
+        of the initial context (hardware objects, ...)
+
+    Functions, classes and modules are not included either: the preamble
+    of the restored interpreter defines them again.
+    """
+    return {
+        'initialized': interpreter._initialized,
+        'time': interpreter._time,
+        'configuration': sorted(interpreter._configuration),
+        'entry_time': dict(interpreter._entry_time),
+        'idle_time': dict(interpreter._idle_time),
+        'history': dict(interpreter._memory),
+        'internal_queue': list(interpreter._internal_queue),
+        'external_queue': list(interpreter._external_queue),
+        'context': {
+            k: v for k, v in interpreter.context.items()
+            if k not in exclude and not callable(v) and not isinstance(v, types.ModuleType)
+        },
+    }
+
+
+def restore(interpreter, state):
+    """
+    Put given interpreter in the state returned by take(). The interpreter
+    must be a new interpreter of the same statechart.
+    """
+    interpreter._initialized = state['initialized']
+    interpreter._time = state['time']
+    interpreter._configuration = set(state['configuration'])
+    interpreter._entry_time = dict(state['entry_time'])
+    interpreter._idle_time = dict(state['idle_time'])
+    interpreter._memory = dict(state['history'])
+    interpreter._internal_queue = list(state['internal_queue'])
+    interpreter._external_queue = list(state['external_queue'])
+    interpreter.context.update(state['context'])
+    return interpreter
+
+
+def chart_ref(statechart):
+    """The (name, hash) pair that identifies given statechart in encoded snapshots."""
+    chart = layout(statechart)
+    return chart.name, chart.digest.hex()
+
+
+def read_ref(data):
+    """The (name, hash) pair of the statechart of an encoded snapshot, to find its statechart."""
+    if not data or data[0] != FORMAT:
+        raise ValueError('Not a snapshot, or a snapshot of another format')
+    end = 2 + data[1]
+    return bytes(data[2:end]).decode('utf-8'), bytes(data[end:end + 8]).hex()
+
+
+def encode(interpreter, *, exclude=()):
+    """Return the snapshot of given interpreter, as bytes. See take()."""
+    return layout(interpreter.statechart).encode(take(interpreter, exclude=exclude))
+
+
+def decode(data, statechart):
+    """
+    Return the snapshot encoded in given bytes, as returned by take().
+    Raise a ValueError if it is not a snapshot of given statechart.
+    """
+    return layout(statechart).decode(data)
+
+
+def resume(data, statechart, *, interpreter_klass=CompiledInterpreter, **kwargs):
+    """Create an interpreter of given statechart (kwargs are passed to it), in the encoded state."""
+    return restore(interpreter_klass(statechart, **kwargs), decode(data, statechart))
+
+
+def encode_many(interpreters, *, exclude=()):
+    """Encode the snapshots of many interpreters, sharing the work between those of a same statechart."""
+    layouts = {}
+    returned = []
+    for interpreter in interpreters:
+        chart = layouts.get(interpreter.statechart)
+        if chart is None:
+            chart = layouts[interpreter.statechart] = layout(interpreter.statechart)
+        returned.append(chart.encode(take(interpreter, exclude=exclude)))
+    return returned
+
+
+def decode_many(data, statechart):
+    """Decode many snapshots of given statechart."""
+    decode = layout(statechart).decode
+    return [decode(item) for item in data]
+
+
+def resume_many(data, statechart, *, interpreter_klass=CompiledInterpreter, **kwargs):
+    """Create an interpreter per encoded snapshot (kwargs are passed to each of them)."""
+    return [
+        restore(interpreter_klass(statechart, **kwargs), state) for state in decode_many(data, statechart)
+    ]
+
+
+# One Layout per Statechart, dropped when the statechart is collected
+_layouts = weakref.WeakKeyDictionary()
+
+
+def layout(statechart):
+    """The (shared) Layout of given statechart."""
+    chart = _layouts.get(statechart)
+    if chart is None:
+        chart = _layouts[statechart] = Layout(statechart)
+    return chart
+
+
+class Layout:
+    """What encode and decode need to know about a statechart, computed once."""
+
+    def __init__(self, statechart):
+        self.name = statechart.name
+        # Hash of the exported YAML: the same chart, however it was loaded
+        self.digest = hashlib.sha256(export_to_yaml(statechart).encode('utf-8')).digest()[:8]
+        self.states = sorted(statechart.states)
+        self.index = {name: i for i, name in enumerate(self.states)}
+        self.mask_size = (len(self.states) + 7) // 8
+
+        name = self.name.encode('utf-8')
+        if len(name) > 255:
+            raise ValueError('Statechart name is too long to be stored in a snapshot')
+        self.header = bytes([FORMAT, len(name)]) + name + self.digest
+
+    def mask(self, configuration):
+        """Bitmask of given states."""
+        mask = 0
+        for name in configuration:
+            mask |= 1 << self.index[name]
+        return mask
+
+    def active(self, mask):
+        """States of given bitmask."""
+        return [name for i, name in enumerate(self.states) if mask >> i & 1]
+
+    def encode(self, state):
+        active = sorted(self.index[name] for name in state['configuration'])
+        mask = self.mask(state['configuration'])
+        entry = [state['entry_time'][self.states[i]] for i in active]
+        idle = [state['idle_time'][self.states[i]] for i in active]
+
+        flags = (_INITIALIZED if state['initialized'] else 0) | (_IDLE_IS_ENTRY if idle == entry else 0)
+        parts = [
+            self.header,
+            _FLAGS_AND_TIME.pack(flags, state['time']),
+            mask.to_bytes(self.mask_size, 'little'),
+            struct.pack(f'<{len(entry)}d', *entry),
+        ]
+        if idle != entry:
+            parts.append(struct.pack(f'<{len(idle)}d', *idle))
+        parts.append(pickle.dumps(
+            (state['history'], state['internal_queue'], state['external_queue'], state['context']),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        ))
+        return b''.join(parts)
+
+    def decode(self, data):
+        data = memoryview(data)
+        size = len(self.header)
+        if data[:size] != self.header:
+            name, digest = read_ref(data)
+            raise ValueError(
+                f'Snapshot of statechart {name!r} ({digest}), expected {self.name!r} ({self.digest.hex()})'
+            )
+
+        flags, time = _FLAGS_AND_TIME.unpack_from(data, size)
+        position = size + _FLAGS_AND_TIME.size
+        mask = int.from_bytes(data[position:position + self.mask_size], 'little')
+        position += self.mask_size
+
+        active = self.active(mask)
+        entry = struct.unpack_from(f'<{len(active)}d', data, position)
+        position += 8 * len(active)
+        if flags & _IDLE_IS_ENTRY:
+            idle = entry
+        else:
+            idle = struct.unpack_from(f'<{len(active)}d', data, position)
+            position += 8 * len(active)
+        history, internal_queue, external_queue, context = pickle.loads(data[position:])
+
+        return {
+            'initialized': bool(flags & _INITIALIZED),
+            'time': time,
+            'configuration': active,
+            'entry_time': dict(zip(active, entry)),
+            'idle_time': dict(zip(active, idle)),
+            'history': history,
+            'internal_queue': internal_queue,
+            'external_queue': external_queue,
+            'context': context,
+        }
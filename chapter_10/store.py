@@ -0,0 +1,332 @@
+import math
+import mmap
+import os
+import struct
+from collections import OrderedDict
+
+from sismic.clock import SimulatedClock
+
+import snapshot
+from engine import CompiledInterpreter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: deadlines are then scanned one entry at a time
+    np = None
+
+# ---------------------------------------------------------
+# A store of paused interpreters.
+#
+# One file per statechart, mapped in memory:
+#
+#   header    magic, format, chart hash, entry size, capacity, count, data size
+#   index     one fixed-width entry per instance id:
+#               offset and length of its snapshot in the data region,
+#               space allocated for it, its next deadline, its active states (bitmask)
+#   data      the snapshots (see snapshot.encode), one after the other
+#
+# Paused instances only exist in the file. Finding the instances that have
+# reached a deadline, or that are in a given state, only reads the index.
+# An instance becomes a live interpreter when it receives an event or
+# reaches a deadline, and is written back when it is evicted.
+# ---------------------------------------------------------
+
+MAGIC = b'SISMSTOR'
+FORMAT = 1
+_HEADER = struct.Struct('<8sI8sIQQQ')
+HEADER_SIZE = 64
+_ALIGNMENT = 16  # Snapshots are allocated by blocks of 16 bytes, so they can grow a little in place
+
+
+class InterpreterStore:
+    """
+    Keep many paused interpreters of given statechart in a memory-mapped file,
+    and only a few of them alive.
+
+    :param path: file of the store, created if it does not exist
+    :param statechart: statechart of every instance
+    :param clock: clock of the live interpreters (default to a SimulatedClock)
+    :param initial_context: initial context of the interpreters (not stored)
+    :param max_live: number of live interpreters kept in memory
+    :param capacity: initial number of entries of a new file (it grows as needed)
+    :param kwargs: passed to CompiledInterpreter
+    """
+
+    def __init__(self, path, statechart, *, clock=None, initial_context=None, max_live=1000, capacity=1024,
+                 **kwargs):
+        self.statechart = statechart
+        self.clock = SimulatedClock() if clock is None else clock
+        self.max_live = max_live
+        self._kwargs = dict(kwargs, clock=self.clock, initial_context=initial_context)
+        self._exclude = set(initial_context or ())
+        self._layout = snapshot.layout(statechart)
+        self._live = OrderedDict()  # id -> interpreter, least recently used first
+        self._by_state = {}  # state -> set of ids, for the states that have been queried
+
+        mask_bytes = -(-self._layout.mask_size // 8) * 8
+        self._entry = struct.Struct(f'<QIId{mask_bytes}s')
+
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            self._map = mmap.mmap(self._file.fileno(), 0)
+            magic, version, digest, entry_size, self._capacity, self._count, self._data_size = \
+                _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != FORMAT:
+                raise ValueError(f'{path} is not a store, or a store of another format')
+            if digest != self._layout.digest or entry_size != self._entry.size:
+                raise ValueError(f'{path} is a store of another statechart')
+        else:
+            self._capacity, self._count, self._data_size = capacity, 0, 0
+            self._file.truncate(self._data_start + 4096)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+            self._write_header()
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def live(self):
+        """Ids of the live interpreters."""
+        return list(self._live)
+
+    def create(self):
+        """Create and start a new instance, return its id."""
+        if self._count == self._capacity:
+            self._grow_index()
+        index = self._count
+        self._count += 1
+        interpreter = CompiledInterpreter(self.statechart, **self._kwargs)
+        interpreter.execute()
+        self._make_live(index, interpreter)
+        self._write_back(index)
+        self._update_by_state(index, (), interpreter._configuration)
+        return index
+
+    def create_many(self, count):
+        """
+        Create many new instances at once, return their ids. They all start in
+        the same state: one interpreter is started, and its snapshot is copied.
+        """
+        interpreter = CompiledInterpreter(self.statechart, **self._kwargs)
+        interpreter.execute()
+        data = snapshot.encode(interpreter, exclude=self._exclude)
+        deadline = interpreter.next_deadline()
+        deadline = math.inf if deadline is None else deadline
+        mask = self._layout.mask(interpreter._configuration)
+        allocated = -(-len(data) // _ALIGNMENT) * _ALIGNMENT
+
+        while self._count + count > self._capacity:
+            self._grow_index()
+        first = self._count
+        offset = self._allocate(allocated * count)
+        start = self._data_start + offset
+        self._map[start:start + allocated * count] = data.ljust(allocated, b'\0') * count
+        for i in range(count):
+            self._write_entry(first + i, offset + i * allocated, len(data), allocated, deadline, mask)
+        self._count += count
+
+        ids = range(first, first + count)
+        for name, known in self._by_state.items():
+            if name in interpreter._configuration:
+                known.update(ids)
+        return ids
+
+    def get(self, index):
+        """The live interpreter of given instance, loaded from the file if needed."""
+        interpreter = self._live.get(index)
+        if interpreter is not None:
+            self._live.move_to_end(index)
+            return interpreter
+
+        offset, length, _, _, _ = self._read_entry(index)
+        if not length:
+            raise KeyError(index)
+        start = self._data_start + offset
+        interpreter = snapshot.resume(self._map[start:start + length], self.statechart, **self._kwargs)
+        self._make_live(index, interpreter)
+        return interpreter
+
+    def queue(self, index, event_or_name, *event_or_names, **parameters):
+        """Queue events for given instance. It is executed by the next call to execute()."""
+        self.get(index).queue(event_or_name, *event_or_names, **parameters)
+        return self
+
+    def execute(self):
+        """
+        Execute the instances that have something to do: live interpreters with
+        pending events or deadlines, and paused instances whose deadline is reached.
+
+        :return: a dict mapping executed ids to their (non-empty) list of MacroStep.
+        """
+        now = self.clock.time
+        due = [index for index, interpreter in self._live.items() if _is_due(interpreter, now)]
+        due.extend(self._due(now))
+
+        returned = {}
+        for index in due:
+            interpreter = self.get(index)
+            before = interpreter._configuration.copy()
+            steps = interpreter.execute()
+            if steps:
+                returned[index] = steps
+                self._update_by_state(index, before, interpreter._configuration)
+        return returned
+
+    def with_state(self, name):
+        """Ids of the instances in which given state is active."""
+        ids = self._by_state.get(name)
+        if ids is None:
+            ids = set(self._paused_in(self._layout.index[name]))
+            for index, interpreter in self._live.items():
+                ids.discard(index)
+                if name in interpreter._configuration:
+                    ids.add(index)
+            self._by_state[name] = ids
+        return frozenset(ids)
+
+    def remove(self, index):
+        """Delete given instance."""
+        interpreter = self._live.pop(index, None)
+        configuration = interpreter._configuration if interpreter else \
+            self._layout.active(self._read_entry(index)[4])
+        self._update_by_state(index, configuration, ())
+        self._write_entry(index, 0, 0, 0, math.inf, 0)
+
+    def flush(self):
+        """Write every live interpreter back to the file."""
+        for index in self._live:
+            self._write_back(index)
+        self._write_header()
+        self._map.flush()
+
+    def close(self):
+        if self._map is not None:
+            self.flush()
+            self._live.clear()
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+    # ---------------------------------------------------------
+    # Live interpreters
+    # ---------------------------------------------------------
+
+    def _make_live(self, index, interpreter):
+        self._live[index] = interpreter
+        while len(self._live) > self.max_live:
+            evicted, _ = next(iter(self._live.items()))
+            self._write_back(evicted)
+            del self._live[evicted]
+
+    def _write_back(self, index):
+        interpreter = self._live[index]
+        data = snapshot.encode(interpreter, exclude=self._exclude)
+        deadline = interpreter.next_deadline()
+        mask = self._layout.mask(interpreter._configuration)
+
+        offset, _, allocated, _, _ = self._read_entry(index)
+        if len(data) > allocated:
+            allocated = -(-len(data) // _ALIGNMENT) * _ALIGNMENT
+            offset = self._allocate(allocated)
+        start = self._data_start + offset
+        self._map[start:start + len(data)] = data
+        self._write_entry(index, offset, len(data), allocated, math.inf if deadline is None else deadline, mask)
+
+    def _update_by_state(self, index, before, after):
+        for name, ids in self._by_state.items():
+            if name in before and name not in after:
+                ids.discard(index)
+            elif name in after and name not in before:
+                ids.add(index)
+
+    # ---------------------------------------------------------
+    # The file
+    # ---------------------------------------------------------
+
+    @property
+    def _data_start(self):
+        return HEADER_SIZE + self._capacity * self._entry.size
+
+    def _write_header(self):
+        _HEADER.pack_into(
+            self._map, 0, MAGIC, FORMAT, self._layout.digest, self._entry.size,
+            self._capacity, self._count, self._data_size,
+        )
+
+    def _read_entry(self, index):
+        offset, length, allocated, deadline, mask = self._entry.unpack_from(
+            self._map, HEADER_SIZE + index * self._entry.size,
+        )
+        return offset, length, allocated, deadline, int.from_bytes(mask, 'little')
+
+    def _write_entry(self, index, offset, length, allocated, deadline, mask):
+        self._entry.pack_into(
+            self._map, HEADER_SIZE + index * self._entry.size,
+            offset, length, allocated, deadline, mask.to_bytes(self._entry.size - 24, 'little'),
+        )
+
+    def _entries(self):
+        """The index, as a NumPy structured array. Delete it after use, or the file cannot be resized."""
+        mask_bytes = self._entry.size - 24
+        return np.frombuffer(self._map, dtype=np.dtype([
+            ('offset', '<u8'), ('length', '<u4'), ('allocated', '<u4'), ('deadline', '<f8'), ('mask', 'u1', mask_bytes),
+        ]), count=self._count, offset=HEADER_SIZE)
+
+    def _paused_in(self, bit):
+        """Ids of the stored instances whose bitmask has given bit set, read from the index only."""
+        if np is not None:
+            entries = self._entries()
+            selected = (entries['mask'][:, bit // 8] >> (bit % 8)) & 1 & (entries['length'] > 0)
+            ids = np.flatnonzero(selected).tolist()
+            del entries, selected
+            return ids
+        return [
+            index for index in range(self._count)
+            if self._read_entry(index)[1] and self._read_entry(index)[4] >> bit & 1
+        ]
+
+    def _due(self, now):
+        """Ids of the paused instances whose deadline is reached, read from the index only."""
+        if np is not None:
+            entries = self._entries()
+            due = np.flatnonzero(entries['deadline'] <= now).tolist()
+            del entries
+        else:
+            due = [
+                index for index, (_, _, _, deadline, _) in enumerate(
+                    self._entry.iter_unpack(self._map[HEADER_SIZE:HEADER_SIZE + self._count * self._entry.size])
+                ) if deadline <= now
+            ]
+        return [index for index in due if index not in self._live]
+
+    def _allocate(self, size):
+        offset = self._data_size
+        self._data_size += size
+        self._ensure_size(self._data_start + self._data_size)
+        return offset
+
+    def _ensure_size(self, size):
+        if size > len(self._map):
+            self._map.resize(max(size, 2 * len(self._map)))
+
+    def _grow_index(self):
+        """Double the number of entries: move the data region to make room."""
+        old_start = self._data_start
+        added = self._capacity * self._entry.size
+        self._ensure_size(old_start + added + self._data_size)
+        self._map.move(old_start + added, old_start, self._data_size)
+        self._map[old_start:old_start + added] = bytes(added)
+        self._capacity *= 2
+        self._write_header()
+
+
+def _is_due(interpreter, now):
+    deadline = interpreter.next_deadline()
+    return deadline is not None and deadline <= now
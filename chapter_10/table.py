@@ -0,0 +1,215 @@
+import weakref
+
+from sismic.model import (
+    CompoundState,
+    DeepHistoryState,
+    FinalState,
+    MicroStep,
+    OrthogonalState,
+    ShallowHistoryState,
+)
+
+from compiler import compile_statechart
+from engine import CompiledInterpreter
+
+# ---------------------------------------------------------
+# Flat transition tables.
+#
+# CompiledInterpreter still looks at the hierarchy on every step: which
+# candidate sources are active, which descendants of the source to exit,
+# which initial states to enter. For a given configuration, the answers
+# never change.
+#
+# A TransitionTable enumerates every configuration the statechart can reach
+# (assuming that any guard may hold), and stores, per configuration:
+#   candidates      the candidate transitions of the active states, per event
+#   exits           the states each candidate transition exits, in order
+#   stabilization   the states entered/exited to stabilize it, if it is not
+#                   stable
+# A step is then a lookup in the table, and the evaluation of the guards.
+#
+# Charts with history states, or with too many configurations, have no
+# table: TableInterpreter then runs as a CompiledInterpreter.
+# ---------------------------------------------------------
+
+MAX_CONFIGURATIONS = 4096
+
+# Per Statechart, dropped when the statechart is collected: its TransitionTable,
+# None if it cannot have one, or the largest max_configurations it exceeded
+_tables = weakref.WeakKeyDictionary()
+
+
+def transition_table(statechart, *, max_configurations=MAX_CONFIGURATIONS):
+    """
+    Return the (shared) TransitionTable of given statechart, or None if it
+    cannot have one, or has more than max_configurations rows.
+    """
+    entry = _tables.get(statechart, 0)
+    if isinstance(entry, TransitionTable):
+        return entry if len(entry) <= max_configurations else None
+    if entry is None or max_configurations <= entry:
+        return None
+    try:
+        table = _tables[statechart] = TransitionTable(statechart, max_configurations=max_configurations)
+    except _TooLarge:
+        _tables[statechart] = max_configurations
+        return None
+    except TableError:
+        _tables[statechart] = None
+        return None
+    return table
+
+
+class TableError(Exception):
+    """The statechart cannot be turned into a transition table."""
+
+
+class _TooLarge(TableError):
+    """The statechart can reach more configurations than allowed."""
+
+
+class TransitionTable:
+    """
+    Per-configuration lookup tables of a statechart.
+
+    :param statechart: the statechart, which must not be modified afterwards
+    :param max_configurations: raise TableError if the statechart can reach
+        more configurations than that
+    """
+
+    def __init__(self, statechart, *, max_configurations=MAX_CONFIGURATIONS):
+        self.compiled = compiled = compile_statechart(statechart)
+        if any(isinstance(s, (ShallowHistoryState, DeepHistoryState)) for s in compiled.states.values()):
+            raise TableError('History states depend on the past, not only on the configuration')
+
+        # configuration -> (eventless candidates, {event: candidates}, {id(transition): exits}, stabilization)
+        self.rows = {}
+        transitions = [t for _, groups in compiled.eventless for group in groups for t in group]
+        transitions += [
+            t for candidates in compiled.by_event.values() for _, groups in candidates for group in groups for t in group
+        ]
+
+        pending = [frozenset([statechart.root])]
+        while pending:
+            configuration = pending.pop()
+            if configuration in self.rows:
+                continue
+            if len(self.rows) >= max_configurations:
+                raise _TooLarge(f'More than {max_configurations} configurations')
+
+            stabilization = self._stabilization(configuration)
+            exits = {}
+            if stabilization is not None:
+                entered, exited = stabilization
+                pending.append(configuration.difference(exited).union(entered))
+            else:
+                for transition in transitions:
+                    if transition.source not in configuration or transition.target is None:
+                        continue
+                    exit_candidates, entered = compiled.scope[id(transition)]
+                    exited = tuple(s for s in exit_candidates if s in configuration)
+                    exits[id(transition)] = exited
+                    pending.append(configuration.difference(exited).union(entered))
+
+            self.rows[configuration] = (
+                _active(compiled.eventless, configuration),
+                {
+                    event: active
+                    for event, candidates in compiled.by_event.items()
+                    if (active := _active(candidates, configuration))
+                },
+                exits,
+                stabilization,
+            )
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _stabilization(self, configuration):
+        """(entered states, exited states) to stabilize given configuration, as in CompiledInterpreter, or None."""
+        compiled = self.compiled
+        root = compiled.statechart.root
+        for name in sorted(configuration, key=compiled.inner_first.__getitem__):
+            if any(descendant in configuration for descendant in compiled.descendants[name]):
+                continue  # Not a leaf
+
+            leaf = compiled.states[name]
+            if isinstance(leaf, FinalState) and compiled.parent[name] == root:
+                return (), (name, root)
+            elif isinstance(leaf, OrthogonalState) and compiled.children[name]:
+                return tuple(sorted(compiled.children[name])), ()
+            elif isinstance(leaf, CompoundState) and leaf.initial:
+                return (leaf.initial,), ()
+        return None
+
+
+class TableInterpreter(CompiledInterpreter):
+    """
+    A CompiledInterpreter that looks steps up in the TransitionTable of its
+    statechart. Same parameters and same semantics as Interpreter.
+
+    :param max_configurations: run as a CompiledInterpreter if the statechart
+        can reach more configurations than that
+    """
+
+    def __init__(self, statechart, *, max_configurations=MAX_CONFIGURATIONS, **kwargs):
+        super().__init__(statechart, **kwargs)
+        self._max_configurations = max_configurations
+        self._table = transition_table(statechart, max_configurations=max_configurations)
+
+    @property
+    def table(self):
+        """The TransitionTable of the statechart, or None if it has none."""
+        return self._table
+
+    def _row(self):
+        return None if self._table is None else self._table.rows.get(frozenset(self._configuration))
+
+    def _candidates(self, states):
+        row = self._row() if states is self._configuration else None
+        if row is None:
+            return super()._candidates(states)
+        return row[0], row[1]
+
+    def _create_steps(self, event, transitions):
+        row = self._row()
+        if row is None:
+            return super()._create_steps(event, transitions)
+
+        exits = row[2]
+        scope = self._compiled.scope
+        steps = []
+        for transition in transitions:
+            if transition.target is None:
+                steps.append(MicroStep(event=event, transition=transition))
+            else:
+                steps.append(MicroStep(
+                    event=event,
+                    transition=transition,
+                    entered_states=list(scope[id(transition)][1]),
+                    exited_states=list(exits[id(transition)]),
+                ))
+        return steps
+
+    def _create_stabilization_step(self, names):
+        row = self._row() if names is self._configuration else None
+        if row is None:
+            return super()._create_stabilization_step(names)
+        if row[3] is None:
+            return None
+        entered, exited = row[3]
+        return MicroStep(entered_states=list(entered), exited_states=list(exited))
+
+    def __getstate__(self):
+        attributes = super().__getstate__()
+        del attributes['_table']  # Shared, and rebuilt from the statechart
+        return attributes
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._table = transition_table(self._statechart, max_configurations=self._max_configurations)
+
+
+def _active(candidates, configuration):
+    """Given candidates (see CompiledStatechart._candidates), restricted to active sources."""
+    return tuple(candidate for candidate in candidates if candidate[0] in configuration)
@@ -0,0 +1,113 @@
+import asyncio
+import contextlib
+import io
+import os
+import unittest
+
+from sismic.exceptions import InvariantError
+from sismic.io import import_from_yaml
+
+from async_runtime import AsyncSystem
+from engine import CompiledInterpreter
+from test_engine import ROOT, load
+
+RELAY = """
+statechart:
+  name: relay
+  preamble: received = 0
+  root state:
+    name: Relay
+    initial: Waiting
+    states:
+      - name: Waiting
+        transitions:
+          - event: PING
+            target: Done
+            action: |
+              received += 1
+              send('PING')  # Also received by this relay, once in Done
+      - name: Done
+"""
+
+class TestAsyncSystem(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    async def asyncTearDown(self):
+        self.stdout.__exit__(None, None, None)
+
+    async def test_long_chain_settles(self):
+        """A message crosses 50 interpreters before the system is quiescent."""
+        statechart = import_from_yaml(RELAY)
+        system = AsyncSystem()
+        relays = [system.add(CompiledInterpreter(statechart, clock=system.clock)) for _ in range(50)]
+        for source, target in zip(relays, relays[1:]):
+            system.bind(source, target)
+
+        async with system:
+            await system.run_until_quiescent()
+            system.queue(relays[0], 'PING')
+            await system.run_until_quiescent()
+            self.assertEqual([relay.context['received'] for relay in relays], [1] * 50)
+
+    async def test_vault_and_charger(self):
+        """Chapter 8's scenario 1, without spinning execute()."""
+        system = AsyncSystem()
+        vault = system.add(CompiledInterpreter(load(os.path.join(ROOT, 'chapter_08', 'vault_ch8.yaml')), clock=system.clock))
+        charger = system.add(CompiledInterpreter(load(os.path.join(ROOT, 'chapter_08', 'charger_ch8.yaml')), clock=system.clock))
+        system.bind(vault, charger)
+        system.bind(charger, vault)
+
+        async with system:
+            await system.advance(2)  # Full -> Low, BATTERY_LOW, CHARGE_STARTED
+            self.assertIn('Charging', vault.configuration)
+            self.assertIn('Charging', charger.configuration)
+
+            await system.advance(5)  # after(5): CHARGE_COMPLETE
+            self.assertIn('Full', vault.configuration)
+            self.assertIn('Idle', charger.configuration)
+            self.assertEqual(system.clock.time, 7)
+
+    async def test_errors_are_raised(self):
+        statechart = load(os.path.join(ROOT, 'chapter_06', 'vault_contract.yaml'))
+        system = AsyncSystem()
+        vault = system.add(CompiledInterpreter(statechart, clock=system.clock))
+        async with system:
+            await system.run_until_quiescent()
+            for _ in range(3):
+                system.queue(vault, 'DEV_TEST_FAIL')
+            with self.assertRaises(InvariantError):
+                await asyncio.wait_for(system.run_until_quiescent(), 1)
+
+    async def test_restart_with_pending_events(self):
+        system = AsyncSystem()
+        relays = [system.add(CompiledInterpreter(import_from_yaml(RELAY), clock=system.clock)) for _ in range(2)]
+        system.bind(relays[0], relays[1])
+        await system.start()
+        for _ in range(10):
+            system.queue(relays[0], 'PING')
+        await system.stop()  # Before they are processed
+
+        async with system:
+            await asyncio.wait_for(system.run_until_quiescent(), 1)
+            system.queue(relays[1], 'PING')
+            await asyncio.wait_for(system.run_until_quiescent(), 1)
+            self.assertEqual(relays[1].context['received'], 1)
+
+    async def test_must_be_started(self):
+        system = AsyncSystem()
+        vault = system.add(CompiledInterpreter(load(os.path.join(ROOT, 'chapter_01', 'vault.yaml')), clock=system.clock))
+        with self.assertRaisesRegex(RuntimeError, 'not started'):
+            system.queue(vault, 'PIN_ENTERED')
+        with self.assertRaisesRegex(RuntimeError, 'not started'):
+            await system.run_until_quiescent()
+        async with system:
+            system.queue(vault, 'UNKNOWN_EVENT')
+            await system.run_until_quiescent()
+        with self.assertRaisesRegex(RuntimeError, 'not started'):
+            await system.advance(1)
+
+if __name__ == '__main__':
+    unittest.main()
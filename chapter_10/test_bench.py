@@ -0,0 +1,45 @@
+import copy
+import json
+import os
+import tempfile
+import unittest
+
+import bench
+from test_engine import ROOT
+
+class TestBench(unittest.TestCase):
+
+    def test_report(self):
+        paths = [os.path.join(ROOT, 'chapter_04', 'vault_timer.yaml'), os.path.join(ROOT, 'chapter_06', 'vault_contract.yaml')]
+        report = bench.run(paths, events=50, instances=5, repeat=1)
+        self.assertEqual(set(report['charts']), {'chapter_04/vault_timer.yaml', 'chapter_06/vault_contract.yaml'})
+        for engines in report['charts'].values():
+            self.assertEqual(set(engines), set(bench.ENGINES))
+            for metrics in engines.values():
+                self.assertEqual(set(metrics), set(bench.METRICS))
+                self.assertTrue(all(value > 0 for value in metrics.values()))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.json')
+            bench.save(report, path)
+            self.assertEqual(bench.load(path), json.loads(json.dumps(report)))
+
+    def test_compare(self):
+        report = {'charts': {'vault.yaml': {'Interpreter': {'p50_us': 10.0, 'events_per_s': 1000.0}}}}
+        self.assertEqual(bench.compare(report, report), [])
+
+        slower = copy.deepcopy(report)
+        slower['charts']['vault.yaml']['Interpreter'].update(p50_us=20.0, events_per_s=500.0)
+        self.assertEqual(bench.compare(report, slower), [
+            ('vault.yaml', 'Interpreter', 'events_per_s', 1000.0, 500.0),
+            ('vault.yaml', 'Interpreter', 'p50_us', 10.0, 20.0),
+        ])
+        self.assertEqual(bench.compare(slower, report), [])  # Faster is fine
+        self.assertEqual(bench.compare(report, slower, tolerance=2), [])
+
+        # New charts and metrics have nothing to compare with
+        slower['charts']['new.yaml'] = slower['charts'].pop('vault.yaml')
+        self.assertEqual(bench.compare(report, slower), [])
+
+if __name__ == '__main__':
+    unittest.main()
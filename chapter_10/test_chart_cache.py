@@ -0,0 +1,108 @@
+import glob
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import chart_cache
+from chart_cache import SUFFIX, cache_key, clear_memo, load_statechart
+
+CHART = """
+statechart:
+  name: {name}
+  root state:
+    name: Root
+"""
+
+def chart(name):
+    return CHART.format(name=name)
+
+class TestChartCache(unittest.TestCase):
+
+    def setUp(self):
+        clear_memo()
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.directory, 'cache')
+
+    def tearDown(self):
+        clear_memo()
+        shutil.rmtree(self.directory)
+
+    def entries(self):
+        return sorted(os.path.basename(path) for path in glob.glob(os.path.join(self.cache_dir, '*' + SUFFIX)))
+
+    def test_key(self):
+        self.assertEqual(cache_key(b'a'), cache_key(b'a'))
+        self.assertNotEqual(cache_key(b'a'), cache_key(b'b'))
+        key = cache_key(b'a')
+        with mock.patch.object(chart_cache, 'library_version', return_value='0.0.0'):
+            self.assertNotEqual(cache_key(b'a'), key)
+
+    def test_memo_and_disk_cache(self):
+        first = load_statechart(chart('one'), cache_dir=self.cache_dir)
+        self.assertIs(load_statechart(chart('one'), cache_dir=self.cache_dir), first)
+        self.assertEqual(self.entries(), [cache_key(chart('one').encode()) + SUFFIX])
+
+        # After clear_memo, the chart comes from the disk: the YAML is not parsed again
+        clear_memo()
+        with mock.patch.object(chart_cache, 'import_from_yaml', side_effect=AssertionError('parsed')):
+            loaded = load_statechart(chart('one'), cache_dir=self.cache_dir)
+        self.assertIsNot(loaded, first)
+        self.assertEqual(loaded.name, 'one')
+
+    def test_files_are_reloaded_when_edited(self):
+        path = os.path.join(self.directory, 'chart.yaml')
+        for version, name in enumerate(['one', 'two', 'three']):
+            with open(path, 'w') as f:
+                f.write(chart(name))
+            os.utime(path, ns=(version, version))  # Edited within the mtime resolution: still seen
+            self.assertEqual(load_statechart(filepath=path, cache_dir=None).name, name)
+        self.assertEqual(len(chart_cache._path_keys), 1)
+
+    def test_memo_is_bounded(self):
+        with mock.patch.object(chart_cache, 'MEMO_ENTRIES', 3):
+            for index in range(10):
+                path = os.path.join(self.directory, f'{index}.yaml')
+                with open(path, 'w') as f:
+                    f.write(chart(f'chart{index}'))
+                load_statechart(filepath=path, cache_dir=None)
+                self.assertLessEqual(len(chart_cache._memo), 3)
+                self.assertLessEqual(len(chart_cache._path_keys), 4)
+            self.assertEqual(load_statechart(filepath=path, cache_dir=None).name, 'chart9')
+
+    def test_least_recently_used_entries_are_evicted(self):
+        paths = {}
+        for name in ('a', 'b'):
+            load_statechart(chart(name), cache_dir=self.cache_dir, max_entries=2)
+            paths[name] = os.path.join(self.cache_dir, cache_key(chart(name).encode()) + SUFFIX)
+        os.utime(paths['a'], (1, 1))
+        os.utime(paths['b'], (2, 2))
+
+        clear_memo()
+        load_statechart(chart('a'), cache_dir=self.cache_dir, max_entries=2)  # Read: now the most recent
+        load_statechart(chart('c'), cache_dir=self.cache_dir, max_entries=2)
+        self.assertTrue(os.path.exists(paths['a']))
+        self.assertFalse(os.path.exists(paths['b']))
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_corrupted_entry_is_replaced(self):
+        load_statechart(chart('one'), cache_dir=self.cache_dir)
+        path = os.path.join(self.cache_dir, self.entries()[0])
+        with open(path, 'wb') as f:
+            f.write(b'not a pickle')
+
+        clear_memo()
+        self.assertEqual(load_statechart(chart('one'), cache_dir=self.cache_dir).name, 'one')
+        clear_memo()
+        with mock.patch.object(chart_cache, 'import_from_yaml', side_effect=AssertionError('parsed')):
+            self.assertEqual(load_statechart(chart('one'), cache_dir=self.cache_dir).name, 'one')
+
+    def test_arguments(self):
+        with self.assertRaises(TypeError):
+            load_statechart(cache_dir=None)
+        with self.assertRaises(TypeError):
+            load_statechart(chart('one'), filepath=os.path.join(self.directory, 'chart.yaml'), cache_dir=None)
+
+if __name__ == '__main__':
+    unittest.main()
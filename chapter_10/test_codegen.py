@@ -0,0 +1,103 @@
+import contextlib
+import importlib.util
+import io
+import os
+import tempfile
+import unittest
+
+from sismic.clock import SimulatedClock
+from sismic.exceptions import NonDeterminismError
+from sismic.interpreter import Interpreter
+from sismic.io import import_from_yaml
+
+from codegen import CodegenError, machine_class, write_module
+from test_engine import CHARTS, ROOT, SilentHardware, load, random_trace
+from test_guards import CHART
+from test_table import HISTORY
+
+CONTRACT = os.path.join(ROOT, 'chapter_06', 'vault_contract.yaml')
+
+# chapter 7's tests, run against the generated machine below
+_spec = importlib.util.spec_from_file_location('test_vault', os.path.join(ROOT, 'chapter_07', 'test_vault.py'))
+test_vault = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(test_vault)
+
+def run_steps(factory, statechart, trace):
+    """Like test_engine.run_trace, for anything with the interface of Interpreter."""
+    clock = SimulatedClock()
+    machine = factory(clock=clock, initial_context={'hw': SilentHardware()})
+    observed = []
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        try:
+            for item in [('wait', 0)] + trace:
+                if item[0] == 'wait':
+                    clock.time += item[1]
+                    steps = machine.execute()
+                else:
+                    steps = machine.queue(item[1], **item[2]).execute()
+                observed.append([(s.event, [str(t) for t in s.transitions]) for s in steps])
+                observed.append(machine.configuration)
+        except Exception as e:
+            observed.append(f'{type(e).__name__}')
+    context = {k: v for k, v in machine.context.items() if isinstance(v, (int, float, str))}
+    return observed, context, output.getvalue()
+
+class TestCodegen(unittest.TestCase):
+
+    def test_same_behaviour_as_reference_interpreter(self):
+        """Random traces give the same steps, configurations, context and output."""
+        for path in CHARTS:
+            if path == CONTRACT:
+                continue
+            statechart = load(path)
+            machine = machine_class(statechart)
+            for seed in range(5):
+                trace = random_trace(statechart, seed)
+                with self.subTest(chart=os.path.basename(path), seed=seed):
+                    self.assertEqual(
+                        run_steps(lambda **kwargs: Interpreter(statechart, **kwargs), statechart, trace),
+                        run_steps(machine, statechart, trace),
+                    )
+
+    def test_unsupported_charts(self):
+        for statechart in (load(CONTRACT), import_from_yaml(HISTORY)):
+            with self.subTest(chart=statechart.name), self.assertRaises(CodegenError):
+                machine_class(statechart)
+
+    def test_non_determinism_is_detected(self):
+        machine = machine_class(import_from_yaml(CHART))()
+        machine.execute()
+        with self.assertRaises(NonDeterminismError):
+            machine.queue('OVERLAP', x=3).execute()
+
+    def test_written_module(self):
+        statechart = load(os.path.join(ROOT, 'chapter_04', 'vault_timer.yaml'))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'vault_timer.py')
+            write_module(statechart, path, class_name='VaultTimer')
+            spec = importlib.util.spec_from_file_location('vault_timer', path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+
+        clock = SimulatedClock()
+        vault = module.VaultTimer(clock=clock)
+        with contextlib.redirect_stdout(io.StringIO()):
+            vault.execute()
+            for _ in range(3):
+                vault.queue('PIN_ENTERED', code=0).execute()
+            self.assertEqual(vault.configuration, ['Active', 'Lockdown'])
+            clock.time += 3
+            vault.execute()
+        self.assertEqual(vault.configuration, ['Active', 'Locked'])
+        self.assertEqual(vault.context['attempts'], 0)
+
+class TestGeneratedSmartVault(test_vault.TestSmartVault):
+    """chapter_07/test_vault.py, unchanged, against the generated machine."""
+
+    def setUp(self):
+        self.clock = SimulatedClock()
+        self.interpreter = machine_class(self.statechart)(clock=self.clock)
+        self.interpreter.execute()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import contextlib
+import io
+import os
+import pickle
+import unittest
+
+from sismic.exceptions import InvariantError
+from sismic.interpreter import Interpreter
+from sismic.io import import_from_yaml
+
+from contracts import IncrementalContractInterpreter
+from test_engine import CHARTS, ROOT, load, random_trace, run_trace
+
+VAULT_CONTRACT = os.path.join(ROOT, 'chapter_06', 'vault_contract.yaml')
+
+QUEUE = """
+statechart:
+  name: queue
+  preamble: |
+    codes = []
+    limit = 2
+  root state:
+    name: Active
+    initial: Open
+    states:
+      - name: Open
+        contract:
+          - always: len(codes) <= limit
+        transitions:
+          - event: PUSH
+            action: codes.append(event.code)
+          - event: RAISE
+            action: limit += 1
+          - event: NOP
+          - event: CLOSE
+            target: Closed
+      - name: Closed
+        contract:
+          - always: time < 10
+        transitions:
+          - event: OPEN
+            target: Open
+"""
+
+def failure(klass, statechart, events):
+    """The message of the InvariantError raised by given events, or None."""
+    interpreter = klass(statechart)
+    interpreter.execute()
+    try:
+        for name, data in events:
+            interpreter.queue(name, **data).execute()
+    except InvariantError as e:
+        return str(e)
+
+class TestIncrementalContracts(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+
+    def test_same_behaviour_as_reference_interpreter(self):
+        """Random traces on every tutorial chart give the same steps, configurations and context."""
+        for path in CHARTS:
+            statechart = load(path)
+            for seed in range(3):
+                trace = random_trace(statechart, seed)
+                with self.subTest(chart=os.path.basename(path), seed=seed):
+                    self.assertEqual(
+                        run_trace(Interpreter, statechart, trace),
+                        run_trace(IncrementalContractInterpreter, statechart, trace),
+                    )
+
+    def test_unrelated_steps_are_skipped_and_violations_caught(self):
+        statechart = load(VAULT_CONTRACT)
+        events = [('PIN_ENTERED', {'code': 1})] + [('DEV_TEST_FAIL', {})] * 2
+        self.assertEqual(failure(Interpreter, statechart, events), failure(IncrementalContractInterpreter, statechart, events))
+
+        interpreter = IncrementalContractInterpreter(statechart)
+        interpreter.execute()
+        for _ in range(5):
+            interpreter.queue('NOBODY_LISTENS').execute()
+        self.assertEqual(interpreter.invariants_checked, 1)
+        self.assertEqual(interpreter.invariants_skipped, 11)  # Plus the empty step that ends each execute()
+
+        # Written from the outside
+        interpreter.context['attempts'] = 3
+        with self.assertRaises(InvariantError):
+            interpreter.queue('NOBODY_LISTENS').execute()
+
+    def test_mutable_and_volatile_values_are_always_checked(self):
+        statechart = import_from_yaml(QUEUE)
+        events = [('PUSH', {'code': 1}), ('NOP', {}), ('PUSH', {'code': 2}), ('NOP', {}), ('PUSH', {'code': 3})]
+        self.assertIsNotNone(failure(IncrementalContractInterpreter, statechart, events))
+        self.assertEqual(failure(Interpreter, statechart, events), failure(IncrementalContractInterpreter, statechart, events))
+
+        interpreter = IncrementalContractInterpreter(statechart)
+        interpreter.execute()
+        interpreter.queue('CLOSE').execute()
+        checked = interpreter.invariants_checked
+        interpreter.queue('NOP', 'NOP').execute()
+        self.assertEqual(interpreter.invariants_checked, checked + 3)  # time: every step, the empty one included
+        interpreter.clock.time = 10
+        with self.assertRaises(InvariantError):
+            interpreter.queue('NOP').execute()
+
+    def test_pickle_round_trip(self):
+        statechart = load(VAULT_CONTRACT)
+        interpreter = IncrementalContractInterpreter(statechart)
+        interpreter.execute()
+        interpreter.queue('DEV_TEST_FAIL', 'DEV_TEST_FAIL').execute()
+        resumed = pickle.loads(pickle.dumps(interpreter))
+        with self.assertRaises(InvariantError):
+            resumed.queue('DEV_TEST_FAIL').execute()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from sismic.io import import_from_yaml
+from sismic.model import Event
+
+from distributed import Cluster, RemoteError, run_node
+from test_async_runtime import RELAY
+from test_engine import ROOT, load
+
+VAULT = load(os.path.join(ROOT, 'chapter_08', 'vault_ch8.yaml'))
+CHARGER = load(os.path.join(ROOT, 'chapter_08', 'charger_ch8.yaml'))
+MONITOR = load(os.path.join(ROOT, 'chapter_08', 'monitor_ch8.yaml'))
+
+def to_monitor(meta_event, interpreter):
+    """Chapter 8's bridge from the vault to the monitor."""
+    if meta_event.name == 'state entered':
+        return Event('step', entered_states=[meta_event.state], configuration=interpreter.configuration)
+
+def chapter_8(cluster, placement):
+    """Chapter 8's scenarios, and the configurations observed along the way."""
+    cluster.add('vault', VAULT, node=placement[0])
+    cluster.add('charger', CHARGER, node=placement[1])
+    cluster.add('monitor', MONITOR, node=placement[2])
+    cluster.bind('vault', 'charger')
+    cluster.bind('charger', 'vault')
+    cluster.bridge('vault', 'monitor', to_monitor)
+
+    observed = []
+    for seconds, events in [(0, []), (2, []), (5, []), (1.6, [Event('PIN_ENTERED', code=1234)]), (0.5, [])]:
+        cluster.advance(seconds)
+        for event in events:
+            cluster.queue('vault', event)
+        cluster.run_until_quiescent()
+        observed.append([cluster.configuration(name) for name in ('vault', 'charger', 'monitor')])
+    return observed
+
+class TestCluster(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+
+    def test_chapter_8_on_several_processes(self):
+        with Cluster(0) as cluster:
+            local = chapter_8(cluster, [0, 0, 0])
+        with Cluster(2) as cluster:
+            distributed = chapter_8(cluster, [0, 1, 1])
+        self.assertEqual(local, distributed)
+        self.assertEqual(local[1][:2], [['Vault', 'Active', 'Battery', 'Security', 'Charging', 'Locked'], ['ChargerBase', 'Charging']])
+        self.assertEqual(local[2][:2], [['Vault', 'Active', 'Battery', 'Security', 'Full', 'Locked'], ['ChargerBase', 'Idle']])
+        self.assertEqual(local[4][2], [])  # The monitor caught the hazard
+
+    def test_placement_does_not_matter(self):
+        """A message crosses 12 relays, placed on one node or spread over three."""
+        statechart = import_from_yaml(RELAY)
+        results = []
+        for processes, placement in [(0, lambda k: 0), (3, lambda k: k % 3), (3, lambda k: (k * 7) % 3)]:
+            with Cluster(processes) as cluster:
+                names = [f'relay-{k}' for k in range(12)]
+                for k, name in enumerate(names):
+                    cluster.add(name, statechart, node=placement(k))
+                for source, target in zip(names, names[1:]):
+                    cluster.bind(source, target)
+                cluster.queue(names[0], 'PING')
+                cluster.run_until_quiescent()
+                results.append([cluster.context(name)['received'] for name in names])
+        self.assertEqual(results, [[1] * 12] * 3)
+
+    def test_errors_are_raised(self):
+        with Cluster(2) as cluster:
+            cluster.add('vault', load(os.path.join(ROOT, 'chapter_06', 'vault_contract.yaml')), node=0)
+            cluster.add('good', load(os.path.join(ROOT, 'chapter_01', 'vault.yaml')), node=1)
+            cluster.queue('vault', 'DEV_TEST_FAIL', 'DEV_TEST_FAIL', 'DEV_TEST_FAIL')
+            with self.assertRaisesRegex(RemoteError, 'InvariantError'):
+                cluster.run_until_quiescent()
+            # The other node's reply to the failed round was read: the next ones line up
+            self.assertEqual(cluster.configuration('good'), ['Active', 'Idle'])
+
+    def test_nodes_join_through_a_socket(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'cluster.sock')
+        try:
+            cluster = Cluster(0)
+            accepting = threading.Thread(target=cluster.accept, args=(path, 1), kwargs={'authkey': b'secret'})
+            accepting.start()
+            while not os.path.exists(path):
+                time.sleep(0.01)
+            with self.assertRaises(multiprocessing.AuthenticationError):
+                run_node(path, authkey=b'guess')  # Closed, and not counted
+            node = threading.Thread(target=run_node, args=(path,), kwargs={'authkey': b'secret'})
+            node.start()
+            accepting.join()
+
+            self.assertEqual(cluster.nodes, 2)
+            self.assertEqual(chapter_8(cluster, [1, 0, 1])[4][2], [])
+            cluster.close()
+            node.join()
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
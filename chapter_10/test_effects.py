@@ -0,0 +1,164 @@
+import asyncio
+import os
+import threading
+import time
+import unittest
+
+from sismic.interpreter import Interpreter
+from sismic.io import import_from_yaml
+
+from async_runtime import AsyncSystem
+from effects import AsyncioEffects, ThreadedEffects
+from engine import CompiledInterpreter
+from test_engine import ROOT, load
+
+BINDING = os.path.join(ROOT, 'chapter_03', 'vault_binding.yaml')
+
+# Waits for the solenoid to confirm, through the completion events
+CONFIRMED = """
+statechart:
+  name: confirmed
+  root state:
+    name: Root
+    initial: Unlocked
+    states:
+      - name: Unlocked
+        transitions:
+          - event: LOCK_CMD
+            target: Locking
+      - name: Locking
+        on entry: hw.lock_mechanism()
+        transitions:
+          - event: EFFECT_DONE
+            guard: event.method == 'lock_mechanism'
+            target: Locked
+          - event: EFFECT_FAILED
+            target: Jammed
+      - name: Locked
+      - name: Jammed
+"""
+
+class Hardware:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+        self.threads = set()
+        self.color = 'OFF'
+
+    def _called(self, name):
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        self.calls.append(name)
+
+    def set_led(self, color):
+        self._called(f'led {color}')
+        self.color = color
+
+    def lock_mechanism(self):
+        self._called('locked')
+        if self.fail:
+            raise OSError('jammed')
+        return 'bolt out'
+
+    def unlock_mechanism(self):
+        self._called('unlocked')
+
+    def beep(self, times):
+        self._called(f'beep x{times}')
+
+    def flash_led(self, color):
+        self._called(f'flash {color}')
+
+class AsyncHardware(Hardware):
+    async def lock_mechanism(self):
+        await asyncio.sleep(self.delay)
+        self.calls.append('locked')
+
+class TestEffects(unittest.TestCase):
+
+    def setUp(self):
+        self.effects = ThreadedEffects(max_workers=4)
+
+    def tearDown(self):
+        self.effects.shutdown()
+
+    def test_calls_run_after_the_step_in_order(self):
+        statechart = load(BINDING)
+        for klass in (Interpreter, CompiledInterpreter):
+            hw = Hardware()
+            target = self.effects.target(hw, 'hw')
+            interpreter = klass(statechart, initial_context={'hw': target})
+            self.effects.attach(interpreter)
+            interpreter.execute()
+            interpreter.queue('PIN_ENTERED', code=1).execute()
+            interpreter.queue('PIN_ENTERED', code=9999).execute()
+            self.assertEqual(self.effects.wait(timeout=5), 9)
+
+            with self.subTest(interpreter=klass.__name__):
+                self.assertEqual(hw.calls, [
+                    'led RED', 'locked', 'beep x3', 'flash RED', 'led RED', 'locked',
+                    'beep x1', 'led GREEN', 'unlocked',
+                ])
+                self.assertNotIn(threading.get_ident(), hw.threads)
+                self.assertEqual(target.color, 'GREEN')  # Attributes are read from the object
+                done = [event for _, event in interpreter._external_queue]
+                self.assertEqual([(e.target, e.method) for e in done][:2], [('hw', 'set_led'), ('hw', 'lock_mechanism')])
+                self.assertEqual(done[1].result, 'bolt out')
+
+    def test_a_slow_target_does_not_delay_the_others(self):
+        statechart = load(BINDING)
+        slow, fast = Hardware(delay=0.2), Hardware()
+        for hw in (slow, fast):
+            interpreter = CompiledInterpreter(statechart, initial_context={'hw': self.effects.target(hw)})
+            self.effects.attach(interpreter)
+            start = time.perf_counter()
+            interpreter.execute()
+            self.assertLess(time.perf_counter() - start, 0.1)  # The step does not wait for the solenoid
+
+        deadline = time.perf_counter() + 5
+        while len(fast.calls) < 2 and time.perf_counter() < deadline:
+            time.sleep(0.001)
+        self.assertEqual(fast.calls, ['led RED', 'locked'])
+        self.assertLess(len(slow.calls), 2)
+        self.effects.wait(timeout=5)
+        self.assertEqual(slow.calls, ['led RED', 'locked'])
+
+    def test_completion_events_drive_the_statechart(self):
+        for fail, expected in ((False, 'Locked'), (True, 'Jammed')):
+            interpreter = CompiledInterpreter(
+                import_from_yaml(CONFIRMED), initial_context={'hw': self.effects.target(Hardware(fail=fail), 'hw')},
+            )
+            self.effects.attach(interpreter)
+            interpreter.execute()
+            interpreter.queue('LOCK_CMD').execute()
+            self.assertEqual(interpreter.configuration, ['Root', 'Locking'])
+            self.effects.wait(timeout=5)
+            interpreter.execute()
+            with self.subTest(fail=fail):
+                self.assertEqual(interpreter.configuration, ['Root', expected])
+
+    def test_asyncio(self):
+        async def scenario():
+            system = AsyncSystem()
+            effects = AsyncioEffects(post=system.queue)
+            hw = AsyncHardware(delay=0.01)
+            interpreter = system.add(
+                CompiledInterpreter(import_from_yaml(CONFIRMED), initial_context={'hw': effects.target(hw, 'hw')})
+            )
+            effects.attach(interpreter)
+            async with system:
+                await system.run_until_quiescent()
+                system.queue(interpreter, 'LOCK_CMD')
+                await system.run_until_quiescent()
+                self.assertEqual(interpreter.configuration, ['Root', 'Locking'])
+                await effects.wait()
+                await system.run_until_quiescent()
+            return hw, interpreter
+
+        hw, interpreter = asyncio.run(scenario())
+        self.assertEqual(hw.calls, ['locked'])
+        self.assertEqual(interpreter.configuration, ['Root', 'Locked'])
+
+if __name__ == '__main__':
+    unittest.main()
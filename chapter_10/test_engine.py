@@ -0,0 +1,115 @@
+import contextlib
+import glob
+import io
+import os
+import pickle
+import random
+import unittest
+
+from sismic.clock import SimulatedClock
+from sismic.interpreter import Interpreter
+from sismic.model import Event
+
+from chart_cache import load_statechart
+from engine import CompiledInterpreter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+CHARTS = sorted(glob.glob(os.path.join(ROOT, 'chapter_*', '*.yaml')))
+
+def load(path):
+    # Keep the tests away from the user's on-disk cache
+    return load_statechart(filepath=path, cache_dir=None)
+
+class SilentHardware:
+    """Stands in for chapter 3's VaultHardware: accepts any call."""
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+def random_trace(statechart, seed, length=60):
+    """A reproducible list of ('event', name, data) and ('wait', seconds) items."""
+    rng = random.Random(seed)
+    names = statechart.events_for() + ['UNKNOWN_EVENT']
+    trace = []
+    for _ in range(length):
+        if rng.random() < 0.3:
+            trace.append(('wait', rng.choice([0.5, 1.0, 1.9, 2.0, 2.5, 4.0])))
+        else:
+            data = {
+                'code': rng.choice([0, 1234, 9999]),
+                'entered_states': [rng.choice(statechart.states)],
+                'configuration': rng.sample(statechart.states, 2),
+            }
+            trace.append(('event', rng.choice(names), data))
+    return trace
+
+def run_trace(interpreter_klass, statechart, trace):
+    """Run a trace, and return everything observable about the execution."""
+    clock = SimulatedClock()
+    interpreter = interpreter_klass(statechart, clock=clock, initial_context={'hw': SilentHardware()})
+    observed = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            observed.append(str(interpreter.execute()))
+            for item in trace:
+                if item[0] == 'wait':
+                    clock.time += item[1]
+                    observed.append(str(interpreter.execute()))
+                else:
+                    observed.append(str(interpreter.queue(item[1], **item[2]).execute()))
+                observed.append(interpreter.configuration)
+        except Exception as e:
+            observed.append(f'{type(e).__name__}')
+    context = {k: v for k, v in interpreter.context.items() if isinstance(v, (int, float, str))}
+    return observed, context
+
+class TestCompiledInterpreter(unittest.TestCase):
+
+    def test_same_behaviour_as_reference_interpreter(self):
+        """Random traces on every tutorial chart give the same steps, configurations and context."""
+        for path in CHARTS:
+            statechart = load(path)
+            for seed in range(5):
+                trace = random_trace(statechart, seed)
+                with self.subTest(chart=os.path.basename(path), seed=seed):
+                    self.assertEqual(
+                        run_trace(Interpreter, statechart, trace),
+                        run_trace(CompiledInterpreter, statechart, trace),
+                    )
+
+    def test_unknown_event_is_consumed(self):
+        statechart = load(os.path.join(ROOT, 'chapter_01', 'vault.yaml'))
+        interpreter = CompiledInterpreter(statechart)
+        interpreter.execute()
+        steps = interpreter.queue('NOBODY_LISTENS').execute()
+        self.assertEqual(len(steps), 1)
+        self.assertEqual(steps[0].transitions, [])
+        self.assertEqual(interpreter.configuration, ['Active', 'Idle'])
+
+    def test_code_is_shared_between_interpreters(self):
+        statechart = load(os.path.join(ROOT, 'chapter_02', 'vault_passcode.yaml'))
+        first, second = CompiledInterpreter(statechart), CompiledInterpreter(statechart)
+        self.assertIs(first.compiled, second.compiled)
+        self.assertIs(first._evaluator._evaluable_code, second._evaluator._evaluable_code)
+
+    def test_delayed_events_are_queued_in_order(self):
+        statechart = load(os.path.join(ROOT, 'chapter_01', 'vault.yaml'))
+        queues = []
+        for klass in (Interpreter, CompiledInterpreter):
+            interpreter = klass(statechart)
+            interpreter.queue(Event('A', delay=2), Event('B'), Event('C', delay=1), Event('D'))
+            queues.append([(time, event.name) for time, event in interpreter._external_queue])
+        self.assertEqual(queues[0], queues[1])
+
+    def test_pickle_round_trip(self):
+        statechart = load(os.path.join(ROOT, 'chapter_09', 'firmware.yaml'))
+        interpreter = CompiledInterpreter(statechart)
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.execute()
+            interpreter.queue('START_UPDATE', 'CHUNK_RECEIVED').execute()
+            resumed = pickle.loads(pickle.dumps(interpreter))
+            resumed.queue('CHUNK_RECEIVED').execute()
+        self.assertEqual(resumed.context['progress'], 20)
+        self.assertIs(resumed.compiled.statechart, resumed.statechart)
+
+if __name__ == '__main__':
+    unittest.main()
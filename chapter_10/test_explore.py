@@ -0,0 +1,96 @@
+import contextlib
+import io
+import os
+import unittest
+
+from sismic.exceptions import InvariantError
+from sismic.interpreter import Interpreter
+from sismic.io import import_from_yaml
+from sismic.model import Event
+
+from explore import Wait, explore
+from test_engine import ROOT, SilentHardware, load
+
+VAULT_EVENTS = ['DEV_TEST_FAIL', 'LOCK_CMD', ('PIN_ENTERED', {'code': [1234, 0]})]
+
+ALARM = """
+statechart:
+  name: alarm
+  preamble: |
+    alarms = 0
+  root state:
+    name: Active
+    initial: Idle
+    states:
+      - name: Idle
+        contract:
+          - always: alarms < 2
+        transitions:
+          - event: ARM
+            target: Armed
+      - name: Armed
+        transitions:
+          - event: DISARM
+            target: Idle
+          - target: Idle
+            guard: after(5)
+            action: alarms += 1
+"""
+
+LOG = """
+statechart:
+  name: log
+  preamble: |
+    log = []
+  root state:
+    name: Root
+    contract:
+      - always: len(log) < 2
+    transitions:
+      - event: X
+        action: log.append(1)
+      - event: Y
+        action: log.append(2)
+"""
+
+class TestExplore(unittest.TestCase):
+
+    def test_shortest_trace_to_the_backdoor(self):
+        statechart = load(os.path.join(ROOT, 'chapter_06', 'vault_contract.yaml'))
+        found = explore(statechart, VAULT_EVENTS, processes=1)
+        self.assertEqual(found.violation.trace, (Event('DEV_TEST_FAIL'),) * 3)
+        self.assertEqual(found.violation.error, 'InvariantError')
+        self.assertEqual(explore(statechart, VAULT_EVENTS, processes=2), found)
+
+        interpreter = Interpreter(statechart)
+        interpreter.execute()
+        with contextlib.redirect_stdout(io.StringIO()), self.assertRaises(InvariantError):
+            for event in found.violation.trace:
+                interpreter.queue(event).execute()
+
+    def test_waits_for_deadlines(self):
+        found = explore(import_from_yaml(ALARM), ['ARM', 'DISARM'], processes=1)
+        self.assertEqual(found.violation.trace, (Event('ARM'), Wait(5.0), Event('ARM'), Wait(5.0)))
+
+    def test_branches_do_not_share_mutable_values(self):
+        found = explore(import_from_yaml(LOG), ['X', 'Y'], processes=1)
+        self.assertEqual(found.violation.trace, (Event('X'), Event('X')))
+
+    def test_whole_state_space(self):
+        statechart = load(os.path.join(ROOT, 'chapter_07', 'vault_complicated.yaml'))
+        events = [(name, {'code': [1234, 0]}) for name in statechart.events_for()]
+        kwargs = {'waits': [1, 2], 'initial_context': {'hw': SilentHardware()}}
+        found = explore(statechart, events, processes=1, **kwargs)
+        self.assertTrue(found.complete)
+        self.assertIsNone(found.violation)
+        self.assertEqual(explore(statechart, events, processes=2, **kwargs), found)
+
+    def test_limits(self):
+        statechart = load(os.path.join(ROOT, 'chapter_06', 'vault_contract.yaml'))
+        found = explore(statechart, ['LOCK_CMD', ('PIN_ENTERED', {'code': [1234, 0]})], max_states=3, processes=1)
+        self.assertEqual((found.states, found.complete, found.violation), (3, False, None))
+        found = explore(statechart, VAULT_EVENTS, max_depth=2, processes=1)
+        self.assertEqual((found.depth, found.complete, found.violation), (2, False, None))
+
+if __name__ == '__main__':
+    unittest.main()
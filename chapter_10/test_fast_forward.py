@@ -0,0 +1,118 @@
+import asyncio
+import contextlib
+import io
+import os
+import unittest
+
+from sismic.clock import SimulatedClock
+from sismic.interpreter import Interpreter
+from sismic.io import import_from_yaml
+
+from async_runtime import AsyncSystem
+from distributed import Cluster
+from engine import CompiledInterpreter
+from fast_forward import fast_forward
+from scheduler import Scheduler
+from test_engine import ROOT, load
+from test_scheduler import POLLED
+
+class TestFastForward(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+
+    def test_auto_lock(self):
+        """chapter_07/test_vault.py, without choosing 1.9 and 0.2 seconds."""
+        clock = SimulatedClock()
+        vault = Interpreter(load(os.path.join(ROOT, 'chapter_07', 'vault_complicated.yaml')), clock=clock)
+        vault.execute()
+        vault.queue('PIN_ENTERED', code=1234).execute()
+
+        report = fast_forward(vault, predicate=lambda: 'Locked' in vault.configuration)
+        self.assertEqual([time for time, _ in report], [2])
+        self.assertEqual(report[0][1][0].transitions[0].source, 'Unlocked')
+        self.assertEqual(clock.time, 2)
+
+        report = fast_forward(vault, until=100)
+        self.assertEqual([time for time, _ in report], [4, 8])  # LowBattery, then DeadBattery
+        self.assertEqual(clock.time, 100)
+        self.assertIn('DeadBattery', vault.configuration)
+        self.assertEqual(fast_forward(vault, until=1000), [])
+
+    def test_same_as_small_increments(self):
+        """The bound vault and charger of chapter 8: all their deadlines fall on whole seconds."""
+        def system():
+            clock = SimulatedClock()
+            vault = CompiledInterpreter(load(os.path.join(ROOT, 'chapter_08', 'vault_ch8.yaml')), clock=clock)
+            charger = CompiledInterpreter(load(os.path.join(ROOT, 'chapter_08', 'charger_ch8.yaml')), clock=clock)
+            vault.bind(charger)
+            charger.bind(vault)
+            return clock, vault, charger
+
+        clock, vault, charger = system()
+        expected = []
+        for second in range(101):
+            clock.time = second
+            for _ in range(3):
+                expected.extend(vault.execute() + charger.execute())
+
+        clock, fast_vault, fast_charger = system()
+        report = fast_forward([fast_vault, fast_charger], until=100)
+        self.assertEqual(clock.time, 100)
+        self.assertEqual(fast_vault.configuration, vault.configuration)
+        self.assertEqual(fast_charger.configuration, charger.configuration)
+        observed = [step for _, steps in report for executed in steps.values() for step in executed]
+        describe = lambda step: (float(step.time), str(step.steps))
+        self.assertEqual(sorted(map(describe, observed)), sorted(map(describe, expected)))
+        self.assertLess(len(report), 60)
+
+    def test_unpredictable_time_is_polled(self):
+        interpreter = CompiledInterpreter(import_from_yaml(POLLED), clock=SimulatedClock())
+        report = fast_forward(interpreter, predicate=lambda: 'Done' in interpreter.configuration, poll_interval=0.5)
+        self.assertEqual(report[-1][0], 5.5)
+
+    def test_runtimes_poll_alike(self):
+        """fast_forward, Scheduler, AsyncSystem and Cluster poll unpredictable guards at the same instants."""
+        statechart = import_from_yaml(POLLED)
+
+        def with_fast_forward(until):
+            interpreter = CompiledInterpreter(statechart, clock=SimulatedClock())
+            fast_forward(interpreter, until=until, poll_interval=0.5)
+            return interpreter.configuration
+
+        def with_scheduler(until):
+            scheduler = Scheduler(poll_interval=0.5)
+            interpreter = scheduler.add(CompiledInterpreter(statechart, clock=scheduler.clock))
+            scheduler.advance(until)
+            return interpreter.configuration
+
+        def with_async_system(until):
+            async def run():
+                system = AsyncSystem(poll_interval=0.5)
+                interpreter = system.add(CompiledInterpreter(statechart, clock=system.clock))
+                async with system:
+                    await system.advance(until)
+                return interpreter.configuration
+            return asyncio.run(run())
+
+        def with_cluster(until):
+            with Cluster(0, poll_interval=0.5) as cluster:
+                cluster.add('polled', statechart)
+                cluster.advance(until)
+                return cluster.configuration('polled')
+
+        for run in (with_fast_forward, with_scheduler, with_async_system, with_cluster):
+            with self.subTest(runtime=run.__name__):
+                self.assertEqual(run(5.4), ['Root', 'Waiting'])
+                self.assertEqual(run(5.5), ['Root', 'Done'])  # Polled at 0.5, 1.0... 5.5
+
+    def test_needs_a_stop(self):
+        with self.assertRaises(ValueError):
+            fast_forward(Interpreter(import_from_yaml(POLLED)))
+
+if __name__ == '__main__':
+    unittest.main()
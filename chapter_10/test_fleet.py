@@ -0,0 +1,123 @@
+import contextlib
+import io
+import os
+import random
+import unittest
+from unittest import mock
+
+from sismic.clock import SimulatedClock
+from sismic.io import import_from_yaml
+
+import fleet
+from engine import CompiledInterpreter
+from fleet import Fleet
+from test_engine import CHARTS, ROOT, SilentHardware, load
+
+SIZE = 12
+
+STACK = """
+statechart:
+  name: stack
+  preamble: |
+    codes = []
+    seen = {}
+  root state:
+    name: Active
+    transitions:
+      - event: PIN_ENTERED
+        guard: len(codes) < 3
+        action: |
+          codes.append(event.code)
+          seen[event.code] = seen.get(event.code, 0) + 1
+      - event: LOCK_CMD
+        action: codes.clear()
+"""
+
+def observable(context):
+    return {k: v for k, v in context.items() if isinstance(v, (int, float, str, list, dict))}
+
+class TestFleet(unittest.TestCase):
+
+    def compare(self, statechart, seed):
+        """Run the same random events through a Fleet and through one CompiledInterpreter per instance."""
+        rng = random.Random(seed)
+        clock = SimulatedClock()
+        context = {'hw': SilentHardware()}
+        instances = Fleet(statechart, SIZE, clock=clock, initial_context=context)
+        interpreters = [CompiledInterpreter(statechart, clock=clock, initial_context=context) for _ in range(SIZE)]
+        names = statechart.events_for() + ['UNKNOWN_EVENT']
+
+        for _ in range(60):
+            if rng.random() < 0.3:
+                clock.time += rng.choice([0.5, 1.0, 1.9, 2.0, 2.5, 4.0])
+            else:
+                for _ in range(rng.randint(0, 4)):
+                    index, name = rng.randrange(SIZE), rng.choice(names)
+                    data = {'code': rng.choice([0, 1234, 9999]), 'entered_states': ['Charging']}
+                    instances.queue(index, name, **data)
+                    interpreters[index].queue(name, **data)
+
+            # Both run instances in index order, so they fail on the same one
+            try:
+                executed = instances.execute()
+            except Exception as e:
+                with self.assertRaises(type(e)):
+                    for interpreter in interpreters:
+                        interpreter.execute()
+                return
+
+            for index, interpreter in enumerate(interpreters):
+                steps = interpreter.execute()
+                self.assertEqual(str(steps), str(executed.get(index, [])))
+                self.assertEqual(interpreter.configuration, instances.configuration(index))
+                self.assertEqual(observable(interpreter.context), observable(instances.context(index)))
+
+    def test_same_behaviour_as_interpreters(self):
+        for path in CHARTS:
+            statechart = load(path)
+            for seed in range(3):
+                with self.subTest(chart=os.path.basename(path), seed=seed), \
+                        contextlib.redirect_stdout(io.StringIO()):
+                    self.compare(statechart, seed)
+
+    def test_same_behaviour_without_numpy(self):
+        with mock.patch.object(fleet, 'np', None):
+            for name in ('chapter_05/vault_complex.yaml', 'chapter_08/vault_ch8.yaml'):
+                with self.subTest(chart=name), contextlib.redirect_stdout(io.StringIO()):
+                    self.compare(load(os.path.join(ROOT, name)), seed=1)
+
+    def test_idle_instances_are_not_executed(self):
+        statechart = load(os.path.join(ROOT, 'chapter_04', 'vault_timer.yaml'))
+        clock = SimulatedClock()
+        instances = Fleet(statechart, 1000, clock=clock)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(len(instances.execute()), 1000)  # Boot
+            instances.queue(7, 'PIN_ENTERED', code=1234)
+            self.assertEqual(list(instances.execute()), [7])
+            clock.time += 1
+            self.assertEqual(instances.execute(), {})
+            clock.time += 1  # Unlocked for 2 seconds: after(2) relocks instance 7 only
+            self.assertEqual(list(instances.execute()), [7])
+        self.assertEqual(instances.count('Locked'), 1000)
+
+    def test_preamble_containers_are_not_shared(self):
+        statechart = import_from_yaml(STACK)
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                self.compare(statechart, seed)
+        instances = Fleet(statechart, 3)
+        instances.execute()
+        instances.queue(0, 'PIN_ENTERED', code=1).execute()
+        self.assertEqual([instances.context(index)['codes'] for index in range(3)], [[1], [], []])
+
+    def test_context_is_copy_on_write(self):
+        statechart = load(os.path.join(ROOT, 'chapter_09', 'firmware.yaml'))
+        instances = Fleet(statechart, 3)
+        with contextlib.redirect_stdout(io.StringIO()):
+            instances.execute()
+            instances.queue(1, 'START_UPDATE', 'CHUNK_RECEIVED').execute()
+        self.assertEqual(instances.context(1)['progress'], 10)
+        self.assertEqual(instances.context(0)['progress'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
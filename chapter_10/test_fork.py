@@ -0,0 +1,124 @@
+import contextlib
+import io
+import os
+import pickle
+import unittest
+
+from sismic.clock import SimulatedClock
+from sismic.interpreter import Interpreter
+from sismic.io import import_from_yaml
+from sismic.model import Event
+
+from contracts import IncrementalContractInterpreter
+from engine import CompiledInterpreter
+from fork import ForkPoint, fork, simulate
+from test_engine import CHARTS, ROOT, SilentHardware, load, random_trace
+
+LOG = """
+statechart:
+  name: log
+  preamble: |
+    codes = []
+    count = 0
+  root state:
+    name: Active
+    transitions:
+      - event: PUSH
+        action: |
+          codes.append(event.code)
+          count += 1
+"""
+
+def play(interpreter, trace):
+    """Run a trace, and return everything observable about the execution."""
+    observed = []
+    try:
+        for item in trace:
+            if item[0] == 'wait':
+                interpreter.clock.time += item[1]
+                observed.append(str(interpreter.execute()))
+            else:
+                observed.append(str(interpreter.queue(item[1], **item[2]).execute()))
+            observed.append(interpreter.configuration)
+    except Exception as e:
+        observed.append(f'{type(e).__name__}')
+    context = {k: v for k, v in interpreter.context.items() if isinstance(v, (int, float, str))}
+    return observed, context
+
+class TestFork(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+
+    def test_fork_continues_like_the_original(self):
+        """A fork taken halfway through a random trace runs the second half as the original would."""
+        for path in CHARTS:
+            statechart = load(path)
+            for klass in (Interpreter, CompiledInterpreter, IncrementalContractInterpreter):
+                for seed in range(2):
+                    trace = random_trace(statechart, seed)
+                    with self.subTest(chart=os.path.basename(path), klass=klass.__name__, seed=seed):
+                        interpreters = []
+                        for _ in range(2):
+                            interpreter = klass(statechart, clock=SimulatedClock(), initial_context={'hw': SilentHardware()})
+                            interpreter.execute()
+                            before = play(interpreter, trace[:30])
+                            interpreters.append(interpreter)
+                        forked = fork(interpreters[0])
+                        self.assertEqual(play(forked, trace[30:]), play(interpreters[1], trace[30:]))
+                        self.assertEqual(play(interpreters[0], [])[1], before[1])  # The original did not move
+
+    def test_mutable_values_are_copied_on_use(self):
+        interpreter = CompiledInterpreter(import_from_yaml(LOG))
+        interpreter.execute()
+        interpreter.queue(Event('PUSH', code=1)).execute()
+        point = ForkPoint(interpreter)
+        interpreter.queue(Event('PUSH', code=2)).execute()
+
+        first, second = point.fork(), point.fork()
+        self.assertEqual(len(first.context), 2)
+        first.queue(Event('PUSH', code=3)).execute()
+        self.assertEqual(first.context['codes'], [1, 3])
+        self.assertEqual(second.context['codes'], [1])
+        self.assertEqual(interpreter.context['codes'], [1, 2])
+        self.assertEqual(dict(second.context), {'codes': [1], 'count': 1})
+
+        resumed = pickle.loads(pickle.dumps(first))
+        resumed.queue(Event('PUSH', code=4)).execute()
+        self.assertEqual(resumed.context['codes'], [1, 3, 4])
+        self.assertEqual(first.context['codes'], [1, 3])
+
+    def test_forks_are_detached(self):
+        statechart = load(os.path.join(ROOT, 'chapter_03', 'vault_binding.yaml'))
+        heard = []
+        interpreter = CompiledInterpreter(statechart, initial_context={'hw': SilentHardware()})
+        interpreter.attach(heard.append)
+        interpreter.execute()
+        heard.clear()
+
+        stand_in = SilentHardware()
+        forked = fork(interpreter, context={'hw': stand_in})
+        forked.queue('PIN_ENTERED', code=0).execute()
+        self.assertEqual(heard, [])
+        self.assertIs(forked.context['hw'], stand_in)
+        self.assertIsNot(interpreter.context['hw'], stand_in)
+        self.assertIsNot(forked.clock, interpreter.clock)
+
+    def test_simulate_scenarios(self):
+        statechart = load(os.path.join(ROOT, 'chapter_06', 'vault_contract.yaml'))
+        interpreter = CompiledInterpreter(statechart)
+        interpreter.execute()
+        forks = simulate(interpreter, [
+            [Event('PIN_ENTERED', code=1234, delay=120)],
+            [Event('PIN_ENTERED', code=0, delay=i * 60) for i in range(3)],
+        ], 121)
+        self.assertEqual([f.configuration for f in forks], [['Active', 'Unlocked'], ['Active', 'Lockdown']])
+        self.assertEqual([f.clock.time for f in forks], [121, 121])
+        self.assertEqual((interpreter.configuration, interpreter.clock.time), (['Active', 'Locked'], 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import contextlib
+import io
+import os
+import random
+import unittest
+
+from sismic.exceptions import NonDeterminismError
+from sismic.io import import_from_yaml
+
+from compiler import compile_statechart
+from engine import CompiledInterpreter
+from guards import GuardAnalysis
+from test_engine import CHARTS, ROOT, load
+
+PASSCODE = os.path.join(ROOT, 'chapter_02', 'vault_passcode.yaml')
+
+CHART = """
+statechart:
+  name: guards
+  preamble: |
+    LIMIT = 3
+    def is_big(x):
+        return x > 100
+  root state:
+    name: Root
+    initial: Idle
+    states:
+      - name: Idle
+        transitions:
+          - event: GO
+            guard: event.x < LIMIT
+            target: Done
+          - event: GO
+            guard: event.x >= LIMIT and not is_big(event.x)
+            target: Done
+          - event: GO
+            guard: is_big(event.x)
+            target: Done
+          - event: OVERLAP
+            guard: event.x > 1
+            target: Done
+          - event: OVERLAP
+            guard: event.x < 5
+            target: Done
+      - name: Done
+"""
+
+class TestGuards(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+
+    def test_exclusive(self):
+        analysis = GuardAnalysis(load(PASSCODE))
+        cases = [
+            (['x == 1', 'x != 1'], True),
+            (['x == 1', 'x == 1.0'], False),
+            (['x in (1, 2)', 'x == 3'], True),
+            (['x in "abc"', 'x == "ab"'], False),  # Substrings
+            (['1 < x <= 2', 'x > 2'], True),
+            (['x >= 3', 'x <= 3'], False),
+            (['x > 1', 'x < 2'], False),  # 1.5
+            (['not x < 3', 'x < 3'], True),
+            (['x is None', 'x is not None'], True),
+            (['a == 1 and b == 2', 'a == 1 and b != 2', 'a != 1'], True),
+            (['x >= 3', 'x < 3 or y'], False),
+            (['random() < 0.5', 'random() >= 0.5'], False),  # Not the same value twice
+            (['event.code == correct_pin', 'event.code == 1234'], False),
+            (['is_admin(event.code)', 'event.code == correct_pin'], True),  # 9999 != 1234
+            ([None, 'x'], False),
+        ]
+        for guards, expected in cases:
+            with self.subTest(guards=guards):
+                self.assertEqual(analysis.exclusive(guards), expected)
+
+    def test_tutorial_charts_are_proven(self):
+        for chart in CHARTS:
+            compiled = compile_statechart(load(chart))
+            for candidates in (compiled.eventless, *compiled.by_event.values()):
+                for source, priority_groups in candidates:
+                    for group in priority_groups:
+                        if len(group) > 1:
+                            with self.subTest(chart=os.path.relpath(chart, ROOT), source=source):
+                                self.assertIn(id(group), compiled.exclusive)
+
+    def test_assigned_names_are_not_constants(self):
+        statechart = import_from_yaml(CHART)
+        self.assertEqual(GuardAnalysis(statechart).constants, {'LIMIT': 3})
+        self.assertEqual(len(compile_statechart(statechart).exclusive), 1)  # GO, not OVERLAP
+
+        changed = import_from_yaml(
+            CHART.replace('target: Done\n      - name: Done', 'target: Done\n            action: LIMIT = 4\n      - name: Done')
+        )
+        self.assertEqual(GuardAnalysis(changed).constants, {})
+        self.assertEqual(len(compile_statechart(changed).exclusive), 0)
+
+    def test_overlapping_guards_are_still_checked(self):
+        interpreter = CompiledInterpreter(import_from_yaml(CHART))
+        interpreter.execute()
+        with self.assertRaises(NonDeterminismError):
+            interpreter.queue('OVERLAP', x=3).execute()
+
+    def test_substrings_are_still_checked(self):
+        statechart = import_from_yaml(
+            CHART.replace('LIMIT = 3', "LIMIT = 3\n    CODES = 'abc'")
+            .replace('event.x > 1', 'event.x in CODES').replace('event.x < 5', "event.x == 'ab'")
+        )
+        self.assertEqual(len(compile_statechart(statechart).exclusive), 1)  # GO only
+        interpreter = CompiledInterpreter(statechart)
+        interpreter.execute()
+        with self.assertRaises(NonDeterminismError):
+            interpreter.queue('OVERLAP', x='ab').execute()
+
+    def test_mutated_lists_are_still_checked(self):
+        statechart = import_from_yaml(
+            CHART.replace('LIMIT = 3', 'LIMIT = 3\n    CODES = [1, 2]')
+            .replace('event.x > 1', 'event.x in CODES').replace('event.x < 5', 'event.x == 3')
+            .replace('target: Done\n      - name: Done', 'target: Done\n          - event: ADD\n            action: CODES.append(3)\n      - name: Done')
+        )
+        self.assertEqual(GuardAnalysis(statechart).constants, {'LIMIT': 3})
+        self.assertEqual(len(compile_statechart(statechart).exclusive), 1)  # GO only
+        interpreter = CompiledInterpreter(statechart)
+        interpreter.execute()
+        with self.assertRaises(NonDeterminismError):
+            interpreter.queue('ADD').queue('OVERLAP', x=3).execute()
+
+    def test_fewer_guard_evaluations(self):
+        counts = []
+        configurations = []
+        for proven in (True, False):
+            with open(PASSCODE) as f:
+                statechart = import_from_yaml(f.read())  # Not shared with the other tests
+            if not proven:
+                compile_statechart(statechart).exclusive.clear()
+            interpreter = CompiledInterpreter(statechart)
+            evaluate_guard = interpreter._evaluator.evaluate_guard
+            calls = []
+            interpreter._evaluator.evaluate_guard = lambda *args: calls.append(args) or evaluate_guard(*args)
+
+            rng = random.Random(0)
+            observed = []
+            interpreter.execute()
+            for _ in range(300):
+                interpreter.queue('PIN_ENTERED', code=rng.choice([1234, 9999, 0])).execute()
+                observed.append(interpreter.configuration)
+                interpreter.queue(rng.choice(['LOCK', 'RESET'])).execute()
+            counts.append(len(calls))
+            configurations.append(observed)
+
+        self.assertEqual(configurations[0], configurations[1])
+        self.assertLess(counts[0], 0.7 * counts[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+from sismic.clock import SimulatedClock
+
+from engine import CompiledInterpreter
+from host import Client, Host, HostError
+from test_engine import ROOT, load
+
+VAULT_CONTRACT = os.path.join(ROOT, 'chapter_06', 'vault_contract.yaml')
+
+class TestHost(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'host.sock')
+        self.host = Host(ROOT, clock=SimulatedClock, cache_dir=None)
+
+    def tearDown(self):
+        self.host.stop()
+        shutil.rmtree(self.directory)
+
+    def test_operations(self):
+        self.assertIn('vault_contract', self.host.handle({'op': 'charts'})['result'])
+        self.assertEqual(
+            self.host.handle({'op': 'create', 'instance': 'v1', 'chart': 'vault_contract'}),
+            {'result': ['Active', 'Locked']},
+        )
+        responses = self.host.handle([
+            {'op': 'queue', 'instance': 'v1', 'event': 'PIN_ENTERED', 'data': {'code': 0}},
+            {'op': 'execute', 'instance': 'v1'},
+            {'op': 'context', 'instance': 'v1'},
+            {'op': 'execute', 'instance': 'v2'},
+            {'op': 'shutdown'},
+            {'op': 'create', 'instance': 'v1', 'chart': 'vault_contract'},
+        ])
+        self.assertEqual(responses[0], {'result': None})
+        self.assertEqual(responses[1]['result'][0]['event'], 'PIN_ENTERED')
+        self.assertEqual(responses[2]['result']['attempts'], 1)
+        self.assertEqual(responses[3], {'error': "KeyError: 'v2'"})
+        self.assertIn('Unknown operation', responses[4]['error'])
+        self.assertIn('already exists', responses[5]['error'])
+
+    def test_same_steps_as_a_local_interpreter(self):
+        statechart = load(VAULT_CONTRACT)
+        local = CompiledInterpreter(statechart)
+        local.execute()
+        events = [('PIN_ENTERED', {'code': code}) for code in (0, 0, 1234, 5, 0, 0, 0)] + [('LOCK_CMD', {})]
+
+        self.host.start(self.path)
+        with Client(self.path) as client:
+            client.create('v1', 'vault_contract')
+            for name, data in events:
+                client.queue('v1', name, **data)
+                steps = client.execute('v1')
+                local.queue(name, **data)
+                self.assertEqual(
+                    [[str(t) for t in step.transitions] for step in local.execute()],
+                    [step['transitions'] for step in steps],
+                )
+                self.assertEqual(client.configuration('v1'), local.configuration)
+            self.assertEqual(client.context('v1'), dict(local.context))
+
+    def test_batches_and_persistent_connections(self):
+        self.host.start(self.path)
+        with Client(self.path) as first, Client(self.path) as second:
+            first.create('shared', 'vault_contract')
+            results = second.batch([
+                {'op': 'queue', 'instance': 'shared', 'event': 'PIN_ENTERED', 'data': {'code': 1234}},
+                {'op': 'execute', 'instance': 'missing'},
+                {'op': 'execute', 'instance': 'shared'},
+                {'op': 'configuration', 'instance': 'shared'},
+            ])
+            self.assertIsInstance(results[1], HostError)
+            self.assertEqual(results[3], ['Active', 'Unlocked'])
+            self.assertEqual(first.configuration('shared'), ['Active', 'Unlocked'])
+            with self.assertRaises(HostError):
+                first.call('delete', instance='missing')
+            self.assertEqual(first.call('instances'), ['shared'])
+
+    def test_only_stale_sockets_are_replaced(self):
+        with open(self.path, 'w') as f:
+            f.write('not a socket')
+        with self.assertRaises(FileExistsError):
+            self.host.start(self.path)
+        self.assertTrue(os.path.isfile(self.path))
+        os.remove(self.path)
+
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.path)  # Left behind: nobody listens
+        stale.close()
+        self.host.start(self.path)
+
+        other = Host([VAULT_CONTRACT], clock=SimulatedClock, cache_dir=None)
+        with self.assertRaises(FileExistsError):
+            other.start(self.path)
+        with Client(self.path) as client:
+            self.assertIn('vault_contract', client.call('charts'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import contextlib
+import io
+import os
+import unittest
+
+from sismic.clock import SimulatedClock
+from sismic.interpreter import Interpreter
+from sismic.model import Event
+
+from codegen import machine_class
+from engine import CompiledInterpreter
+from ingest import ingest, ingest_many
+from test_engine import CHARTS, ROOT, SilentHardware, load, random_trace
+
+def batches(trace):
+    """Split a random trace into (seconds to wait, events) batches."""
+    found = [(0, [])]
+    for item in trace:
+        if item[0] == 'wait':
+            found.append((item[1], []))
+        else:
+            found[-1][1].append((item[1], item[2]))
+    return found
+
+def run_batches(interpreter, trace, bulk):
+    """Run a trace batch per batch, with ingest() or with queue().execute()."""
+    observed = []
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        try:
+            interpreter.execute()
+            for seconds, items in batches(trace):
+                interpreter.clock.time += seconds
+                events = [Event(name, **data) for name, data in items]
+                if bulk:
+                    observed.append(ingest(interpreter, iter(events), results=True))
+                else:
+                    observed.append([
+                        tuple(t for step in interpreter.queue(event).execute() for t in step.transitions)
+                        for event in events
+                    ])
+                observed.append(interpreter.configuration)
+        except Exception as e:
+            observed.append(f'{type(e).__name__}')
+    context = {k: v for k, v in interpreter.context.items() if isinstance(v, (int, float, str))}
+    return observed, context, output.getvalue()
+
+class TestIngest(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+
+    def test_same_steps_as_queue_execute(self):
+        for path in CHARTS:
+            statechart = load(path)
+            for klass in (Interpreter, CompiledInterpreter):
+                for seed in range(3):
+                    trace = random_trace(statechart, seed)
+                    with self.subTest(chart=os.path.basename(path), interpreter=klass.__name__, seed=seed):
+                        expected, bulk = (
+                            run_batches(
+                                klass(statechart, clock=SimulatedClock(), initial_context={'hw': SilentHardware()}),
+                                trace,
+                                flag,
+                            )
+                            for flag in (False, True)
+                        )
+                        self.assertEqual(expected, bulk)
+
+    def test_listeners_get_the_same_meta_events(self):
+        statechart = load(os.path.join(ROOT, 'chapter_08', 'basic_comms.yaml'))
+        events = ['START', 'HELLO', 'UNKNOWN', 'STOP'] * 3
+        for klass in (Interpreter, CompiledInterpreter):
+            received = []
+            for bulk in (False, True):
+                interpreter = klass(statechart)
+                meta_events = []
+                interpreter.attach(lambda event: meta_events.append((event.name, dict(event.data))))
+                if bulk:
+                    ingest(interpreter, events)
+                else:
+                    for event in events:
+                        interpreter.queue(event).execute()
+                received.append(meta_events)
+            with self.subTest(interpreter=klass.__name__):
+                self.assertEqual(received[0], received[1])
+                self.assertIn('step ended', [name for name, _ in received[0]])
+
+    def test_other_interfaces_are_called_as_such(self):
+        statechart = load(os.path.join(ROOT, 'chapter_04', 'vault_timer.yaml'))
+        machine = machine_class(statechart)()
+        self.assertEqual(ingest(machine, [Event('PIN_ENTERED', code=0)] * 2), 2)
+        self.assertEqual(machine.context['attempts'], 2)
+        fired = ingest(machine, [Event('PIN_ENTERED', code=0)], results=True)
+        self.assertEqual(len(fired[0]), 1)  # The generated machine describes its transitions as strings
+        self.assertEqual(machine.configuration, ['Active', 'Lockdown'])
+
+    def test_many_interpreters(self):
+        statechart = load(os.path.join(ROOT, 'chapter_09', 'firmware.yaml'))
+        first, second = CompiledInterpreter(statechart), Interpreter(statechart)
+        items = [(first, 'START_UPDATE'), (second, 'START_UPDATE')] + [(first, 'CHUNK_RECEIVED')] * 3
+        results = ingest_many(items, results=True)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(first.context['progress'], 30)
+        self.assertEqual(second.context['progress'], 0)
+        self.assertEqual(second.configuration, ['Updater', 'Downloading'])
+        self.assertEqual(ingest_many(iter([(second, 'CHUNK_RECEIVED')])), 1)
+        self.assertEqual(second.context['progress'], 10)
+
+if __name__ == '__main__':
+    unittest.main()
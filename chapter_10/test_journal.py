@@ -0,0 +1,140 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from sismic.clock import SimulatedClock
+from sismic.exceptions import ContractError
+from sismic.io import import_from_yaml
+from sismic.model import Event
+
+from engine import CompiledInterpreter
+from journal import JOURNAL, JournaledInterpreter
+from test_engine import CHARTS, ROOT, SilentHardware, load, random_trace
+
+ORDER = """
+statechart:
+  name: order
+  root state:
+    name: R
+    initial: S
+    states:
+      - name: S
+        transitions:
+          - event: X
+            target: A
+          - event: Y
+            target: B
+      - name: A
+      - name: B
+        transitions:
+          - event: X
+            target: C
+      - name: C
+"""
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+        self.directory.cleanup()
+
+    def test_resume_after_crash(self):
+        statechart = load(os.path.join(ROOT, 'chapter_09', 'firmware.yaml'))
+        interpreter = JournaledInterpreter(statechart, self.directory.name)
+        interpreter.execute()
+        interpreter.queue('START_UPDATE', 'CHUNK_RECEIVED', 'CHUNK_RECEIVED', 'CHUNK_RECEIVED').execute()
+        del interpreter  # No close(), no checkpoint
+
+        resumed = JournaledInterpreter(statechart, self.directory.name)
+        self.assertEqual(resumed.context['progress'], 30)
+        self.assertEqual(resumed.configuration, ['Updater', 'Downloading'])
+        resumed.queue('CHUNK_RECEIVED').execute()
+        self.assertEqual(resumed.context['progress'], 40)
+
+    def test_delays_count_from_an_execute_that_did_nothing(self):
+        statechart = import_from_yaml(ORDER)
+        clock = SimulatedClock()
+        interpreter = JournaledInterpreter(statechart, self.directory.name, clock=clock)
+        interpreter.execute()
+        clock.time = 5
+        self.assertEqual(interpreter.execute(), [])  # Moves the time delays count from
+        interpreter.queue(Event('X', delay=1))
+        interpreter.queue('Y')
+        clock.time = 5.5
+        interpreter.execute()  # Y, but not X yet
+        self.assertEqual(interpreter.configuration, ['R', 'B'])
+        interpreter.close()
+
+        resumed = JournaledInterpreter(statechart, self.directory.name, clock=SimulatedClock())
+        self.assertEqual(resumed.configuration, ['R', 'B'])
+        self.assertEqual(resumed._external_queue, interpreter._external_queue)
+
+    def test_checkpoint_starts_a_new_journal(self):
+        statechart = load(os.path.join(ROOT, 'chapter_09', 'firmware.yaml'))
+        interpreter = JournaledInterpreter(statechart, self.directory.name, checkpoint_every=3)
+        interpreter.execute()
+        interpreter.queue('START_UPDATE').execute()
+        for _ in range(5):
+            interpreter.queue('CHUNK_RECEIVED').execute()
+        interpreter.close()
+        self.assertEqual(sorted(os.listdir(self.directory.name)), [JOURNAL.format(2), 'snapshot'])
+
+        resumed = JournaledInterpreter(statechart, self.directory.name, checkpoint_every=3)
+        self.assertEqual(resumed.replayed, 2)  # One CHUNK_RECEIVED, one execute()
+        self.assertEqual(resumed.context['progress'], 50)
+
+    def test_truncated_record_is_dropped(self):
+        statechart = load(os.path.join(ROOT, 'chapter_09', 'firmware.yaml'))
+        interpreter = JournaledInterpreter(statechart, self.directory.name)
+        interpreter.execute()
+        interpreter.queue('START_UPDATE').execute()
+        interpreter.close()
+        with open(os.path.join(self.directory.name, JOURNAL.format(0)), 'ab') as f:
+            f.write(b'\x80\x05\x95')  # The beginning of a record
+
+        resumed = JournaledInterpreter(statechart, self.directory.name)
+        self.assertEqual(resumed.configuration, ['Updater', 'Downloading'])
+        resumed.queue('CHUNK_RECEIVED').execute()
+        resumed.close()
+        self.assertEqual(JournaledInterpreter(statechart, self.directory.name).context['progress'], 10)
+
+    def test_same_behaviour_with_restarts(self):
+        """Random traces with a crash every few events end like an uninterrupted interpreter."""
+        for path in CHARTS:
+            statechart = load(path)
+            trace = random_trace(statechart, seed=0, length=40)
+            context = {'hw': SilentHardware()}
+            with self.subTest(chart=os.path.basename(path)), tempfile.TemporaryDirectory() as directory:
+                clock = SimulatedClock()
+                reference = CompiledInterpreter(statechart, clock=clock, initial_context=context)
+                interpreter = JournaledInterpreter(
+                    statechart, directory, clock=clock, initial_context=context, checkpoint_every=4,
+                )
+                try:
+                    for number, item in enumerate(trace):
+                        if item[0] == 'wait':
+                            clock.time += item[1]
+                        else:
+                            reference.queue(item[1], **item[2])
+                            interpreter.queue(item[1], **item[2])
+                        self.assertEqual(str(reference.execute()), str(interpreter.execute()))
+                        if number % 7 == 0:
+                            interpreter.close()
+                            interpreter = JournaledInterpreter(
+                                statechart, directory, clock=clock, initial_context=context, checkpoint_every=4,
+                            )
+                        self.assertEqual(reference.configuration, interpreter.configuration)
+                except ContractError:
+                    pass  # Both raised it (vault_contract.yaml), or assertEqual would have failed first
+                finally:
+                    interpreter.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import contextlib
+import io
+import os
+import unittest
+
+from sismic.clock import SimulatedClock
+
+from engine import CompiledInterpreter
+from test_engine import CHARTS, ROOT, SilentHardware, load, random_trace
+
+def describe(meta_event):
+    return (meta_event.name, sorted((k, str(v)) for k, v in meta_event.data.items()))
+
+def play(statechart, trace, attach):
+    """Run a trace on a new interpreter, after calling attach(interpreter)."""
+    clock = SimulatedClock()
+    interpreter = CompiledInterpreter(statechart, clock=clock, initial_context={'hw': SilentHardware()})
+    attach(interpreter)
+    try:
+        interpreter.execute()
+        for item in trace:
+            if item[0] == 'wait':
+                clock.time += item[1]
+            else:
+                interpreter.queue(item[1], **item[2])
+            interpreter.execute()
+    except Exception:
+        pass  # vault_contract.yaml reaches its bug
+    return interpreter
+
+class TestSelectiveListeners(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+
+    def test_filtered_listener_sees_what_a_filtering_listener_keeps(self):
+        names = {'state entered', 'event sent'}
+        for path in CHARTS:
+            statechart = load(path)
+            states = set(statechart.states[::2])
+            trace = random_trace(statechart, seed=1, length=40)
+            with self.subTest(chart=os.path.basename(path)):
+                everything, filtered = [], []
+                play(statechart, trace, lambda i: i.attach(everything.append))
+                play(statechart, trace, lambda i: i.attach(filtered.append, names=names, states=states))
+                expected = [
+                    e for e in everything
+                    if e.name in names and (e.name != 'state entered' or e.state in states)
+                ]
+                self.assertEqual(list(map(describe, filtered)), list(map(describe, expected)))
+
+    def test_batches_are_macro_steps(self):
+        statechart = load(os.path.join(ROOT, 'chapter_04', 'vault_timer.yaml'))
+        trace = random_trace(statechart, seed=2, length=40)
+        everything, batches = [], []
+        play(statechart, trace, lambda i: i.attach(everything.append))
+        play(statechart, trace, lambda i: i.attach(batches.append, batch=True))
+        self.assertEqual([describe(e) for batch in batches for e in batch], list(map(describe, everything)))
+        for batch in batches:
+            self.assertEqual((batch[0].name, batch[-1].name), ('step started', 'step ended'))
+
+        # With a filter, steps without any interesting meta-event are not delivered
+        entered = []
+        play(statechart, trace, lambda i: i.attach(entered.append, names=['state entered'], batch=True))
+        self.assertLess(len(entered), len(batches))
+        self.assertTrue(all(batch and all(e.name == 'state entered' for e in batch) for batch in entered))
+
+    def test_unwanted_meta_events_are_not_delivered(self):
+        statechart = load(os.path.join(ROOT, 'chapter_08', 'vault_ch8.yaml'))
+        sent = []
+        interpreter = play(statechart, [('wait', 2.0)], lambda i: i.bind(sent.append))
+        self.assertEqual(interpreter._wanted, {'event sent'})
+        self.assertEqual([event.name for event in sent], ['BATTERY_LOW'])
+
+        listener = lambda meta_event: None
+        interpreter.attach(listener)
+        self.assertIsNone(interpreter._wanted)
+        interpreter.detach(listener)
+        self.assertEqual(interpreter._wanted, {'event sent'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import contextlib
+import io
+import os
+import pickle
+import unittest
+
+from sismic.interpreter import Interpreter
+from sismic.io import import_from_yaml
+
+from contracts import _VOLATILE
+from memo import MemoInterpreter
+from test_engine import CHARTS, ROOT, load, random_trace, run_trace
+
+VAULT_PASSCODE = os.path.join(ROOT, 'chapter_02', 'vault_passcode.yaml')
+
+DOOR = """
+statechart:
+  name: door
+  preamble: |
+    __pure__ = ['event.code == pin', 'event.code not in banned']
+    pin = 1
+    banned = []
+  root state:
+    name: Active
+    initial: Closed
+    states:
+      - name: Closed
+        transitions:
+          - event: CODE
+            guard: event.code == pin
+            target: Open
+          - event: BAN
+            guard: event.code not in banned
+            action: banned.append(event.code)
+          - event: CHANGE
+            action: pin = event.code
+      - name: Open
+        transitions:
+          - event: CLOSE
+            target: Closed
+"""
+
+TYPED = """
+statechart:
+  name: typed
+  preamble: |
+    __pure__ = ['event.code is True', 'is_true']
+    def is_true(code):
+        return code is True
+  root state:
+    name: Root
+    initial: A
+    states:
+      - name: A
+        transitions:
+          - event: E
+            guard: event.code is True
+            target: B
+          - event: F
+            guard: is_true(event.code)
+            target: B
+      - name: B
+        transitions:
+          - event: BACK
+            target: A
+"""
+
+def everything_pure(statechart):
+    """The preamble functions, and every guard that only reads the event and the context."""
+    interpreter = MemoInterpreter(statechart)
+    functions = [name for name, value in interpreter.context.items() if callable(value) and name.isidentifier()]
+    guards = [
+        transition.guard for transition in statechart.transitions
+        if transition.guard and interpreter.compiled.names.get(transition.guard) is not None
+        and interpreter.compiled.names[transition.guard].isdisjoint(_VOLATILE - {'event'})
+    ]
+    return functions + guards
+
+class TestMemo(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+
+    def test_same_behaviour_as_reference_interpreter(self):
+        """Random traces on every tutorial chart, with everything that can be declared pure."""
+        for path in CHARTS:
+            statechart = load(path)
+            pure = everything_pure(statechart)
+            klass = lambda statechart, **kwargs: MemoInterpreter(statechart, pure=pure, cache_size=4, **kwargs)
+            for seed in range(3):
+                trace = random_trace(statechart, seed)
+                with self.subTest(chart=os.path.basename(path), seed=seed):
+                    self.assertEqual(run_trace(Interpreter, statechart, trace), run_trace(klass, statechart, trace))
+
+    def test_functions_and_guards_are_memoised(self):
+        statechart = load(VAULT_PASSCODE)
+        interpreter = MemoInterpreter(statechart, pure=['is_admin', 'is_admin(event.code)'])
+        interpreter.execute()
+        for code in [1, 9999, 1, 1234, 1, 9999]:
+            interpreter.queue('PIN_ENTERED', code=code).execute()
+            interpreter.queue('RESET', 'LOCK').execute()
+            self.assertEqual(interpreter.configuration, ['Active', 'Locked'])
+
+        # The first guard is evaluated once per code. is_admin is called by it,
+        # then by the third guard, which is only reached by code 1 (three times)
+        self.assertEqual((interpreter.guard_hits, interpreter.guard_misses), (3, 3))
+        info = interpreter.context['is_admin'].cache_info()
+        self.assertEqual((info.hits, info.misses), (3, 3))
+
+    def test_context_changes_and_mutable_values(self):
+        statechart = import_from_yaml(DOOR)
+        interpreter = MemoInterpreter(statechart, cache_size=2)
+        interpreter.execute()
+
+        interpreter.queue('CODE', code=2).execute()
+        self.assertEqual(interpreter.configuration, ['Active', 'Closed'])
+        interpreter.queue('CHANGE', code=2).queue('CODE', code=2).execute()
+        self.assertEqual(interpreter.configuration, ['Active', 'Open'])
+        interpreter.queue('CLOSE', 'CHANGE', code=1).execute()  # Back to pin = 1: the first entry, if still there
+        interpreter.queue('CODE', code=2).execute()
+        self.assertEqual(interpreter.configuration, ['Active', 'Closed'])
+        self.assertLessEqual(len(interpreter._evaluator._cache), 2)
+
+        # banned is a list: never part of a key
+        misses = interpreter.guard_misses
+        interpreter.queue('BAN', code=3).queue('BAN', code=3).execute()
+        self.assertEqual(interpreter.context['banned'], [3])
+        self.assertEqual(interpreter.guard_misses, misses)
+
+        resumed = pickle.loads(pickle.dumps(interpreter))
+        resumed.queue('CODE', code=1).execute()
+        self.assertEqual(resumed.configuration, ['Active', 'Open'])
+
+    def test_equal_values_of_other_types(self):
+        interpreter = MemoInterpreter(import_from_yaml(TYPED))
+        interpreter.execute()
+        for name in ('E', 'F'):
+            for code in (1, 1.0, True):
+                interpreter.queue(name, code=code).execute()
+                self.assertEqual(interpreter.configuration, ['Root', 'B' if code is True else 'A'])
+                interpreter.queue('BACK').execute()
+        self.assertEqual(interpreter.guard_misses, 3)
+        self.assertEqual(interpreter.context['is_true'].cache_info().misses, 3)
+
+    def test_what_cannot_be_memoised(self):
+        statechart = load(os.path.join(ROOT, 'chapter_04', 'vault_timer.yaml'))
+        guard = next(transition.guard for transition in statechart.transitions if transition.guard and 'after' in transition.guard)
+        with self.assertRaisesRegex(ValueError, 'uses after'):
+            MemoInterpreter(statechart, pure=[guard])
+        with self.assertRaisesRegex(ValueError, 'neither a function'):
+            MemoInterpreter(load(VAULT_PASSCODE), pure=['correct_pin'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import contextlib
+import io
+import os
+import unittest
+
+from sismic.clock import SimulatedClock
+from sismic.exceptions import PropertyStatechartError
+from sismic.io import import_from_yaml
+
+from engine import CompiledInterpreter
+from monitoring import Monitoring
+from test_engine import ROOT, load, random_trace
+
+# A Sismic-style property: no PIN may be entered while the vault is open
+NO_PIN_WHILE_OPEN = import_from_yaml("""
+statechart:
+  name: no_pin_while_open
+  root state:
+    name: Property
+    initial: Closed
+    states:
+      - name: Closed
+        transitions:
+          - event: state entered
+            guard: event.state == 'Unlocked'
+            target: Open
+      - name: Open
+        transitions:
+          - event: state exited
+            guard: event.state == 'Unlocked'
+            target: Closed
+          - event: event consumed
+            guard: event.event.name == 'PIN_ENTERED'
+            target: Violation
+      - name: Violation
+        type: final
+""")
+
+# A chapter 8-style monitor that counts the steps it receives
+STEP_COUNTER = import_from_yaml("""
+statechart:
+  name: step_counter
+  preamble: steps = 0
+  root state:
+    name: Counting
+    transitions:
+      - event: step
+        action: steps += 1
+""")
+
+def first_violation(statechart, trace, bind):
+    """Index of the trace item at which a PropertyStatechartError is raised, or None."""
+    clock = SimulatedClock()
+    interpreter = CompiledInterpreter(statechart, clock=clock)
+    bind(interpreter)
+    interpreter.execute()
+    for index, item in enumerate(trace):
+        try:
+            if item[0] == 'wait':
+                clock.time += item[1]
+            else:
+                interpreter.queue(item[1], **item[2])
+            interpreter.execute()
+        except PropertyStatechartError:
+            return index
+    return None
+
+class TestMonitoring(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+
+    def test_same_verdict_as_bind_property_statechart(self):
+        statechart = load(os.path.join(ROOT, 'chapter_04', 'vault_timer.yaml'))
+        violations = 0
+        for seed in range(10):
+            trace = random_trace(statechart, seed=seed, length=30)
+            with self.subTest(seed=seed):
+                expected = first_violation(
+                    statechart, trace, lambda i: i.bind_property_statechart(NO_PIN_WHILE_OPEN),
+                )
+                monitoring = Monitoring(NO_PIN_WHILE_OPEN)
+                self.assertEqual(first_violation(statechart, trace, monitoring.watch), expected)
+                violations += expected is not None
+        self.assertGreater(violations, 0)
+
+    def test_one_step_event_per_macro_step(self):
+        statechart = load(os.path.join(ROOT, 'chapter_04', 'vault_timer.yaml'))
+        monitoring = Monitoring(STEP_COUNTER)
+        clock = SimulatedClock()
+        vaults = [monitoring.watch(CompiledInterpreter(statechart, clock=clock)) for _ in range(10)]
+
+        changes = 0
+        for vault in vaults:
+            for step in vault.execute() + vault.queue('PIN_ENTERED', code=1234).execute():
+                changes += any(s.entered_states or s.exited_states for s in step.steps)
+        clock.time += 2
+        for vault in vaults:
+            changes += len(vault.execute())
+
+        self.assertEqual(sum(monitoring.monitors(v)[0].context['steps'] for v in vaults), changes)
+        self.assertEqual(changes, 30)
+
+        monitoring.unwatch(vaults[0])
+        vaults[0].queue('PIN_ENTERED', code=1234).execute()
+        self.assertNotIn(vaults[0], monitoring)
+        self.assertEqual(len(monitoring), 9)
+
+    def test_chapter_8_hazard(self):
+        vault = CompiledInterpreter(load(os.path.join(ROOT, 'chapter_08', 'vault_ch8.yaml')), clock=SimulatedClock())
+        charger = CompiledInterpreter(load(os.path.join(ROOT, 'chapter_08', 'charger_ch8.yaml')), clock=vault.clock)
+        vault.bind(charger)
+        charger.bind(vault)
+        monitoring = Monitoring(load(os.path.join(ROOT, 'chapter_08', 'monitor_ch8.yaml')))
+        monitoring.watch(vault)
+
+        def propagate():
+            for _ in range(3):
+                vault.execute()
+                charger.execute()
+
+        # The scenarios of chapter_08/run_sync.py: a first charge cycle is safe
+        for seconds in (0, 2.0, 5.0, 0.1, 1.5):
+            vault.clock.time += seconds
+            propagate()
+        vault.queue('PIN_ENTERED', code=1234).execute()
+        vault.clock.time += 0.5
+        with self.assertRaises(PropertyStatechartError) as raised:
+            propagate()
+        self.assertEqual(raised.exception.property_statechart.configuration, [])
+        self.assertEqual(set(vault.configuration) & {'Unlocked', 'Charging'}, {'Unlocked', 'Charging'})
+
+if __name__ == '__main__':
+    unittest.main()
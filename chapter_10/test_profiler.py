@@ -0,0 +1,99 @@
+import contextlib
+import io
+import os
+import unittest
+
+from sismic.clock import SimulatedClock
+from sismic.exceptions import ContractError
+
+from engine import CompiledInterpreter
+from profiler import Profiler, Timing
+from test_engine import ROOT, SilentHardware, load, random_trace
+
+def play(interpreter, trace):
+    observed = [str(interpreter.execute())]
+    try:
+        for item in trace:
+            if item[0] == 'wait':
+                interpreter.clock.time += item[1]
+            else:
+                interpreter.queue(item[1], **item[2])
+            observed.append(str(interpreter.execute()))
+    except ContractError as e:
+        observed.append(type(e).__name__)
+    return observed
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+
+    def new(self, path):
+        return CompiledInterpreter(
+            load(os.path.join(ROOT, path)), clock=SimulatedClock(), initial_context={'hw': SilentHardware()},
+        )
+
+    def test_same_behaviour_and_detach(self):
+        for path in ('chapter_03/vault_binding.yaml', 'chapter_06/vault_contract.yaml', 'chapter_09/firmware.yaml'):
+            trace = random_trace(load(os.path.join(ROOT, path)), seed=4, length=40)
+            with self.subTest(chart=path):
+                profiler = Profiler()
+                profiled = profiler.attach(self.new(path))
+                self.assertEqual(play(profiled, trace), play(self.new(path), trace))
+                self.assertTrue(profiler.timings)
+
+                profiler.detach(profiled)
+                self.assertFalse({'execute_once', '_apply_step'} & set(profiled.__dict__))
+                self.assertFalse({'evaluate_guard', '_evaluate_code'} & set(profiled._evaluator.__dict__))
+
+    def test_labels(self):
+        profiler = Profiler()
+        vault = profiler.attach(self.new('chapter_02/vault_passcode.yaml'))
+        vault.execute()
+        for code in (0, 9999, 1234):
+            vault.queue('PIN_ENTERED', code=code).execute()
+
+        admin = profiler.timings['guard Locked -> Unlocked on PIN_ENTERED [is_admin(event.code)]']
+        self.assertEqual(admin.count, 1)  # Only evaluated for the first PIN: the others leave Locked
+        self.assertEqual(profiler.timings['step'].count, 2 * 4)  # A step, then an empty one, per execute()
+        self.assertIn('action Locked -> ErrorState on PIN_ENTERED', profiler.timings)
+
+        binding = profiler.attach(self.new('chapter_03/vault_binding.yaml'))
+        binding.execute()
+        self.assertIn('on entry Locked', profiler.timings)
+
+        contract = profiler.attach(self.new('chapter_06/vault_contract.yaml'))
+        contract.execute()
+        contract.queue('PIN_ENTERED', code=0).execute()
+        self.assertIn('invariants Locked', profiler.timings)
+        self.assertIn('clause attempts < MAX_ATTEMPTS', profiler.timings)
+        self.assertIn('step;invariants Locked;clause attempts < MAX_ATTEMPTS', profiler.flamegraph())
+
+    def test_flamegraph_adds_up(self):
+        profiler = Profiler()
+        vault = profiler.attach(self.new('chapter_04/vault_timer.yaml'))
+        play(vault, random_trace(vault.statechart, seed=1))
+        lines = profiler.flamegraph().splitlines()
+        own = sum(int(line.rsplit(' ', 1)[1]) for line in lines)
+        self.assertEqual(own, profiler.timings['step'].total)
+        self.assertTrue(all(line.startswith('step') for line in lines))
+        self.assertIn(' p99 us ', profiler.report())
+
+        profiler.reset()
+        self.assertEqual(profiler.flamegraph(), '\n')
+
+    def test_histogram(self):
+        timing = Timing()
+        for duration in range(1000, 101000, 1000):  # 1 to 100 us
+            timing.add(duration)
+        self.assertEqual(timing.count, 100)
+        self.assertAlmostEqual(timing.mean, 50.5e-6)
+        self.assertTrue(50e-6 <= timing.percentile(0.5) <= 50e-6 * 1.25)
+        self.assertTrue(99e-6 <= timing.percentile(0.99) <= 100e-6)
+
+if __name__ == '__main__':
+    unittest.main()
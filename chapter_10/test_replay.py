@@ -0,0 +1,106 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from sismic.clock import SimulatedClock
+from sismic.interpreter import Interpreter
+from sismic.io import import_from_yaml
+
+from engine import CompiledInterpreter
+from replay import header, read, record, replay, replay_many
+from test_engine import CHARTS, ROOT, SilentHardware, load, random_trace
+
+VAULT = os.path.join(ROOT, 'chapter_07', 'vault_complicated.yaml')
+
+def record_trace(interpreter_klass, statechart, trace, path):
+    """Run a trace on a recorded interpreter, return True if it raised an error."""
+    clock = SimulatedClock()
+    interpreter = interpreter_klass(statechart, clock=clock, initial_context={'hw': SilentHardware()})
+    recorder = record(interpreter, path)
+    try:
+        interpreter.execute()
+        for item in trace:
+            if item[0] == 'wait':
+                clock.time += item[1]
+                interpreter.execute()
+            else:
+                interpreter.queue(item[1], **item[2]).execute()
+        return False
+    except Exception:
+        return True
+    finally:
+        recorder.close()
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_replay_matches_recording(self):
+        for chart in CHARTS:
+            statechart = load(chart)
+            for klass in (Interpreter, CompiledInterpreter):
+                with self.subTest(chart=os.path.relpath(chart, ROOT), interpreter=klass.__name__):
+                    path = self.path('trace')
+                    failed = record_trace(klass, statechart, random_trace(statechart, seed=7), path)
+                    replayed = replay(statechart, path, initial_context={'hw': SilentHardware()})
+                    self.assertEqual(replayed.instants + (1 if failed else 0), len(list(read(path))))
+                    if failed:  # The same error, at the same instant
+                        self.assertIsNotNone(replayed.divergence.error)
+                    else:
+                        self.assertIsNone(replayed.divergence)
+
+    def test_new_version_diverges(self):
+        statechart = load(VAULT)
+        path = self.path('session.gz')
+        record_trace(CompiledInterpreter, statechart, [
+            ('event', 'PIN_ENTERED', {'code': 1234}), ('wait', 1.0), ('wait', 1.5), ('wait', 1.0),
+        ], path)
+        self.assertEqual(header(path), {'statechart': 'chapter_07'})
+        self.assertEqual([(i.time, [e.name for e in i.events]) for i in read(path)], [
+            (0, ['PIN_ENTERED']), (2.5, []),  # Nothing happened at 1.0 and 3.5
+        ])
+
+        with open(VAULT) as f:
+            slower = import_from_yaml(f.read().replace('after(2)', 'after(3)'))
+        self.assertIsNone(replay(statechart, path).divergence)
+        divergence = replay(slower, path).divergence
+        self.assertEqual(divergence.time, 2.5)
+        self.assertIn('Locked', divergence.recorded)
+        self.assertIn('Unlocked', divergence.replayed)
+
+    def test_truncated_record_is_ignored(self):
+        statechart = load(VAULT)
+        path = self.path('trace')
+        record_trace(CompiledInterpreter, statechart, [('event', 'PIN_ENTERED', {'code': 1234}), ('wait', 2.0)], path)
+        with open(path, 'ab') as f:
+            f.write(b'\x80\x05\x95')  # The beginning of a record
+        self.assertEqual(len(list(read(path))), 2)
+        self.assertIsNone(replay(statechart, path).divergence)
+
+    def test_replay_many(self):
+        statechart = load(VAULT)
+        paths = []
+        for seed in range(6):
+            paths.append(self.path(f'trace.{seed}'))
+            record_trace(CompiledInterpreter, statechart, random_trace(statechart, seed), paths[-1])
+        with open(VAULT) as f:
+            slower = import_from_yaml(f.read().replace('after(4)', 'after(5)'))
+
+        expected = sorted(replay(slower, path) for path in paths)
+        self.assertEqual(sorted(replay_many(slower, paths, processes=2, chunksize=2)), expected)
+        self.assertTrue(any(replayed.divergence for replayed in expected))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import contextlib
+import io
+import os
+import unittest
+
+from sismic.clock import SimulatedClock
+from sismic.exceptions import InvariantError
+from sismic.io import import_from_yaml
+
+from engine import CompiledInterpreter
+from scheduler import Scheduler
+from test_engine import ROOT, load
+
+POLLED = """
+statechart:
+  name: polled
+  root state:
+    name: Root
+    initial: Waiting
+    states:
+      - name: Waiting
+        transitions:
+          - guard: time > 5
+            target: Done
+      - name: Done
+"""
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.statechart = load(os.path.join(ROOT, 'chapter_04', 'vault_timer.yaml'))
+        self.scheduler = Scheduler()
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+
+    def test_next_deadline(self):
+        clock = SimulatedClock()
+        interpreter = CompiledInterpreter(self.statechart, clock=clock)
+        self.assertEqual(interpreter.next_deadline(), 0)  # Not started yet
+        interpreter.execute()
+        self.assertIsNone(interpreter.next_deadline())  # Locked: waits for a PIN
+
+        clock.time = 1
+        interpreter.queue('PIN_ENTERED', code=1234)
+        self.assertEqual(interpreter.next_deadline(), 0)  # The event, due since the last step
+        interpreter.execute()
+        self.assertEqual(interpreter.next_deadline(), 3)  # Unlocked: after(2)
+
+    def test_only_due_interpreters_are_executed(self):
+        interpreters = [
+            self.scheduler.add(CompiledInterpreter(self.statechart, clock=self.scheduler.clock))
+            for _ in range(100)
+        ]
+        self.assertEqual(len(self.scheduler.execute()), 100)  # Boot
+
+        self.scheduler.clock.time = 1
+        self.scheduler.queue(interpreters[7], 'PIN_ENTERED', code=1234)
+        self.assertEqual(list(self.scheduler.execute()), [interpreters[7]])
+        self.scheduler.clock.time = 1.5
+        self.scheduler.queue(interpreters[42], 'PIN_ENTERED', code=1234)
+
+        calls = self.scheduler.advance(60)
+        times = [(time, [interpreters.index(i) for i in executed]) for time, executed in calls]
+        # Each vault relocks exactly 2 seconds after its PIN, the other ones are left alone
+        self.assertEqual(times, [(1.5, [42]), (3, [7]), (3.5, [42])])
+        self.assertEqual(self.scheduler.clock.time, 60)
+        self.assertIsNone(self.scheduler.next_time)
+
+    def test_deadline_is_not_missed_by_rounding(self):
+        interpreter = self.scheduler.add(CompiledInterpreter(self.statechart, clock=self.scheduler.clock))
+        self.scheduler.execute()
+        self.scheduler.clock.time = 0.1 + 0.2  # 0.30000000000000004
+        self.scheduler.queue(interpreter, 'PIN_ENTERED', code=1234)
+        self.scheduler.execute()
+
+        deadline = self.scheduler.next_time
+        self.scheduler.clock.time = deadline
+        self.assertIn(interpreter, self.scheduler.execute())
+        self.assertEqual(interpreter.configuration, ['Active', 'Locked'])
+
+    def test_an_error_does_not_unschedule_the_others(self):
+        scheduler = Scheduler()
+        failing = scheduler.add(CompiledInterpreter(load(os.path.join(ROOT, 'chapter_06', 'vault_contract.yaml'))))
+        other = scheduler.add(CompiledInterpreter(load(os.path.join(ROOT, 'chapter_01', 'vault.yaml'))))
+        failing.queue('DEV_TEST_FAIL', 'DEV_TEST_FAIL', 'DEV_TEST_FAIL')
+        with contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaises(InvariantError):
+                scheduler.execute()
+            self.assertEqual(other.configuration, [])
+            self.assertIn(other, scheduler.execute())
+        self.assertEqual(other.configuration, ['Active', 'Idle'])
+
+    def test_unpredictable_guards_are_polled(self):
+        scheduler = Scheduler(poll_interval=1)
+        interpreter = scheduler.add(CompiledInterpreter(import_from_yaml(POLLED), clock=scheduler.clock))
+        calls = scheduler.advance(10)
+        self.assertEqual([time for time, executed in calls if executed], [0, 6])
+        self.assertEqual(interpreter.configuration, ['Root', 'Done'])
+
+if __name__ == '__main__':
+    unittest.main()
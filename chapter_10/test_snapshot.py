@@ -0,0 +1,93 @@
+import contextlib
+import io
+import os
+import pickle
+import unittest
+
+from sismic.clock import SimulatedClock
+from sismic.exceptions import ContractError
+
+import snapshot
+from engine import CompiledInterpreter
+from test_engine import CHARTS, ROOT, SilentHardware, load, random_trace
+
+def play(interpreter, clock, trace):
+    """Run a trace, return the steps as strings."""
+    observed = []
+    for item in trace:
+        if item[0] == 'wait':
+            clock.time += item[1]
+        else:
+            interpreter.queue(item[1], **item[2])
+        observed.append(str(interpreter.execute()))
+    return observed
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+
+    def test_resumed_interpreter_behaves_the_same(self):
+        """Half a trace, encode, resume: the second half gives the same steps."""
+        for path in CHARTS:
+            statechart = load(path)
+            trace = random_trace(statechart, seed=3, length=40)
+            context = {'hw': SilentHardware()}
+            with self.subTest(chart=os.path.basename(path)):
+                clock = SimulatedClock()
+                interpreter = CompiledInterpreter(statechart, clock=clock, initial_context=context)
+                interpreter.execute()
+                try:
+                    play(interpreter, clock, trace[:20])
+                    data = snapshot.encode(interpreter, exclude=context)
+                    resumed_clock = SimulatedClock()
+                    resumed_clock.time = clock.time
+                    resumed = snapshot.resume(data, statechart, clock=resumed_clock, initial_context=context)
+                    self.assertEqual(resumed.configuration, interpreter.configuration)
+                    self.assertEqual(
+                        play(resumed, resumed_clock, trace[20:]), play(interpreter, clock, trace[20:]),
+                    )
+                except ContractError:
+                    pass  # vault_contract.yaml reaches its bug
+
+    def test_snapshot_is_small(self):
+        statechart = load(os.path.join(ROOT, 'chapter_09', 'firmware.yaml'))
+        interpreter = CompiledInterpreter(statechart)
+        interpreter.execute()
+        interpreter.queue('START_UPDATE', 'CHUNK_RECEIVED').execute()
+        data = snapshot.encode(interpreter)
+        self.assertLess(len(data), 128)
+        self.assertLess(len(data), len(pickle.dumps(interpreter)) / 10)
+        self.assertEqual(snapshot.read_ref(data), snapshot.chart_ref(statechart))
+
+    def test_snapshot_of_another_statechart(self):
+        firmware = load(os.path.join(ROOT, 'chapter_09', 'firmware.yaml'))
+        vault = load(os.path.join(ROOT, 'chapter_01', 'vault.yaml'))
+        data = snapshot.encode(CompiledInterpreter(firmware))
+        with self.assertRaises(ValueError):
+            snapshot.decode(data, vault)
+        with self.assertRaises(ValueError):
+            snapshot.read_ref(b'not a snapshot')
+
+    def test_batch(self):
+        statechart = load(os.path.join(ROOT, 'chapter_02', 'vault_passcode.yaml'))
+        interpreters = [CompiledInterpreter(statechart) for _ in range(10)]
+        for code, interpreter in enumerate(interpreters):
+            interpreter.execute()
+            interpreter.queue('PIN_ENTERED', code=1230 + code).execute()
+
+        data = snapshot.encode_many(interpreters)
+        self.assertEqual(data, [snapshot.encode(interpreter) for interpreter in interpreters])
+        self.assertEqual(snapshot.decode_many(data, statechart), [snapshot.decode(d, statechart) for d in data])
+        resumed = snapshot.resume_many(data, statechart)
+        self.assertEqual(
+            [interpreter.configuration for interpreter in resumed],
+            [interpreter.configuration for interpreter in interpreters],
+        )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import store
+from store import InterpreterStore
+from test_engine import ROOT, load
+
+class TestInterpreterStore(unittest.TestCase):
+
+    def setUp(self):
+        self.statechart = load(os.path.join(ROOT, 'chapter_04', 'vault_timer.yaml'))
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'vaults.store')
+        self.stdout = contextlib.redirect_stdout(io.StringIO())
+        self.stdout.__enter__()
+
+    def tearDown(self):
+        self.stdout.__exit__(None, None, None)
+        self.directory.cleanup()
+
+    def test_instances_survive_reopening(self):
+        with InterpreterStore(self.path, self.statechart) as vaults:
+            first, second = vaults.create(), vaults.create()
+            vaults.queue(second, 'PIN_ENTERED', code=0).queue(second, 'PIN_ENTERED', code=0)
+            vaults.execute()
+
+        with InterpreterStore(self.path, self.statechart) as vaults:
+            self.assertEqual(len(vaults), 2)
+            self.assertEqual(vaults.live, [])
+            self.assertEqual(vaults.get(first).context['attempts'], 0)
+            self.assertEqual(vaults.get(second).context['attempts'], 2)
+
+    def test_paused_instances_wake_up_at_their_deadline(self):
+        with InterpreterStore(self.path, self.statechart, max_live=2) as vaults:
+            ids = vaults.create_many(50)
+            vaults.queue(ids[10], 'PIN_ENTERED', code=1234)
+            self.assertEqual(list(vaults.execute()), [10])
+            for index in ids[20:30]:
+                vaults.get(index)  # Evicts vault 10, written back with its after(2) deadline
+            self.assertNotIn(10, vaults.live)
+
+            vaults.clock.time = 1.9
+            self.assertEqual(vaults.execute(), {})
+            vaults.clock.time = 2
+            self.assertEqual(list(vaults.execute()), [10])
+            self.assertEqual(vaults.get(10).configuration, ['Active', 'Locked'])
+
+    def test_state_index(self):
+        with InterpreterStore(self.path, self.statechart, max_live=5) as vaults:
+            ids = vaults.create_many(20)
+            self.assertEqual(vaults.with_state('Locked'), frozenset(ids))
+            for index in (3, 4, 5):
+                vaults.queue(index, 'PIN_ENTERED', code=1234)
+            vaults.execute()
+            vaults.remove(7)
+            self.assertEqual(vaults.with_state('Unlocked'), {3, 4, 5})
+            self.assertEqual(vaults.with_state('Locked'), frozenset(ids) - {3, 4, 5, 7})
+            with self.assertRaises(KeyError):
+                vaults.get(7)
+
+        with InterpreterStore(self.path, self.statechart) as vaults:
+            self.assertEqual(vaults.with_state('Unlocked'), {3, 4, 5})
+
+    def test_index_grows(self):
+        with InterpreterStore(self.path, self.statechart, capacity=2, max_live=1) as vaults:
+            for _ in range(9):
+                index = vaults.create()
+                for _ in range(index % 3):
+                    vaults.queue(index, 'PIN_ENTERED', code=0)
+                vaults.execute()
+            self.assertEqual([vaults.get(i).context['attempts'] for i in range(9)], [0, 1, 2] * 3)
+
+    def test_without_numpy(self):
+        with mock.patch.object(store, 'np', None):
+            self.test_paused_instances_wake_up_at_their_deadline()
+            os.remove(self.path)
+            self.test_state_index()
+
+    def test_store_of_another_statechart(self):
+        InterpreterStore(self.path, self.statechart).close()
+        with self.assertRaises(ValueError):
+            InterpreterStore(self.path, load(os.path.join(ROOT, 'chapter_01', 'vault.yaml')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import contextlib
+import io
+import os
+import pickle
+import unittest
+
+from sismic.interpreter import Interpreter
+from sismic.io import import_from_yaml
+
+from table import TableInterpreter, transition_table
+from test_engine import CHARTS, ROOT, load, random_trace, run_trace
+
+HISTORY = """
+statechart:
+  name: history
+  root state:
+    name: Root
+    initial: On
+    states:
+      - name: On
+        initial: A
+        transitions:
+          - event: OFF
+            target: Off
+        states:
+          - name: A
+            transitions:
+              - event: NEXT
+                target: B
+          - name: B
+          - name: memory
+            type: shallow history
+      - name: Off
+        transitions:
+          - event: ON
+            target: memory
+"""
+
+class TestTable(unittest.TestCase):
+
+    def test_same_behaviour_as_reference_interpreter(self):
+        """Random traces on every tutorial chart give the same steps, configurations and context."""
+        for path in CHARTS:
+            statechart = load(path)
+            self.assertIsNotNone(transition_table(statechart))
+            for seed in range(5):
+                trace = random_trace(statechart, seed)
+                with self.subTest(chart=os.path.basename(path), seed=seed):
+                    self.assertEqual(
+                        run_trace(Interpreter, statechart, trace),
+                        run_trace(TableInterpreter, statechart, trace),
+                    )
+
+    def test_every_reached_configuration_is_in_the_table(self):
+        statechart = load(os.path.join(ROOT, 'chapter_07', 'vault_complicated.yaml'))
+        table = transition_table(statechart)
+        # Security region (2 states) x power region (3 states), Maintenance, and the unstable ones on the way
+        self.assertEqual(len(table), 11)
+        self.assertEqual(sum(1 for row in table.rows.values() if row[3] is None), 7)
+
+        interpreter = TableInterpreter(statechart)
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.execute()
+            for name in ['PIN_ENTERED', 'MASTER_RESET', 'REBOOT', 'PIN_ENTERED']:
+                interpreter.queue(name, code=1234).execute()
+                self.assertIn(frozenset(interpreter._configuration), table.rows)
+
+    def test_fallback(self):
+        with open(os.path.join(ROOT, 'chapter_07', 'vault_complicated.yaml')) as f:
+            too_large = import_from_yaml(f.read())  # Not shared with the other tests
+        self.assertIsNone(TableInterpreter(too_large, max_configurations=5).table)
+        self.assertIsNotNone(TableInterpreter(too_large).table)  # The limit is the caller's, not the cache's
+        small = TableInterpreter(too_large, max_configurations=len(TableInterpreter(too_large).table) - 1)
+        self.assertIsNone(small.table)
+        self.assertIsNone(pickle.loads(pickle.dumps(small)).table)
+        history = import_from_yaml(HISTORY)
+        self.assertIsNone(transition_table(history))
+
+        for statechart in (too_large, history):
+            for seed in range(3):
+                trace = random_trace(statechart, seed)
+                with self.subTest(chart=statechart.name, seed=seed):
+                    self.assertEqual(
+                        run_trace(Interpreter, statechart, trace),
+                        run_trace(TableInterpreter, statechart, trace),
+                    )
+
+    def test_pickle_round_trip(self):
+        statechart = load(os.path.join(ROOT, 'chapter_09', 'firmware.yaml'))
+        interpreter = TableInterpreter(statechart)
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.execute()
+            interpreter.queue('START_UPDATE', 'CHUNK_RECEIVED').execute()
+            resumed = pickle.loads(pickle.dumps(interpreter))
+            resumed.queue('CHUNK_RECEIVED').execute()
+        self.assertEqual(resumed.context['progress'], 20)
+        self.assertIs(resumed.table.compiled.statechart, resumed.statechart)
+
+if __name__ == '__main__':
+    unittest.main()